@@ -0,0 +1,282 @@
+"""Throughput of the pipeline against a local stub LLM and embedding server.
+
+Measures questions generated/sec (``generate_questions``), documents
+embedded/sec (building an ``OpenTextBook``), queries/sec (``textbook.query``)
+and items scored/sec (``run_the_evaluation`` on the local backend), and
+prints the results as JSON.
+
+    python -m benchmarks.run_benchmarks --latency 0.05 --output results.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from dataclasses import asdict
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Settings need these, the stub server doesn't check them
+for name in ("GROQ_API_KEY", "OPIK_API_KEY", "OPIK_WORKSPACE"):
+    os.environ.setdefault(name, "benchmark")
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+from benchmarks.stub_server import StubLLMServer  # noqa: E402
+from src.modeluniversity import instrumentation, llm_cache, rate_limiter  # noqa: E402
+from src.modeluniversity.config import settings  # noqa: E402
+from src.modeluniversity.config.settings import (  # noqa: E402
+    RateLimitSettings,
+    RetrySettings,
+)
+
+STUDENT_MODEL = "openai/stub-student-{}"
+
+
+@contextmanager
+def stub_settings(server: StubLLMServer, requests_per_minute=None, max_retries=6):
+    """Point every model at the stub server, without caches, for the duration."""
+    overrides = {
+        "datagen_model": "openai/stub-teacher",
+        "opik_eval_model": "openai/stub-judge",
+        "rate_limits": {
+            "default": RateLimitSettings(requests_per_minute=requests_per_minute)
+        },
+        "retry": RetrySettings(max_retries=max_retries, base_delay=0.1, max_delay=2),
+    }
+    previous_settings = {name: getattr(settings, name) for name in overrides}
+    previous_env = {
+        name: os.environ.get(name) for name in ("OPENAI_API_BASE", "OPENAI_API_KEY")
+    }
+    previous_cache = llm_cache._completion_cache
+    previous_recorder = instrumentation._recorder
+    with tempfile.TemporaryDirectory() as cache_dir:
+        try:
+            for name, value in overrides.items():
+                setattr(settings, name, value)
+            os.environ["OPENAI_API_BASE"] = f"{server.url}/v1"
+            os.environ["OPENAI_API_KEY"] = "stub"
+            llm_cache._completion_cache = llm_cache.CompletionCache(
+                Path(cache_dir) / "completions.sqlite", enabled=False
+            )
+            rate_limiter._limiters.clear()
+            instrumentation._recorder = instrumentation.CallRecorder(path=None)
+            yield instrumentation._recorder
+        finally:
+            for name, value in previous_settings.items():
+                setattr(settings, name, value)
+            for name, value in previous_env.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+            llm_cache._completion_cache = previous_cache
+            instrumentation._recorder = previous_recorder
+            rate_limiter._limiters.clear()
+
+
+def throughput(count: int, seconds: float) -> dict:
+    return {
+        "count": count,
+        "seconds": round(seconds, 4),
+        "per_second": round(count / seconds, 2) if seconds else None,
+    }
+
+
+def benchmark_datagen(workdir: Path, topics: int, subtopics: int, concurrency: int):
+    from src.modeluniversity.datagen import generate_questions
+
+    curriculum = {
+        "topics": [
+            {
+                "topic": f"Topic {t}",
+                "subtopics": [f"Subtopic {t}.{s}" for s in range(subtopics)],
+            }
+            for t in range(topics)
+        ]
+    }
+    training_file = workdir / "training_questions.json"
+    testing_file = workdir / "test_questions.json"
+    started = time.perf_counter()
+    generate_questions(
+        curriculum,
+        str(training_file),
+        str(testing_file),
+        concurrency=concurrency,
+        resume=False,
+    )
+    elapsed = time.perf_counter() - started
+    generated = len(json.loads(training_file.read_text())) + len(
+        json.loads(testing_file.read_text())
+    )
+    return throughput(generated, elapsed), training_file, testing_file
+
+
+def benchmark_textbook(
+    server: StubLLMServer, workdir: Path, training_file: Path, backend: str
+):
+    from src.modeluniversity.embedding_cache import EmbeddingCache
+    from src.modeluniversity.ollama_embeddings import (
+        OllamaBatchEmbeddingWrapper,
+        OllamaEmbeddingFunction,
+    )
+    from src.modeluniversity.opentextbook import OpenTextBook
+
+    embedding_function = OllamaBatchEmbeddingWrapper(
+        OllamaEmbeddingFunction(
+            endpoint=f"{server.url}/api/embeddings", model="stub-embeddings"
+        ),
+        cache=EmbeddingCache(),
+    )
+    started = time.perf_counter()
+    textbook = OpenTextBook(
+        embedding_function=embedding_function,
+        file_with_questions=training_file,
+        collections_name="benchmark",
+        db_path=workdir / "db",
+        backend=backend,
+    )
+    elapsed = time.perf_counter() - started
+    return throughput(textbook._collection.count(), elapsed), textbook
+
+
+def benchmark_queries(textbook, testing_file: Path, n_results: int = 5):
+    from src.modeluniversity.evals import load_test_questions, retrieval_query
+
+    queries = [retrieval_query(item) for item in load_test_questions(testing_file)]
+    batch_size = settings.textbook.query_batch_size
+    started = time.perf_counter()
+    for start in range(0, len(queries), batch_size):
+        textbook.query(queries[start : start + batch_size], n_results)
+    elapsed = time.perf_counter() - started
+    return throughput(len(queries), elapsed)
+
+
+def benchmark_evals(workdir: Path, testing_file: Path, models: int):
+    from src.modeluniversity.evals import load_test_questions, run_the_evaluation
+    from src.modeluniversity.evals_models import SameFirstLetterMetric
+
+    llm_evals_list = [STUDENT_MODEL.format(i) for i in range(models)]
+    started = time.perf_counter()
+    run_the_evaluation(
+        an_opik_client=None,
+        metrics=[SameFirstLetterMetric("Multiple-choice match")],
+        llm_evals_list=llm_evals_list,
+        use_textbook=False,
+        test_questions_location=testing_file,
+        backend="local",
+        results_path=workdir / "eval_results.sqlite",
+    )
+    elapsed = time.perf_counter() - started
+    return throughput(len(load_test_questions(testing_file)) * models, elapsed)
+
+
+def run_benchmarks(
+    latency: float = 0.02,
+    embedding_latency: float = 0.005,
+    rate_limit_every: int = 0,
+    requests_per_minute: float = None,
+    topics: int = 2,
+    subtopics: int = 4,
+    questions_per_subtopic: int = 8,
+    concurrency: int = 4,
+    models: int = 2,
+    textbook_backend: str = "chroma",
+) -> dict:
+    parameters = dict(locals())
+    results = {}
+    with StubLLMServer(
+        latency=latency,
+        embedding_latency=embedding_latency,
+        rate_limit_every=rate_limit_every,
+        items_per_list=questions_per_subtopic,
+    ) as server, stub_settings(
+        server, requests_per_minute=requests_per_minute
+    ) as recorder, tempfile.TemporaryDirectory() as workdir:
+        workdir = Path(workdir)
+        results["datagen_questions"], training_file, testing_file = benchmark_datagen(
+            workdir, topics, subtopics, concurrency
+        )
+        results["textbook_documents"], textbook = benchmark_textbook(
+            server, workdir, training_file, textbook_backend
+        )
+        results["textbook_queries"] = benchmark_queries(textbook, testing_file)
+        results["eval_items"] = benchmark_evals(workdir, testing_file, models)
+        server_stats = server.stats()
+        llm_calls = {
+            f"{stage} {model}": asdict(totals)
+            for (stage, model), totals in recorder.totals.items()
+        }
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "parameters": parameters,
+        "results": results,
+        "stub_server": server_stats,
+        "llm_calls": llm_calls,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--latency", type=float, default=0.02, help="Seconds per completion"
+    )
+    parser.add_argument(
+        "--embedding-latency",
+        type=float,
+        default=0.005,
+        help="Seconds per embedding request",
+    )
+    parser.add_argument(
+        "--rate-limit-every",
+        type=int,
+        default=0,
+        help="Refuse every n-th completion with a 429, 0 to never",
+    )
+    parser.add_argument(
+        "--requests-per-minute",
+        type=float,
+        default=None,
+        help="Client side rate limit, unlimited by default",
+    )
+    parser.add_argument("--topics", type=int, default=2)
+    parser.add_argument("--subtopics", type=int, default=4, help="Per topic")
+    parser.add_argument("--questions-per-subtopic", type=int, default=8)
+    parser.add_argument(
+        "--concurrency", type=int, default=4, help="Subtopics generated in parallel"
+    )
+    parser.add_argument("--models", type=int, default=2, help="Models evaluated")
+    parser.add_argument(
+        "--textbook-backend", choices=["chroma", "numpy"], default="chroma"
+    )
+    parser.add_argument(
+        "--output", type=Path, default=None, help="Also write the results here"
+    )
+    args = parser.parse_args()
+
+    report = run_benchmarks(
+        latency=args.latency,
+        embedding_latency=args.embedding_latency,
+        rate_limit_every=args.rate_limit_every,
+        requests_per_minute=args.requests_per_minute,
+        topics=args.topics,
+        subtopics=args.subtopics,
+        questions_per_subtopic=args.questions_per_subtopic,
+        concurrency=args.concurrency,
+        models=args.models,
+        textbook_backend=args.textbook_backend,
+    )
+    serialized = json.dumps(report, indent=4)
+    if args.output:
+        args.output.write_text(serialized + "\n")
+    print(serialized)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+import hashlib
+import json
+import math
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from typing import Optional
+
+
+class StubLLMServer:
+    """Local stand-in for an OpenAI-compatible LLM and an Ollama embedding server.
+
+    Chat completions honour a JSON schema ``response_format`` with made-up
+    but valid content, and plain prompts get a multiple-choice answer.
+    Embeddings are deterministic unit vectors derived from the text. Every
+    request waits ``latency`` (or ``embedding_latency``) seconds, and with
+    ``rate_limit_every`` every n-th completion is refused with a 429.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        embedding_latency: float = 0.0,
+        rate_limit_every: int = 0,
+        retry_after: float = 0.5,
+        items_per_list: int = 8,
+        embedding_dimensions: int = 64,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        self.latency = latency
+        self.embedding_latency = embedding_latency
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.items_per_list = items_per_list
+        self.embedding_dimensions = embedding_dimensions
+        self.completions = 0
+        self.rate_limited = 0
+        self.embedding_requests = 0
+        self.embedded_texts = 0
+        self._lock = Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubLLMServer":
+        self._thread = Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "StubLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def stats(self) -> dict:
+        return {
+            "completions": self.completions,
+            "rate_limited": self.rate_limited,
+            "embedding_requests": self.embedding_requests,
+            "embedded_texts": self.embedded_texts,
+        }
+
+    def embed(self, text: str) -> list:
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        vector = [
+            digest[i % len(digest)] * (i + 1) % 251 - 125.0
+            for i in range(self.embedding_dimensions)
+        ]
+        norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+        return [value / norm for value in vector]
+
+    def fake_from_schema(self, schema: dict, root: dict, seed: str) -> object:
+        if "$ref" in schema:
+            name = schema["$ref"].rsplit("/", 1)[-1]
+            schema = root.get("$defs", root.get("definitions", {}))[name]
+        if "anyOf" in schema:
+            return self.fake_from_schema(schema["anyOf"][0], root, seed)
+        kind = schema.get("type", "string")
+        if kind == "object":
+            return {
+                name: self.fake_from_schema(field, root, f"{seed}.{name}")
+                for name, field in schema.get("properties", {}).items()
+            }
+        if kind == "array":
+            return [
+                self.fake_from_schema(schema.get("items", {}), root, f"{seed}[{i}]")
+                for i in range(self.items_per_list)
+            ]
+        if kind in ("number", "integer"):
+            return 1
+        if kind == "boolean":
+            return True
+        return f"Stub {seed} {hashlib.sha256(seed.encode()).hexdigest()[:8]}"
+
+    def completion_content(self, request: dict) -> str:
+        prompt = str(request.get("messages", [{}])[-1].get("content", ""))
+        prompt_id = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+        response_format = request.get("response_format") or {}
+        if response_format.get("type") == "json_schema":
+            schema = response_format["json_schema"]["schema"]
+            return json.dumps(self.fake_from_schema(schema, schema, prompt_id))
+        if response_format.get("type") == "json_object":
+            return json.dumps({"score": 1.0, "reason": "stub"})
+        letter = "ABCD"[int(prompt_id, 16) % 4]
+        return f"{letter}. Because the stub server says so."
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status: int, body: dict, headers: Optional[dict] = None):
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                if self.path.endswith("/chat/completions"):
+                    self._chat_completion(request)
+                elif self.path.endswith("/api/embed"):
+                    time.sleep(server.embedding_latency)
+                    texts = request.get("input", [])
+                    texts = [texts] if isinstance(texts, str) else texts
+                    with server._lock:
+                        server.embedding_requests += 1
+                        server.embedded_texts += len(texts)
+                    self._send(
+                        200, {"embeddings": [server.embed(text) for text in texts]}
+                    )
+                elif self.path.endswith("/api/embeddings"):
+                    time.sleep(server.embedding_latency)
+                    with server._lock:
+                        server.embedding_requests += 1
+                        server.embedded_texts += 1
+                    self._send(
+                        200, {"embedding": server.embed(request.get("prompt", ""))}
+                    )
+                else:
+                    self._send(404, {"error": f"Unknown path {self.path}"})
+
+            def _chat_completion(self, request: dict):
+                time.sleep(server.latency)
+                with server._lock:
+                    server.completions += 1
+                    refuse = (
+                        server.rate_limit_every
+                        and server.completions % server.rate_limit_every == 0
+                    )
+                    if refuse:
+                        server.rate_limited += 1
+                if refuse:
+                    self._send(
+                        429,
+                        {
+                            "error": {
+                                "message": "Rate limit reached (stub)",
+                                "type": "rate_limit_error",
+                                "code": "rate_limit_exceeded",
+                            }
+                        },
+                        headers={"Retry-After": str(server.retry_after)},
+                    )
+                    return
+
+                content = server.completion_content(request)
+                prompt_tokens = sum(
+                    len(str(message.get("content", ""))) // 4
+                    for message in request.get("messages", [])
+                )
+                completion_tokens = len(content) // 4
+                self._send(
+                    200,
+                    {
+                        "id": "chatcmpl-stub",
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": request.get("model", "stub"),
+                        "choices": [
+                            {
+                                "index": 0,
+                                "message": {"role": "assistant", "content": content},
+                                "finish_reason": "stop",
+                            }
+                        ],
+                        "usage": {
+                            "prompt_tokens": prompt_tokens,
+                            "completion_tokens": completion_tokens,
+                            "total_tokens": prompt_tokens + completion_tokens,
+                        },
+                    },
+                )
+
+        return Handler
@@ -1,21 +1,36 @@
 import click
 from pathlib import Path
-from .evals import run_the_evaluation
-from opik import Opik
-from src.modeluniversity.evals_models import SameFirstLetterMetric
 from src.modeluniversity.config import settings
 
-from .datagen import (
-    generate_curriculum,
-    generate_questions,
-    transform_to_trainable_json,
-)
+# Commands import what they need when they run, so that `--help` and
+# `transform-data` don't pay for litellm, opik and chromadb
 
 
 @click.group()
-def cli():
+@click.option(
+    "--no-cache",
+    is_flag=True,
+    default=False,
+    help="Bypass the LLM completion cache, every request goes to the provider",
+)
+@click.option(
+    "--clear-cache",
+    is_flag=True,
+    default=False,
+    help="Empty the LLM completion cache before running the command",
+)
+def cli(no_cache, clear_cache):
     """ModelUniversity CLI tool for data generation and management."""
-    pass
+    if not (clear_cache or no_cache):
+        return
+    from .llm_cache import get_completion_cache
+
+    cache = get_completion_cache()
+    if clear_cache:
+        cache.clear()
+        click.echo(f"Cleared the completion cache at {cache.path}")
+    if no_cache:
+        cache.enabled = False
 
 
 @cli.command()
@@ -27,8 +42,12 @@ def cli():
 )
 def create_curriculum(curriculum_file):
     """Generate a new curriculum."""
+    from .datagen import generate_curriculum
+    from .instrumentation import get_recorder
+
     curriculum = generate_curriculum(Path(curriculum_file))
     click.echo(f"Curriculum generated and saved to {curriculum_file}")
+    get_recorder().report()
     return curriculum
 
 
@@ -51,8 +70,32 @@ def create_curriculum(curriculum_file):
     default="test_questions.json",
     help="Path to save test questions",
 )
-def create_questions(curriculum_file, training_file, testing_file):
+@click.option(
+    "--concurrency",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Number of subtopics generated in parallel. Defaults to datagen_concurrency from config.yaml",
+)
+@click.option(
+    "--batch-size",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Subtopics of a topic requested together. Defaults to datagen_batch_size from config.yaml",
+)
+@click.option(
+    "--fresh",
+    is_flag=True,
+    default=False,
+    help="Discard the checkpoint of a previous run and regenerate every subtopic",
+)
+def create_questions(
+    curriculum_file, training_file, testing_file, concurrency, batch_size, fresh
+):
     """Generate training and test questions from curriculum."""
+    from .datagen import generate_curriculum, generate_questions
+    from .instrumentation import get_recorder
+    from .llm_cache import get_completion_cache
+
     with open(curriculum_file, "r") as f:
         curriculum = generate_curriculum(Path(curriculum_file))
 
@@ -60,10 +103,15 @@ def create_questions(curriculum_file, training_file, testing_file):
         curriculum=curriculum,
         training_questions_file=training_file,
         testing_questions_file=testing_file,
+        concurrency=concurrency,
+        resume=not fresh,
+        batch_size=batch_size,
     )
     click.echo(
         f"Questions generated:\nTraining: {training_file}\nTesting: {testing_file}"
     )
+    get_completion_cache().report()
+    get_recorder().report()
 
 
 @cli.command()
@@ -71,16 +119,18 @@ def create_questions(curriculum_file, training_file, testing_file):
     "--training-file",
     type=click.Path(exists=True),
     default="training_questions.json",
-    help="Path to training questions JSON file",
+    help="Path to training questions file, a JSON array or JSONL",
 )
 @click.option(
     "--output-file",
     type=click.Path(),
     default="trainable_data.json",
-    help="Path to save transformed trainable data",
+    help="Path to save transformed trainable data, one conversation per line if it ends in .jsonl",
 )
 def transform_data(training_file, output_file):
     """Transform training questions into trainable format."""
+    from .trainable_data import transform_to_trainable_json
+
     transform_to_trainable_json(
         training_questions_file=Path(training_file),
         trainable_questions_file=Path(output_file),
@@ -88,6 +138,106 @@ def transform_data(training_file, output_file):
     click.echo(f"Data transformed and saved to {output_file}")
 
 
+@cli.command()
+@click.option(
+    "--questions-file",
+    type=click.Path(exists=True),
+    default="training_questions.json",
+    help="Path to the questions file, a JSON array or JSONL",
+)
+@click.option(
+    "--output-file",
+    type=click.Path(),
+    default=None,
+    help="Path to save the deduplicated questions. Defaults to rewriting the questions file, and then also the JSONL store create-questions keeps next to it",
+)
+@click.option(
+    "--threshold",
+    type=click.FloatRange(min=0, max=1, min_open=True),
+    default=None,
+    help="Cosine similarity from which questions are duplicates. Defaults to dedup.threshold from config.yaml",
+)
+@click.option(
+    "--scope",
+    type=click.Choice(["subtopic", "topic", "all"]),
+    default=None,
+    help="Compare questions within a subtopic, a topic or the whole file. Defaults to dedup.scope from config.yaml",
+)
+def dedup_questions(questions_file, output_file, threshold, scope):
+    """Remove near-duplicate questions.
+
+    Rewriting training_questions.json or test_questions.json in place also
+    removes the duplicates from its .jsonl store, so a resumed
+    create-questions run doesn't export them again. With --output-file the
+    questions file and its store are left as they are.
+    """
+    from .dedup import dedup_questions_file
+    from .opentextbook import create_embedding_function
+
+    embedding_function = create_embedding_function()
+    dedup_questions_file(
+        questions_file=Path(questions_file),
+        output_file=Path(output_file) if output_file else None,
+        embedding_function=embedding_function,
+        threshold=threshold,
+        scope=scope,
+    )
+    click.echo(f"Deduplicated questions saved to {output_file or questions_file}")
+    if embedding_function is not None:
+        embedding_function.cache.report()
+
+
+@cli.command()
+@click.option(
+    "--training-file",
+    type=click.Path(exists=True),
+    default="training_questions.json",
+    help="Path to the training questions file, a JSON array or JSONL",
+)
+@click.option(
+    "--testing-file",
+    type=click.Path(exists=True),
+    default="test_questions.json",
+    help="Path to the test questions file, a JSON array or JSONL",
+)
+@click.option(
+    "--output-file",
+    type=click.Path(),
+    default=None,
+    help="Path to save the test questions that don't leak. Only reports if not given",
+)
+@click.option(
+    "--threshold",
+    type=click.FloatRange(min=0, max=1, min_open=True),
+    default=None,
+    help="Cosine similarity from which a test question leaks. Defaults to leakage.threshold from config.yaml",
+)
+@click.option(
+    "--ngram-threshold",
+    type=click.FloatRange(min=0, max=1, min_open=True),
+    default=None,
+    help="Share of shared word n-grams from which a test question leaks. Defaults to leakage.ngram_threshold from config.yaml",
+)
+def check_leakage(training_file, testing_file, output_file, threshold, ngram_threshold):
+    """Find test questions too close to a training question."""
+    from .leakage import check_leakage
+    from .opentextbook import create_embedding_function
+
+    embedding_function = create_embedding_function()
+    check_leakage(
+        training_questions_file=Path(training_file),
+        test_questions_file=Path(testing_file),
+        output_file=Path(output_file) if output_file else None,
+        embedding_function=embedding_function,
+        threshold=threshold,
+        ngram_threshold=ngram_threshold,
+    )
+    if output_file:
+        click.echo(f"Test questions without leakage saved to {output_file}")
+    if embedding_function is not None:
+        embedding_function.cache.report()
+
+
 @cli.command()
 @click.option(
     "--evaluation-dataset-name",
@@ -112,12 +262,37 @@ def transform_data(training_file, output_file):
     Defaults to False.
     """,
 )
-def run_evals(evaluation_dataset_name, test_questions_file, use_textbook):
+@click.option(
+    "--backend",
+    type=click.Choice(["opik", "local"]),
+    default=None,
+    help="Run on Opik, or locally with results saved to SQLite. Defaults to local_evals.backend in config.yaml.",
+)
+@click.option(
+    "--results-path",
+    type=click.Path(),
+    default=None,
+    help="SQLite file of the local backend's results. Defaults to local_evals.results_path in config.yaml.",
+)
+def run_evals(
+    evaluation_dataset_name, test_questions_file, use_textbook, backend, results_path
+):
     """
     Run the evaluation process on a given set of questions and models.
     """
 
-    client = Opik()
+    from .evals import run_the_evaluation
+    from .evals_models import SameFirstLetterMetric
+    from .instrumentation import get_recorder
+    from .llm_cache import get_completion_cache
+
+    backend = backend or settings.local_evals.backend
+    if backend == "opik":
+        from opik import Opik
+
+        client = Opik()
+    else:
+        client = None
     metrics = [SameFirstLetterMetric("Multiple-choice match")]
 
     results = run_the_evaluation(
@@ -127,8 +302,18 @@ def run_evals(evaluation_dataset_name, test_questions_file, use_textbook):
         test_questions_location=Path(test_questions_file),
         use_textbook=use_textbook,
         evaluation_dataset_name=evaluation_dataset_name,
+        backend=backend,
+        results_path=Path(results_path) if results_path else None,
     )
     click.echo(f"Evaluation completed. Results: {list(results.keys())}")
+    if backend == "local":
+        click.echo(
+            f"Results saved to {results_path or settings.local_evals.results_path}"
+        )
+    for metric in metrics:
+        metric.report()
+    get_completion_cache().report()
+    get_recorder().report()
 
 
 if __name__ == "__main__":
@@ -1,9 +1,42 @@
 from .settings import Settings
+from threading import Lock
 import os
 
+
+class LazySettings:
+    """Loads ``config.yaml`` the first time a setting is read, not at import."""
+
+    def __init__(self):
+        object.__setattr__(self, "_settings", None)
+        object.__setattr__(self, "_lock", Lock())
+
+    def _load(self) -> Settings:
+        if self._settings is None:
+            with self._lock:
+                if self._settings is None:
+                    object.__setattr__(
+                        self,
+                        "_settings",
+                        Settings.load_config(
+                            yaml_file=os.getenv("CONFIG_FILE_LOCATION", "config.yaml")
+                        ),
+                    )
+        return self._settings
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._load(), name, value)
+
+    def __delattr__(self, name):
+        delattr(self._load(), name)
+
+    def __repr__(self):
+        return repr(self._load())
+
+
 # A singleton instance
-settings = Settings.load_config(
-    yaml_file=os.getenv("CONFIG_FILE_LOCATION", "config.yaml")
-)
+settings = LazySettings()
 
 __all__ = ["settings"]
@@ -1,7 +1,7 @@
 from datetime import datetime
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import List, Optional, Dict, Any
-from pydantic import Field, field_validator
+from typing import List, Literal, Optional, Dict, Any
+from pydantic import BaseModel, Field, field_validator
 from pathlib import Path
 import yaml
 import os
@@ -38,6 +38,170 @@ class QuestionSettings(BaseSettings):
         return v
 
 
+class PromptBudgetSettings(BaseModel):
+    avoid_list_max_tokens: int = Field(
+        default=2000,
+        gt=0,
+        description="Tokens of prior questions a test prompt lists at most",
+    )
+
+
+class DedupSettings(BaseModel):
+    threshold: float = Field(
+        default=0.92,
+        gt=0,
+        le=1,
+        description="Cosine similarity from which two questions are duplicates",
+    )
+    scope: Literal["subtopic", "topic", "all"] = Field(
+        default="all", description="Questions compared with each other"
+    )
+    batch_size: int = Field(
+        default=256, gt=0, description="Questions embedded per call"
+    )
+    chunk_size: int = Field(
+        default=1024, gt=0, description="Questions compared per matrix product"
+    )
+
+
+class LeakageSettings(BaseModel):
+    threshold: float = Field(
+        default=0.9,
+        gt=0,
+        le=1,
+        description="Cosine similarity from which a test question leaks",
+    )
+    ngram_size: int = Field(default=3, gt=0, description="Words per n-gram")
+    ngram_threshold: float = Field(
+        default=0.6,
+        gt=0,
+        le=1,
+        description="Share of a test question's n-grams in one training question from which it leaks",
+    )
+    batch_size: int = Field(
+        default=256, gt=0, description="Questions embedded per call"
+    )
+    chunk_size: int = Field(
+        default=1024, gt=0, description="Rows per block of the similarity matrix"
+    )
+
+
+class CompletionCacheSettings(BaseModel):
+    enabled: bool = Field(
+        default=True, description="Serve repeated LLM requests from disk"
+    )
+    path: str = Field(
+        default=".cache/completions.sqlite", description="SQLite file of the cache"
+    )
+    max_entries: int = Field(default=100_000, gt=0, description="Entries kept at most")
+    max_age_days: float = Field(
+        default=30, gt=0, description="Age after which entries expire"
+    )
+
+
+class InstrumentationSettings(BaseModel):
+    enabled: bool = Field(default=True, description="Record every LLM call")
+    path: Optional[str] = Field(
+        default=".cache/llm_calls.jsonl",
+        description="JSONL file the call records are appended to, none to keep totals only",
+    )
+
+
+class RateLimitSettings(BaseModel):
+    requests_per_minute: Optional[float] = Field(
+        default=None, gt=0, description="Requests per minute, unlimited if not set"
+    )
+    tokens_per_minute: Optional[float] = Field(
+        default=None, gt=0, description="Tokens per minute, unlimited if not set"
+    )
+
+
+class RetrySettings(BaseModel):
+    max_retries: int = Field(default=6, ge=0, description="Retries before giving up")
+    base_delay: float = Field(
+        default=2, gt=0, description="First backoff delay in seconds"
+    )
+    max_delay: float = Field(default=60, gt=0, description="Longest backoff delay")
+
+
+class TextbookSettings(BaseModel):
+    backend: Literal["chroma", "numpy"] = Field(
+        default="chroma", description="Vector index the textbook is kept in"
+    )
+    path: str = Field(default="./db", description="Directory of the vector index")
+    retrieval_scope: Literal["all", "topic", "subtopic"] = Field(
+        default="all",
+        description="Chunks searched for a question: all, or those of its topic or subtopic",
+    )
+    batch_size: int = Field(
+        default=256, gt=0, description="Chunks embedded and upserted per batch"
+    )
+    query_batch_size: int = Field(
+        default=256, gt=0, description="Queries embedded and searched per batch"
+    )
+
+
+class ContextAssemblySettings(BaseModel):
+    max_tokens: Dict[str, int] = Field(
+        default_factory=lambda: {"default": 1500, "ollama": 600},
+        description="Tokens of textbook context per prompt, by model or provider",
+    )
+
+    def max_tokens_for(self, model: str, provider: str) -> int:
+        return (
+            self.max_tokens.get(model)
+            or self.max_tokens.get(provider)
+            or self.max_tokens.get("default", 1500)
+        )
+
+
+class OllamaEmbeddingSettings(BaseModel):
+    timeout: float = Field(default=60, gt=0, description="Seconds per HTTP request")
+    batch_size: int = Field(default=64, gt=0, description="Texts per /api/embed call")
+    max_workers: int = Field(
+        default=4, gt=0, description="Concurrent requests and pooled connections"
+    )
+
+
+class EmbeddingCacheSettings(BaseModel):
+    enabled: bool = Field(default=True, description="Keep embeddings on disk")
+    path: str = Field(
+        default=".cache/embeddings.sqlite", description="SQLite file of the cache"
+    )
+    max_memory_mb: float = Field(
+        default=256, gt=0, description="Memory budget of the in-process LRU"
+    )
+
+
+class OpikUploadSettings(BaseModel):
+    chunk_size: int = Field(
+        default=500, gt=0, description="Dataset items inserted per request"
+    )
+
+
+class LocalEvalSettings(BaseModel):
+    backend: Literal["opik", "local"] = Field(
+        default="opik", description="Where evaluations run and results are kept"
+    )
+    results_path: str = Field(
+        default="eval_results.sqlite",
+        description="SQLite file of the results of the local backend",
+    )
+
+
+class EvalConcurrencySettings(BaseModel):
+    max_parallel_tasks: int = Field(
+        default=16, gt=0, description="Questions evaluated at once across all models"
+    )
+    task_threads: Dict[str, int] = Field(
+        default_factory=lambda: {"default": 4, "ollama": 1},
+        description="Questions evaluated at once per model, by provider",
+    )
+
+    def task_threads_for(self, provider: str) -> int:
+        return self.task_threads.get(provider) or self.task_threads.get("default", 4)
+
+
 class APISettings(BaseSettings):
     groq_api_key: str = Field(..., description="Groq API key for LLM access")
     opik_api_key: str = Field(..., description="Opik API key for evaluations")
@@ -65,6 +229,68 @@ class Settings(BaseSettings):
     teacher_role: str
     llm_evals_list: List[str]
 
+    # Data generation
+    datagen_concurrency: int = Field(
+        default=1, ge=1, description="Number of subtopics generated in parallel"
+    )
+    datagen_batch_size: int = Field(
+        default=1,
+        ge=1,
+        description="Subtopics of a topic requested together, 1 for a request per subtopic",
+    )
+
+    # Size of the prior questions listed in test question prompts
+    prompt_budget: PromptBudgetSettings = Field(default_factory=PromptBudgetSettings)
+
+    # Near-duplicate questions removed by `dedup-questions`
+    dedup: DedupSettings = Field(default_factory=DedupSettings)
+
+    # Test questions too close to a training question, see `check-leakage`
+    leakage: LeakageSettings = Field(default_factory=LeakageSettings)
+
+    # LLM completion cache shared by datagen, evals and the judge metric
+    completion_cache: CompletionCacheSettings = Field(
+        default_factory=CompletionCacheSettings
+    )
+
+    # Time, tokens and cost of every LLM call
+    instrumentation: InstrumentationSettings = Field(
+        default_factory=InstrumentationSettings
+    )
+
+    # Per provider (the litellm model prefix) limits, "default" for the others
+    rate_limits: Dict[str, RateLimitSettings] = Field(
+        default_factory=lambda: {"default": RateLimitSettings()}
+    )
+    retry: RetrySettings = Field(default_factory=RetrySettings)
+
+    # Open textbook used by the evaluations
+    textbook: TextbookSettings = Field(default_factory=TextbookSettings)
+
+    # Retrieved textbook chunks as they go into open textbook prompts
+    context_assembly: ContextAssemblySettings = Field(
+        default_factory=ContextAssemblySettings
+    )
+
+    ollama_embeddings: OllamaEmbeddingSettings = Field(
+        default_factory=OllamaEmbeddingSettings
+    )
+
+    embedding_cache: EmbeddingCacheSettings = Field(
+        default_factory=EmbeddingCacheSettings
+    )
+
+    # Test questions uploaded to the Opik dataset
+    opik_upload: OpikUploadSettings = Field(default_factory=OpikUploadSettings)
+
+    # Offline evaluation backend, no Opik needed
+    local_evals: LocalEvalSettings = Field(default_factory=LocalEvalSettings)
+
+    # All models are evaluated at once, within these limits
+    eval_concurrency: EvalConcurrencySettings = Field(
+        default_factory=EvalConcurrencySettings
+    )
+
     # Question Settings
     practice: QuestionSettings
     test: QuestionSettings
@@ -0,0 +1,81 @@
+from typing import List, Sequence
+
+from .prompt_budget import BudgetedText, count_tokens, normalize_question
+
+# Overlaps shorter than this are left alone, they are likely a coincidence
+MIN_OVERLAP = 20
+# The textbook splits chunks with a 200 character overlap
+MAX_OVERLAP = 400
+
+
+def strip_overlap(chunk: str, kept: Sequence[str]) -> str:
+    """``chunk`` without the longest prefix it shares with the end of a kept chunk."""
+    longest = 0
+    for previous in kept:
+        for length in range(min(len(previous), len(chunk), MAX_OVERLAP), longest, -1):
+            if length >= MIN_OVERLAP and previous.endswith(chunk[:length]):
+                longest = length
+                break
+    return chunk[longest:].lstrip()
+
+
+def unique_chunks(documents: Sequence[str]) -> List[str]:
+    """Documents in rank order without repeats, contained chunks or overlapping text."""
+    kept: List[str] = []
+    seen = set()
+    for document in documents:
+        document = " ".join(str(document).split())
+        key = normalize_question(document)
+        if not key or key in seen or any(document in previous for previous in kept):
+            continue
+        seen.add(key)
+        remainder = strip_overlap(document, kept)
+        if remainder:
+            kept.append(remainder)
+    return kept
+
+
+def truncate_to_tokens(text: str, model: str, max_tokens: int) -> str:
+    """The longest word-aligned prefix of ``text`` within ``max_tokens``."""
+    tokens = count_tokens(text, model)
+    while text and tokens > max_tokens:
+        # Shrink by the overshoot, estimated from the current characters per token
+        keep = int(len(text) * max_tokens / tokens * 0.95)
+        text = text[:keep].rsplit(" ", 1)[0] if " " in text[:keep] else text[:keep]
+        tokens = count_tokens(text, model)
+    return text
+
+
+def assemble_context(
+    documents: Sequence[str], model: str, max_tokens: int
+) -> BudgetedText:
+    """Number the retrieved chunks, best first, within ``max_tokens`` of ``model``.
+
+    Repeated and overlapping chunks are merged first. The chunk that
+    crosses the budget is cut short and the ones after it are left out.
+    """
+    documents = list(documents)
+    chunks = unique_chunks(documents)
+    lines: List[str] = []
+    tokens = 0
+    for number, chunk in enumerate(chunks, start=1):
+        line = f"[{number}] {chunk}"
+        line_tokens = count_tokens(line + "\n", model)
+        if tokens + line_tokens > max_tokens:
+            remaining = max_tokens - tokens - 1
+            line = truncate_to_tokens(line, model, remaining) if remaining > 0 else ""
+            if len(line) > len(f"[{number}] "):
+                lines.append(line)
+                tokens += count_tokens(line + "\n", model)
+            break
+        lines.append(line)
+        tokens += line_tokens
+
+    return BudgetedText(
+        text="\n".join(lines),
+        included=len(lines),
+        duplicates=len(documents) - len(chunks),
+        omitted=len(chunks) - len(lines),
+        tokens=tokens,
+        full_tokens=count_tokens(str(documents), model),
+    )
@@ -1,13 +1,30 @@
-from time import sleep
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import hashlib
+from threading import Lock
 from litellm import completion
-from litellm import RateLimitError
 from termcolor import colored
 import json
-from typing import List, Union
+from typing import Callable, Dict, List, Optional, Union
 from .config import settings
 from pathlib import Path
 import argparse
+from src.modeluniversity.instrumentation import tagged
+from src.modeluniversity.llm_cache import completion_content
+from src.modeluniversity.prompt_budget import PromptBudgetReport, build_avoid_list
+from src.modeluniversity.question_store import (
+    GenerationCheckpoint,
+    JsonlQuestionStore,
+    checkpoint_path_for,
+    jsonl_path_for,
+)
+from src.modeluniversity.trainable_data import (  # noqa: F401
+    create_conversation,
+    iter_conversations,
+    transform_to_trainable_json,
+)
 from src.modeluniversity.datagen_models import (
+    BatchTestQuestionsSchema,
+    BatchTrainQuestionsSchema,
     CurriculumSchema,
     TrainQuestionsSchema,
     TestQuestionsSchema,
@@ -33,18 +50,18 @@ def generate_curriculum(
         )
 
         prompt = settings.curriculum_prompt
-        response = completion(
-            model=settings.datagen_model,
-            messages=[
-                {"role": "system", "content": settings.teacher_role},
-                {"role": "user", "content": prompt},
-            ],
-            response_format=CurriculumSchema,
-            temperature=0,
-            max_tokens=4096,
-        )
-
-        curriculum_str = response["choices"][0]["message"]["content"]
+        with tagged("curriculum"):
+            curriculum_str = completion_content(
+                completion,
+                model=settings.datagen_model,
+                messages=[
+                    {"role": "system", "content": settings.teacher_role},
+                    {"role": "user", "content": prompt},
+                ],
+                response_format=CurriculumSchema,
+                temperature=0,
+                max_tokens=4096,
+            )
         curriculum = json.loads(curriculum_str)
         with open(curriculum_file_at, "w") as file:
             json.dump(curriculum, file, indent=4)
@@ -54,164 +71,452 @@ def generate_curriculum(
 
 
 def question_prompt_call(prompt, schema):
-    retries = 0
-    while retries < 5:
+    return completion_content(
+        completion,
+        model=settings.datagen_model,
+        messages=[
+            {"role": "system", "content": settings.teacher_role},
+            {"role": "user", "content": prompt},
+        ],
+        temperature=0,
+        max_tokens=4096,
+        response_format=schema,
+    )
+
+
+def create_base_prompt(
+    topic: str,
+    subtopic: str,
+    questions_list_provided: Union[None, list] = None,
+    budget_report: Optional[PromptBudgetReport] = None,
+) -> str:
+    purpose_is_practice: bool = questions_list_provided is None
+    settings_subset = settings.practice if purpose_is_practice else settings.test
+    purpose_part = (
+        "practice questions and answers"
+        if purpose_is_practice
+        else "multi-answer test questions"
+    )
+
+    main_part = f"""Create {settings.practice.num_total} {purpose_part} for the topic: {topic}. Subtopic: {subtopic}."""
+    amounts_per_difficulty_part = f"{settings_subset.num_easy} easy, {settings_subset.num_medium} medium, {settings_subset.num_hard} hard questions."
+
+    additional_questions_prompt = (
+        "Make sure you cover the most critical concepts, add more questions if you need to."
+        if settings_subset.allow_expansion
+        else ""
+    )
+    final_prompt = (
+        f"{main_part} {amounts_per_difficulty_part} {additional_questions_prompt}"
+    )
+    if not purpose_is_practice:
+        # Deduplicated, one per line and capped, so prompts stay bounded as
+        # practice sets grow
+        avoid_list = build_avoid_list(
+            questions_list_provided,
+            model=settings.datagen_model,
+            max_tokens=settings.prompt_budget.avoid_list_max_tokens,
+        )
+        if budget_report is not None:
+            budget_report.add(avoid_list)
+        final_prompt += (
+            "avoid repeating these exact questions, its ok to test the same concepts with different questions:\n"
+            + avoid_list.text
+        )
+    return final_prompt
+
+
+def prompt_hash(prompt: str, schema) -> str:
+    """Identify a question request by everything that shapes its response."""
+    request = [settings.datagen_model, settings.teacher_role, schema.__name__, prompt]
+    return hashlib.sha256(json.dumps(request).encode("utf-8")).hexdigest()
+
+
+def training_entry(topic: str, subtopic: str, question: dict) -> dict:
+    return {
+        "topic": topic,
+        "subtopic": subtopic,
+        "question": question["question"],
+        "question_difficulty": question["question_difficulty"],
+        "answer": question["correct_answer"],
+        "explanation": question["explanation"],
+    }
+
+
+def test_entry(topic: str, subtopic: str, question: dict) -> dict:
+    return {
+        "topic": topic,
+        "subtopic": subtopic,
+        "question": question["question"],
+        "question_difficulty": question["question_difficulty"],
+        "answer": question["correct_answer"],
+        "wrong_answer1": question["wrong_answer1"],
+        "wrong_answer2": question["wrong_answer2"],
+        "wrong_answer3": question["wrong_answer3"],
+        "explanation": question["explanation"],
+    }
+
+
+def generate_training_questions(topic: str, subtopic: str, training_prompt: str):
+    with tagged("train", subtopic):
+        training_questions = json.loads(
+            question_prompt_call(training_prompt, TrainQuestionsSchema)
+        )
+    print(colored(f"Training questions for subtopic: {subtopic}", "green"))
+
+    return [
+        training_entry(topic, subtopic, question)
+        for question in training_questions["questions"]
+    ]
+
+
+def generate_test_questions(topic: str, subtopic: str, testing_prompt: str):
+    with tagged("test", subtopic):
+        test_questions = json.loads(
+            question_prompt_call(testing_prompt, TestQuestionsSchema)
+        )
+    print(colored(f"Test questions for subtopic: {subtopic}", "green"))
+
+    return [
+        test_entry(topic, subtopic, question)
+        for question in test_questions["questions"]
+    ]
+
+
+BATCH_SCHEMAS = {
+    TrainQuestionsSchema: BatchTrainQuestionsSchema,
+    TestQuestionsSchema: BatchTestQuestionsSchema,
+}
+
+
+def create_batch_prompt(topic: str, prompts: Dict[str, str]) -> str:
+    requests = "\n\n".join(
+        f"Request {number}: {prompt}"
+        for number, prompt in enumerate(prompts.values(), start=1)
+    )
+    return (
+        f"Answer each of the following {len(prompts)} requests for the topic: {topic}. "
+        "Return one entry per request in `subtopics`, with `subtopic` set to the "
+        "exact subtopic name given in the request.\n\n" + requests
+    )
+
+
+def request_question_batch(
+    topic: str,
+    prompts: Dict[str, str],
+    schema,
+    on_answered: Optional[Callable[[str, List[dict]], None]] = None,
+) -> Dict[str, List[dict]]:
+    """Questions of several subtopics of ``topic`` from as few requests as possible.
+
+    ``prompts`` maps each subtopic to its single-subtopic prompt. They are
+    sent together with the batch variant of ``schema``. A response that is
+    cut off or fails validation is split in halves and retried, and
+    subtopics the response left out are requested again. A single subtopic
+    is requested with ``schema`` itself. ``on_answered`` is called with
+    every subtopic as soon as it is answered; if a half fails, the other
+    half is still requested before the error is raised.
+    """
+    if len(prompts) == 1:
+        ((subtopic, prompt),) = prompts.items()
+        questions = json.loads(question_prompt_call(prompt, schema))["questions"]
+        if on_answered is not None:
+            on_answered(subtopic, questions)
+        return {subtopic: questions}
+
+    answered = {}
+    try:
+        response = BATCH_SCHEMAS[schema].model_validate_json(
+            question_prompt_call(
+                create_batch_prompt(topic, prompts), BATCH_SCHEMAS[schema]
+            )
+        )
+        for entry in response.subtopics:
+            if entry.subtopic in prompts and entry.questions:
+                answered.setdefault(
+                    entry.subtopic,
+                    [question.model_dump() for question in entry.questions],
+                )
+    except ValueError as e:
+        # Malformed or truncated JSON, or a schema mismatch
+        print(
+            colored(
+                f"Batch of {len(prompts)} subtopics of {topic} failed validation, splitting it: {e}",
+                "red",
+            )
+        )
+    if on_answered is not None:
+        for subtopic, questions in answered.items():
+            on_answered(subtopic, questions)
+
+    missing = [subtopic for subtopic in prompts if subtopic not in answered]
+    if len(missing) == len(prompts):
+        halves = [missing[: len(missing) // 2], missing[len(missing) // 2 :]]
+    else:
+        halves = [missing] if missing else []
+    error = None
+    for half in halves:
         try:
-            response = completion(
-                model=settings.datagen_model,
-                messages=[
-                    {"role": "system", "content": settings.teacher_role},
-                    {"role": "user", "content": prompt},
-                ],
-                temperature=0,
-                max_tokens=4096,
-                response_format=schema,
+            answered.update(
+                request_question_batch(
+                    topic,
+                    {subtopic: prompts[subtopic] for subtopic in half},
+                    schema,
+                    on_answered,
+                )
             )
-            return response["choices"][0]["message"]["content"]
-        except RateLimitError as e:
-            print(colored("Rate limit error. Waiting 5 seconds before retrying", "red"))
-            sleep(5)
-            retries += 1
+        except Exception as e:
+            error = error or e
+    if error is not None:
+        raise error
+    return answered
 
 
 def generate_questions(
     curriculum,
     training_questions_file: str = "training_questions.json",
     testing_questions_file: str = "test_questions.json",
+    concurrency: Optional[int] = None,
+    resume: bool = True,
+    batch_size: Optional[int] = None,
 ):
+    """Generate the training and test questions of every subtopic in the curriculum.
+
+    Progress is checkpointed per (topic, subtopic, purpose). With ``resume``,
+    units completed by a previous run with the same prompt are skipped, so
+    only missing or failed subtopics are requested again. With ``batch_size``
+    above 1, that many subtopics of a topic share each request.
+    """
+    concurrency = concurrency or settings.datagen_concurrency
+    batch_size = batch_size or settings.datagen_batch_size
+
+    # Questions are appended to JSONL stores while generating and exported
+    # to the JSON array files once at the end.
+    training_store = JsonlQuestionStore(jsonl_path_for(training_questions_file))
+    testing_store = JsonlQuestionStore(jsonl_path_for(testing_questions_file))
+    checkpoint = GenerationCheckpoint(checkpoint_path_for(training_questions_file))
+
+    subtopics = [
+        (topic["topic"], subtopic)
+        for topic in curriculum["topics"]
+        for subtopic in topic["subtopics"]
+    ]
+
+    completed = checkpoint.load() if resume else {}
+    # Training questions of completed subtopics, needed to rebuild test prompts
+    existing_training_questions = {}
+    for record in training_store if completed else []:
+        key = (record["topic"], record["subtopic"])
+        existing_training_questions.setdefault(key, []).append(record["question"])
 
-    def create_base_prompt(questions_list_provided: Union[None, list] = None) -> str:
-        purpose_is_practice: bool = questions_list_provided is None
-        settings_subset = settings.practice if purpose_is_practice else settings.test
-        purpose_part = (
-            "practice questions and answers"
-            if purpose_is_practice
-            else "multi-answer test questions"
+    still_valid = {}
+    pending = []
+    for topic, subtopic in subtopics:
+        training_hash = prompt_hash(
+            create_base_prompt(topic, subtopic), TrainQuestionsSchema
         )
+        if completed.get((topic, subtopic, "train")) != training_hash:
+            pending.append((topic, subtopic, None))
+            continue
+        still_valid[(topic, subtopic, "train")] = training_hash
 
-        main_part = f"""Create {settings.practice.num_total} {purpose_part} for the topic: {topic['topic']}. Subtopic: {subtopic}."""
-        amounts_per_difficulty_part = f"{settings_subset.num_easy} easy, {settings_subset.num_medium} medium, {settings_subset.num_hard} hard questions."
+        questions_list = existing_training_questions.get((topic, subtopic), [])
+        testing_hash = prompt_hash(
+            create_base_prompt(topic, subtopic, questions_list), TestQuestionsSchema
+        )
+        if completed.get((topic, subtopic, "test")) == testing_hash:
+            still_valid[(topic, subtopic, "test")] = testing_hash
+        else:
+            pending.append((topic, subtopic, questions_list))
 
-        additional_questions_prompt = (
-            "Make sure you cover the most critical concepts, add more questions if you need to."
-            if settings_subset.allow_expansion
-            else ""
+    if still_valid:
+        # Drop records of units that are not (or no longer) completed
+        training_store.retain(
+            lambda r: (r["topic"], r["subtopic"], "train") in still_valid
+        )
+        testing_store.retain(
+            lambda r: (r["topic"], r["subtopic"], "test") in still_valid
         )
-        final_prompt = (
-            f"{main_part} {amounts_per_difficulty_part} {additional_questions_prompt}"
+        checkpoint.rewrite(still_valid)
+        print(
+            colored(
+                f"Resuming: {len(subtopics) - len(pending)} of {len(subtopics)} subtopics already generated",
+                "green",
+            )
         )
-        if not purpose_is_practice:
-            final_prompt += (
-                "avoid repeating these exact questions, its ok to test the same concepts with different questions:"
-                + str(questions_list_provided)
+    else:
+        # Ensure stores are initialized (clear old data if any)
+        training_store.reset()
+        testing_store.reset()
+        checkpoint.reset()
+
+    write_lock = Lock()
+    budget_report = PromptBudgetReport()
+    # Units checkpointed by this run, so a failed batch only reports the
+    # subtopics it didn't finish
+    saved = set()
+
+    def save(store, purpose, topic, subtopic, prompt, schema, entries):
+        with write_lock:
+            store.append(entries)
+            checkpoint.mark_done(topic, subtopic, purpose, prompt_hash(prompt, schema))
+            saved.add((topic, subtopic, purpose))
+
+    def generate_subtopic(topic, subtopic, questions_list):
+        # The test prompt lists the training questions, so within a subtopic
+        # the training questions are always generated first.
+        if questions_list is None:
+            training_prompt = create_base_prompt(topic, subtopic)
+            training_entries = generate_training_questions(
+                topic, subtopic, training_prompt
+            )
+            save(
+                training_store,
+                "train",
+                topic,
+                subtopic,
+                training_prompt,
+                TrainQuestionsSchema,
+                training_entries,
             )
-        return final_prompt
+            questions_list = [entry["question"] for entry in training_entries]
 
-    # Ensure files are initialized (clear old data if any)
-    with open(training_questions_file, "w") as file:
-        file.write("[]")
-    with open(testing_questions_file, "w") as file:
-        file.write("[]")
+        testing_prompt = create_base_prompt(
+            topic, subtopic, questions_list, budget_report
+        )
+        testing_entries = generate_test_questions(topic, subtopic, testing_prompt)
+        save(
+            testing_store,
+            "test",
+            topic,
+            subtopic,
+            testing_prompt,
+            TestQuestionsSchema,
+            testing_entries,
+        )
 
-    for topic in curriculum["topics"]:
-        for subtopic in topic["subtopics"]:
-            training_prompt = create_base_prompt()
+    def generate_batch(topic, batch):
+        # Same as generate_subtopic, for several subtopics of a topic at once
+        questions_lists = dict(batch)
+        training_prompts = {
+            subtopic: create_base_prompt(topic, subtopic)
+            for subtopic, questions_list in batch
+            if questions_list is None
+        }
 
-            training_questions = json.loads(
-                question_prompt_call(training_prompt, TrainQuestionsSchema)
+        # Every subtopic is saved as soon as it is answered, so that one
+        # failing part of a batch doesn't lose the others
+        def save_training(subtopic, questions):
+            training_entries = [
+                training_entry(topic, subtopic, question) for question in questions
+            ]
+            save(
+                training_store,
+                "train",
+                topic,
+                subtopic,
+                training_prompts[subtopic],
+                TrainQuestionsSchema,
+                training_entries,
             )
+            questions_lists[subtopic] = [
+                entry["question"] for entry in training_entries
+            ]
             print(colored(f"Training questions for subtopic: {subtopic}", "green"))
 
-            questions_list = []
-            # Write training questions directly to file
-            with open(training_questions_file, "r+") as file:
-                data = json.load(file)
-                for question in training_questions["questions"]:
-                    entry = {
-                        "topic": topic["topic"],
-                        "subtopic": subtopic,
-                        "question": question["question"],
-                        "question_difficulty": question["question_difficulty"],
-                        "answer": question["correct_answer"],
-                        "explanation": question["explanation"],
-                    }
-                    data.append(entry)
-                file.seek(0)
-                json.dump(data, file, indent=4)
-
-            # Prepare list of questions for testing
-            questions_list = [q["question"] for q in training_questions["questions"]]
-
-            testing_prompt = create_base_prompt(questions_list)
-
-            test_questions = json.loads(
-                question_prompt_call(testing_prompt, TestQuestionsSchema)
+        def save_testing(subtopic, questions):
+            save(
+                testing_store,
+                "test",
+                topic,
+                subtopic,
+                testing_prompts[subtopic],
+                TestQuestionsSchema,
+                [test_entry(topic, subtopic, question) for question in questions],
             )
             print(colored(f"Test questions for subtopic: {subtopic}", "green"))
 
-            # Write test questions directly to file
-            with open(testing_questions_file, "r+") as file:
-                data = json.load(file)
-                for question in test_questions["questions"]:
-                    entry = {
-                        "topic": topic["topic"],
-                        "subtopic": subtopic,
-                        "question": question["question"],
-                        "question_difficulty": question["question_difficulty"],
-                        "answer": question["correct_answer"],
-                        "wrong_answer1": question["wrong_answer1"],
-                        "wrong_answer2": question["wrong_answer2"],
-                        "wrong_answer3": question["wrong_answer3"],
-                        "explanation": question["explanation"],
-                    }
-                    data.append(entry)
-                file.seek(0)
-                json.dump(data, file, indent=4)
+        training_error = None
+        if training_prompts:
+            try:
+                with tagged("train", ", ".join(training_prompts)):
+                    request_question_batch(
+                        topic, training_prompts, TrainQuestionsSchema, save_training
+                    )
+            except Exception as e:
+                # Still test the subtopics that were trained
+                training_error = e
 
+        testing_prompts = {
+            subtopic: create_base_prompt(topic, subtopic, questions_list, budget_report)
+            for subtopic, questions_list in questions_lists.items()
+            if questions_list is not None
+        }
+        if testing_prompts:
+            with tagged("test", ", ".join(testing_prompts)):
+                request_question_batch(
+                    topic, testing_prompts, TestQuestionsSchema, save_testing
+                )
+        if training_error is not None:
+            raise training_error
 
-def main():
-    curriculum = generate_curriculum()
-    generate_questions(curriculum)
+    if batch_size > 1:
+        # Subtopics of the same topic, up to batch_size per job
+        by_topic = {}
+        for topic, subtopic, questions_list in pending:
+            by_topic.setdefault(topic, []).append((subtopic, questions_list))
+        jobs = []
+        for topic, subtopics_of_topic in by_topic.items():
+            for start in range(0, len(subtopics_of_topic), batch_size):
+                batch = subtopics_of_topic[start : start + batch_size]
+                units = [(topic, subtopic) for subtopic, _ in batch]
+                jobs.append((generate_batch, (topic, batch), units))
+    else:
+        jobs = [(generate_subtopic, job, [job[:2]]) for job in pending]
 
+    failures = []
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    try:
+        futures = {
+            executor.submit(function, *arguments): units
+            for function, arguments, units in jobs
+        }
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                for topic, subtopic in futures[future]:
+                    if (topic, subtopic, "test") in saved:
+                        continue
+                    print(
+                        colored(f"Failed to generate subtopic {subtopic}: {e}", "red")
+                    )
+                    failures.append((topic, subtopic, e))
+    except BaseException:
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    finally:
+        # Export whatever was generated, in curriculum order so the output
+        # files are deterministic regardless of which subtopic finished first.
+        for store, questions_file in (
+            (training_store, training_questions_file),
+            (testing_store, testing_questions_file),
+        ):
+            if store.path != Path(questions_file):
+                store.export_json(questions_file, order=subtopics)
+    executor.shutdown()
+    budget_report.report()
 
-def create_conversation(sample):
-    return {
-        "messages": [
-            {"role": "system", "content": settings.student_role},
-            {
-                "role": "user",
-                "content": "Answer the following question and add an explanation in the format 'ANSWER. My explanation: EXPLANATION': "
-                + str(sample["question"]),
-            },
-            {
-                "role": "assistant",
-                "content": str(sample["answer"])
-                + ". My explanation: "
-                + str(sample["explanation"]),
-            },
-        ]
-    }
+    if failures:
+        raise RuntimeError(
+            f"{len(failures)} of {len(subtopics)} subtopics failed, re-run to retry them: "
+            + ", ".join(subtopic for _, subtopic, _ in failures)
+        ) from failures[0][2]
 
 
-def transform_to_trainable_json(
-    training_questions_file: Path = Path("training_questions.json"),
-    trainable_questions_file: Path = Path("trainable_data.json"),
-):
-    with training_questions_file.open("r") as file:
-        data = json.load(file)
-        conversations = []
-        for item in data:
-            item_json = json.loads(item) if not isinstance(item, dict) else item
-            sample = {
-                "question": item_json["question"],
-                "answer": item_json["answer"],
-                "explanation": item_json["explanation"],
-            }
-            conversation = create_conversation(sample)
-            conversations.append(conversation)
-
-        with trainable_questions_file.open("w") as json_file:
-            json.dump(conversations, json_file, indent=4)
+def main():
+    curriculum = generate_curriculum()
+    generate_questions(curriculum)
 
 
 if __name__ == "__main__":
@@ -34,3 +34,22 @@ class MultiAnswerQuestionSchema(BaseModel):
 
 class TestQuestionsSchema(BaseModel):
     questions: List[MultiAnswerQuestionSchema]
+
+
+# Several subtopics of one topic requested at once, see datagen_batch_size
+class SubtopicTrainQuestionsSchema(BaseModel):
+    subtopic: str
+    questions: List[SingleQuestionSchema]
+
+
+class BatchTrainQuestionsSchema(BaseModel):
+    subtopics: List[SubtopicTrainQuestionsSchema]
+
+
+class SubtopicTestQuestionsSchema(BaseModel):
+    subtopic: str
+    questions: List[MultiAnswerQuestionSchema]
+
+
+class BatchTestQuestionsSchema(BaseModel):
+    subtopics: List[SubtopicTestQuestionsSchema]
@@ -0,0 +1,163 @@
+import json
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Literal, Optional, Union
+
+from termcolor import colored
+
+from .config import settings
+from .prompt_budget import count_tokens
+from .question_store import (
+    JsonlQuestionStore,
+    jsonl_path_for,
+    load_json_records,
+    write_json_records,
+)
+from .similarity import embed_texts, greedy_duplicates
+
+Scope = Literal["subtopic", "topic", "all"]
+
+
+@dataclass
+class DuplicateQuestion:
+    record: dict
+    duplicate_of: dict
+    similarity: float
+
+
+@dataclass
+class DedupResult:
+    kept: List[dict] = field(default_factory=list)
+    removed: List[DuplicateQuestion] = field(default_factory=list)
+    tokens_removed: int = 0
+
+    def report(self, examples: int = 20):
+        total = len(self.kept) + len(self.removed)
+        print(
+            colored(
+                f"Removed {len(self.removed)} of {total} questions as near-duplicates, "
+                f"{self.tokens_removed} tokens",
+                "green",
+            )
+        )
+        for duplicate in self.removed[:examples]:
+            print(
+                f"  {duplicate.similarity:.3f} {duplicate.record['question']!r}"
+                f" ~ {duplicate.duplicate_of['question']!r}"
+            )
+        if len(self.removed) > examples:
+            print(f"  ... and {len(self.removed) - examples} more")
+
+
+def record_text(record: dict) -> str:
+    """What a training record costs when fine-tuning: question, answer and explanation."""
+    return " ".join(
+        str(record.get(key, "")) for key in ("question", "answer", "explanation")
+    )
+
+
+def scope_key(record: dict, scope: Scope):
+    if scope == "subtopic":
+        return (record.get("topic"), record.get("subtopic"))
+    if scope == "topic":
+        return record.get("topic")
+    return None
+
+
+def deduplicate_questions(
+    records: List[dict],
+    embedding_function=None,
+    threshold: Optional[float] = None,
+    scope: Optional[Scope] = None,
+    batch_size: Optional[int] = None,
+    chunk_size: Optional[int] = None,
+) -> DedupResult:
+    """Drop questions that are near-duplicates of an earlier question.
+
+    Questions are embedded in batches and compared by cosine similarity; a
+    question at least ``threshold`` similar to one kept before it is
+    removed, within ``scope``: the same subtopic, the same topic, or the
+    whole file. The first occurrence is always the one kept.
+    """
+    dedup_settings = settings.dedup
+    threshold = threshold if threshold is not None else dedup_settings.threshold
+    scope = scope or dedup_settings.scope
+
+    vectors = embed_texts(
+        [record["question"] for record in records],
+        embedding_function,
+        batch_size=batch_size or dedup_settings.batch_size,
+    )
+    duplicates = greedy_duplicates(
+        vectors,
+        threshold,
+        groups=[scope_key(record, scope) for record in records],
+        chunk_size=chunk_size or dedup_settings.chunk_size,
+    )
+
+    result = DedupResult()
+    for record, duplicate in zip(records, duplicates):
+        if duplicate is None:
+            result.kept.append(record)
+            continue
+        match, similarity = duplicate
+        result.removed.append(
+            DuplicateQuestion(
+                record=record, duplicate_of=records[match], similarity=similarity
+            )
+        )
+        result.tokens_removed += count_tokens(
+            record_text(record), settings.datagen_model
+        )
+    return result
+
+
+def drop_from_store(store: JsonlQuestionStore, removed: List[dict]) -> int:
+    """Remove one stored copy of every ``removed`` record; return how many were found."""
+    doomed = Counter(json.dumps(record, sort_keys=True) for record in removed)
+    dropped = 0
+
+    def keep(record: dict) -> bool:
+        nonlocal dropped
+        key = json.dumps(record, sort_keys=True)
+        if doomed[key]:
+            doomed[key] -= 1
+            dropped += 1
+            return False
+        return True
+
+    store.retain(keep)
+    return dropped
+
+
+def dedup_questions_file(
+    questions_file: Union[str, Path] = Path("training_questions.json"),
+    output_file: Union[str, Path, None] = None,
+    embedding_function=None,
+    **options,
+) -> DedupResult:
+    """Deduplicate a questions file (JSON array or JSONL) into ``output_file``, in place by default.
+
+    Rewriting a JSON file in place also removes the duplicates from the
+    JSONL store ``create-questions`` keeps next to it, or the next resumed
+    run would export them again.
+    """
+    questions_file = Path(questions_file)
+    records = load_json_records(questions_file)
+    result = deduplicate_questions(records, embedding_function, **options)
+    output_file = Path(output_file or questions_file)
+    write_json_records(output_file, result.kept)
+    store_path = jsonl_path_for(questions_file)
+    if (
+        output_file.resolve() == questions_file.resolve()
+        and store_path != questions_file
+        and store_path.exists()
+    ):
+        dropped = drop_from_store(
+            JsonlQuestionStore(store_path),
+            [duplicate.record for duplicate in result.removed],
+        )
+        print(colored(f"Removed {dropped} duplicates from {store_path}", "green"))
+    result.report()
+    return result
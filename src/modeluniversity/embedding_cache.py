@@ -0,0 +1,138 @@
+import hashlib
+import sqlite3
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from threading import Lock
+from typing import List, Optional, Sequence, Tuple, Union
+
+from termcolor import colored
+
+
+class EmbeddingCache:
+    """LRU cache of embeddings bounded by bytes, backed by an optional SQLite store.
+
+    Entries are keyed by (model, sha256(text)) and kept as compact float32
+    arrays, in memory and on disk alike.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path, None] = None,
+        max_memory_bytes: int = 256 * 1024 * 1024,
+    ):
+        self.path = Path(path) if path else None
+        self.max_memory_bytes = max_memory_bytes
+        self.memory_bytes = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[str, str], array]" = OrderedDict()
+        self._lock = Lock()
+        self._connection = None
+
+    @staticmethod
+    def text_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        if self.path is None:
+            return None
+        if self._connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.execute("""CREATE TABLE IF NOT EXISTS embeddings (
+                    model TEXT NOT NULL,
+                    text_hash TEXT NOT NULL,
+                    vector BLOB NOT NULL,
+                    PRIMARY KEY (model, text_hash)
+                )""")
+            self._connection.commit()
+        return self._connection
+
+    def _remember(self, key: Tuple[str, str], vector: array):
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return
+        self._entries[key] = vector
+        self.memory_bytes += vector.itemsize * len(vector)
+        while self.memory_bytes > self.max_memory_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self.memory_bytes -= evicted.itemsize * len(evicted)
+
+    def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """Cached embeddings of ``texts`` in input order, ``None`` where missing."""
+        keys = [(model, self.text_hash(text)) for text in texts]
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    found[key] = self._entries[key]
+                    self.memory_hits += 1
+
+            connection = self._connect()
+            on_disk = [key for key in dict.fromkeys(keys) if key not in found]
+            if connection is not None and on_disk:
+                for start in range(0, len(on_disk), 500):
+                    chunk = on_disk[start : start + 500]
+                    placeholders = ",".join("?" * len(chunk))
+                    rows = connection.execute(
+                        f"SELECT text_hash, vector FROM embeddings "
+                        f"WHERE model = ? AND text_hash IN ({placeholders})",
+                        [model] + [text_hash for _, text_hash in chunk],
+                    ).fetchall()
+                    for text_hash, blob in rows:
+                        vector = array("f")
+                        vector.frombytes(blob)
+                        found[(model, text_hash)] = vector
+                        self._remember((model, text_hash), vector)
+                        self.disk_hits += 1
+
+            self.misses += sum(1 for key in keys if key not in found)
+        return [list(found[key]) if key in found else None for key in keys]
+
+    def put_many(
+        self, model: str, texts: Sequence[str], embeddings: Sequence[Sequence[float]]
+    ) -> List[List[float]]:
+        """Store embeddings; return them as stored, rounded to float32."""
+        rows = []
+        stored = []
+        with self._lock:
+            for text, embedding in zip(texts, embeddings):
+                key = (model, self.text_hash(text))
+                vector = array("f", embedding)
+                self._remember(key, vector)
+                rows.append((model, key[1], vector.tobytes()))
+                stored.append(list(vector))
+            connection = self._connect()
+            if connection is not None and rows:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)", rows
+                )
+                connection.commit()
+        return stored
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0,
+            "memory_bytes": self.memory_bytes,
+            "entries_in_memory": len(self._entries),
+        }
+
+    def report(self):
+        stats = self.stats()
+        if not stats["memory_hits"] + stats["disk_hits"] + stats["misses"]:
+            return
+        print(
+            colored(
+                f"Embedding cache: {stats['memory_hits']} memory hits, "
+                f"{stats['disk_hits']} disk hits, {stats['misses']} misses "
+                f"({stats['hit_rate']:.0%} hit rate)",
+                "green",
+            )
+        )
@@ -1,78 +1,135 @@
+import hashlib
 import json
 import logging
 from pathlib import Path
-from time import sleep
 import opik
 from opik import Opik
 from opik.evaluation import evaluate
 from src.modeluniversity.evals_models import SameFirstLetterMetric  # noqa: F401
 from functools import partial
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from threading import BoundedSemaphore
+import time
+from typing import Optional
 
-from litellm import RateLimitError
 from litellm import completion
 from termcolor import colored
-from .opentextbook import OpenTextBook, create_textbook_instance
+from .instrumentation import get_recorder, tagged
+from .llm_cache import completion_content
+from . import local_evals
+from .context_assembly import assemble_context
+from .local_evals import LocalResultsStore
+from .prompt_budget import PromptBudgetReport
+from .question_store import load_json_records
+from .opentextbook import OpenTextBook, create_textbook_instance, scope_filter
 from .config import settings
+from .rate_limiter import provider_of
 import random
 
 
+TEXTBOOK_RESULTS = 5
+
+
+def load_test_questions(test_questions_location: Path) -> list[dict]:
+    """The test questions of a JSON array or of the JSONL store datagen appends to."""
+    return load_json_records(test_questions_location)
+
+
+DATASET_FIELDS = (
+    "topic",
+    "subtopic",
+    "question",
+    "question_difficulty",
+    "answer",
+    "wrong_answer1",
+    "wrong_answer2",
+    "wrong_answer3",
+    "explanation",
+)
+
+
+def dataset_item_for(item_json: dict) -> dict:
+    return {field: item_json.get(field) for field in DATASET_FIELDS}
+
+
+def dataset_item_hash(item: dict) -> str:
+    serialized = json.dumps(dataset_item_for(item), sort_keys=True)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+def dataset_item_key(item: dict) -> tuple:
+    return (item.get("topic"), item.get("subtopic"), item.get("question"))
+
+
 def setup(
     client,
     dataset_name: str,
     test_questions_location: Path = Path("test_questions.json"),
+    chunk_size: int = None,
 ):
+    """Make the Opik dataset hold the test questions, uploading only what it lacks.
+
+    Items are compared by a hash of their content. Questions already in the
+    dataset are skipped, edited ones replace their previous version, and the
+    rest is inserted ``chunk_size`` items per request.
+    """
     if not dataset_name:
         logging.warning(
             "No dataset name provided. Will use the one from the settings: {settings.opik_dataset}"
         )
         dataset_name = settings.opik_dataset
+    chunk_size = chunk_size or settings.opik_upload.chunk_size
     # Create a dataset
     dataset = client.get_or_create_dataset(name=dataset_name)
-    # Load the json file test_questions.json
-    # Upload each [topic,subtopic,question,answer] to the dataset
-    with open(test_questions_location, "r") as file:
-        data = json.load(file)
-        for item in data:
-            item_json = json.loads(item) if not isinstance(item, dict) else item
-            dataset.insert(
-                [
-                    {
-                        "topic": item_json["topic"],
-                        "subtopic": item_json["subtopic"],
-                        "question": item_json["question"],
-                        "question_difficulty": item_json["question_difficulty"],
-                        "answer": item_json["answer"],
-                        "wrong_answer1": item_json["wrong_answer1"],
-                        "wrong_answer2": item_json["wrong_answer2"],
-                        "wrong_answer3": item_json["wrong_answer3"],
-                        "explanation": item_json["explanation"],
-                    }
-                ]
-            )
+
+    existing_items = dataset.get_items()
+    existing_hashes = {dataset_item_hash(item) for item in existing_items}
+
+    # Upload each [topic,subtopic,question,answer] the dataset doesn't hold yet
+    wanted = {}
+    for item_json in load_test_questions(test_questions_location):
+        item = dataset_item_for(item_json)
+        wanted.setdefault(dataset_item_hash(item), item)
+    new_items = [
+        item for item_hash, item in wanted.items() if item_hash not in existing_hashes
+    ]
+
+    # An edited question replaces its previous version
+    edited_keys = {dataset_item_key(item) for item in new_items}
+    superseded_ids = [
+        item["id"]
+        for item in existing_items
+        if item.get("id")
+        and dataset_item_key(item) in edited_keys
+        and dataset_item_hash(item) not in wanted
+    ]
+    if superseded_ids:
+        dataset.delete(superseded_ids)
+
+    for start in range(0, len(new_items), chunk_size):
+        dataset.insert(new_items[start : start + chunk_size])
+
+    print(
+        colored(
+            f"Dataset {dataset_name}: {len(wanted) - len(new_items)} questions already uploaded, "
+            f"{len(new_items)} uploaded, {len(superseded_ids)} outdated removed",
+            "green",
+        )
+    )
     return dataset
 
 
 def question_prompt_call(prompt: str, a_model: str):
-    retries = 0
-    while retries < 5:
-        try:
-            response = completion(
-                model=a_model,
-                messages=[
-                    {"role": "system", "content": settings.student_role},
-                    {"role": "user", "content": prompt},
-                ],
-                temperature=0,
-                max_tokens=256,
-            )
-
-            return response["choices"][0]["message"]["content"]
-        except RateLimitError as e:
-            print(
-                colored("Rate limit error. Waiting 30 seconds before retrying", "red")
-            )
-            sleep(30)
-            retries += 1
+    return completion_content(
+        completion,
+        model=a_model,
+        messages=[
+            {"role": "system", "content": settings.student_role},
+            {"role": "user", "content": prompt},
+        ],
+        temperature=0,
+        max_tokens=256,
+    )
 
 
 def create_answer_choices(correct_answer, wrong_answer1, wrong_answer2, wrong_answer3):
@@ -95,10 +152,28 @@ def create_answer_choices(correct_answer, wrong_answer1, wrong_answer2, wrong_an
     return (correct_choice, multiline)
 
 
+def retrieval_query(dataset_item) -> str:
+    """The textbook query of a question.
+
+    Unlike the shuffled answer choices it doesn't change between calls, so
+    the context of every question can be prefetched before evaluating.
+    """
+    return "\n".join(
+        [
+            dataset_item["question"],
+            dataset_item["answer"],
+            dataset_item["wrong_answer1"],
+            dataset_item["wrong_answer2"],
+            dataset_item["wrong_answer3"],
+        ]
+    )
+
+
 def evaluation_task_open(
     dataset_item,
     a_model: str,
     textbook: OpenTextBook,
+    context_report: Optional[PromptBudgetReport] = None,
 ):
     # your LLM application is called here
     input = dataset_item["question"]
@@ -117,18 +192,31 @@ def evaluation_task_open(
         + answer_choices
         + "\n } Provide the letter(A/B/C/D) followed by an explanation .\n"
     )
-    textbook_content = textbook.query([answer_choices], 5)
-    answer = question_prompt_call(
-        "The following is retrieved material to help you answer the question: \n\n"
-        + str(textbook_content)
-        + "\n\n Your TASK:\n "
-        + prompt,
-        a_model=a_model,
+    textbook_content = textbook.retrieve(
+        retrieval_query(dataset_item),
+        TEXTBOOK_RESULTS,
+        scope_filter(dataset_item, settings.textbook.retrieval_scope),
     )
+    # Deduplicated, numbered and within the budget of the evaluated model
+    context = assemble_context(
+        textbook_content,
+        a_model,
+        settings.context_assembly.max_tokens_for(a_model, provider_of(a_model)),
+    )
+    if context_report is not None:
+        context_report.add(context)
+    with tagged("eval", dataset_item.get("subtopic")):
+        answer = question_prompt_call(
+            "The following is retrieved material to help you answer the question: \n\n"
+            + context.text
+            + "\n\n Your TASK:\n "
+            + prompt,
+            a_model=a_model,
+        )
     result = {
         "input": prompt,
         "output": answer,
-        "context": [precontext, str(textbook_content)],
+        "context": [precontext, context.text],
         "reference": str(correct_choice),
     }
     return result
@@ -155,7 +243,8 @@ def evaluation_task_closed(
         + answer_choices
         + "\n } Respond first with ONE LETTER picking the answer, followed by an explanation why you chose it over other answers. For example: E. because this answer included more complete information about the topic.\n"
     )
-    answer = question_prompt_call(prompt, a_model=a_model)
+    with tagged("eval", dataset_item.get("subtopic")):
+        answer = question_prompt_call(prompt, a_model=a_model)
     result = {
         "input": prompt,
         "output": answer,
@@ -165,20 +254,52 @@ def evaluation_task_closed(
     return result
 
 
+def task_threads_for(llm: str) -> int:
+    return settings.eval_concurrency.task_threads_for(provider_of(llm))
+
+
+def with_slot(dataset_item, task_function, slots: BoundedSemaphore):
+    # Caps the questions in flight across all the models evaluated at once
+    with slots:
+        return task_function(dataset_item)
+
+
 def run_the_evaluation(
     an_opik_client: Opik,
     metrics: list[opik.evaluation.metrics.base_metric],
     llm_evals_list: list[str],
     use_textbook: bool,
     test_questions_location: Path = Path("test_questions.json"),
-    number_of_task_threads=4,
+    number_of_task_threads: int = None,
     evaluation_dataset_name: str = None,
+    backend: str = None,
+    results_path: Path = None,
 ):
-    dataset = setup(
-        client=an_opik_client,
-        dataset_name=evaluation_dataset_name,
-        test_questions_location=test_questions_location,
-    )
+    """Evaluate every model of ``llm_evals_list`` at the same time.
+
+    Each model gets ``number_of_task_threads`` question slots, or the ones of
+    its provider in ``eval_concurrency.task_threads``, and all of them share
+    ``eval_concurrency.max_parallel_tasks``. Results are keyed by model, in
+    ``llm_evals_list`` order.
+
+    The ``"opik"`` backend runs Opik experiments over the uploaded dataset.
+    The ``"local"`` backend needs no Opik client: it reads the test questions
+    directly and saves the results to the SQLite file at ``results_path``.
+    """
+    backend = backend or settings.local_evals.backend
+    if backend == "local":
+        dataset = load_test_questions(test_questions_location)
+        store = LocalResultsStore(results_path or settings.local_evals.results_path)
+        evaluate_function = partial(local_evals.evaluate, store=store)
+    elif backend == "opik":
+        dataset = setup(
+            client=an_opik_client,
+            dataset_name=evaluation_dataset_name,
+            test_questions_location=test_questions_location,
+        )
+        evaluate_function = evaluate
+    else:
+        raise ValueError(f"Unknown evaluation backend: {backend}")
     accompanying_comment = (
         "my_evaluation-open: " if use_textbook else "my_evaluation-closed: "
     )
@@ -186,27 +307,74 @@ def run_the_evaluation(
     if use_textbook:
         # Create the textbook instance
         textbook = create_textbook_instance(file_with_questions=test_questions_location)
+        # Retrieve the context of every question in a few batched queries
+        test_questions = load_test_questions(test_questions_location)
+        textbook.prefetch(
+            [retrieval_query(item) for item in test_questions],
+            TEXTBOOK_RESULTS,
+            wheres=[
+                scope_filter(item, settings.textbook.retrieval_scope)
+                for item in test_questions
+            ],
+        )
         # Wrap `evaluation_task_open` so it only requires `dataset_item`
         base_task_function = evaluation_task_open
     else:
         base_task_function = evaluation_task_closed
 
-    results_to_report = {}
+    slots = BoundedSemaphore(settings.eval_concurrency.max_parallel_tasks)
+    context_reports = {
+        llm: PromptBudgetReport(f"Textbook context for {llm}") for llm in llm_evals_list
+    }
 
-    for llm in llm_evals_list:
+    def evaluate_model(llm: str):
         if use_textbook:
-            task_function = partial(base_task_function, a_model=llm, textbook=textbook)
+            task_function = partial(
+                base_task_function,
+                a_model=llm,
+                textbook=textbook,
+                context_report=context_reports[llm],
+            )
         else:
             task_function = partial(base_task_function, a_model=llm)
 
-        eval_results = evaluate(
+        started_at = time.monotonic()
+        eval_results = evaluate_function(
             experiment_name=f"{accompanying_comment}{llm}",
             dataset=dataset,
-            task=task_function,
+            task=partial(with_slot, task_function=task_function, slots=slots),
             scoring_metrics=metrics,
-            task_threads=number_of_task_threads,
+            experiment_config={"model": llm},
+            task_threads=number_of_task_threads or task_threads_for(llm),
         )
-        results_to_report[llm] = eval_results
+        print(
+            colored(
+                f"Finished evaluating {llm} in {time.monotonic() - started_at:.1f} seconds",
+                "green",
+            )
+        )
+        return eval_results
+
+    results = {}
+    failed = {}
+    with ThreadPoolExecutor(max_workers=max(1, len(llm_evals_list))) as executor:
+        futures = {executor.submit(evaluate_model, llm): llm for llm in llm_evals_list}
+        for future in as_completed(futures):
+            llm = futures[future]
+            try:
+                results[llm] = future.result()
+            except Exception as e:
+                # Let the other models finish before giving up
+                print(colored(f"Failed to evaluate {llm}: {e}", "red"))
+                failed[llm] = e
+
+    for llm in llm_evals_list:
+        context_reports[llm].report()
+
+    if failed:
+        raise RuntimeError(f"Evaluation failed for models: {', '.join(failed)}")
+
+    results_to_report = {llm: results[llm] for llm in llm_evals_list}
     return results_to_report
 
 
@@ -223,6 +391,9 @@ def main():
         use_textbook=use_textbook_in_main,
     )
     print(colored("Evaluation completed", "green"))
+    for metric in runs_metrics:
+        metric.report()
+    get_recorder().report()
 
 
 if __name__ == "__main__":
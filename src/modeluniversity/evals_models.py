@@ -1,8 +1,13 @@
 import json
-from typing import Any
+import re
+from threading import Lock
+from typing import Any, Optional
 from opik.evaluation.metrics import base_metric, score_result
 from litellm import BaseModel, completion
+from termcolor import colored
 from .config import settings
+from .instrumentation import tagged
+from .llm_cache import completion_content
 
 
 class LLMJudgeSchema(BaseModel):
@@ -10,38 +15,127 @@ class LLMJudgeSchema(BaseModel):
     reason: str
 
 
+# A letter that ends its token; "A" followed by a lowercase word is the article
+_LETTER = r"[\*\(\[\"'`]*([A-D])\b(?![\w'-])(?!(?<=A)\s+[a-z])"
+# "Answer: B", "The correct answer is **B**"
+_STATED_ANSWER = re.compile(r"(?i:\banswer(?:\s+is)?)\s*[:\-]?\s*" + _LETTER)
+# "I choose option (C)", "the right choice is D"
+_MENTIONED_CHOICE = re.compile(
+    r"(?i:\b(?:option|choice|letter|choose|pick|select)(?:\s+is)?)\s*[:\-]?\s*"
+    + _LETTER
+)
+# "B.", "**B**", "(B)", "B) ...", "B: ...", "B - ...", "B" on its own
+_LEADING_LETTER = re.compile(
+    r"^[\s\*\#\(\[\"'`>]*([A-D])(?:[\.\):\*\]\"'`,]|\s+[-–—]|\s*$|\s*\n)"
+)
+
+
+def extract_answer_letter(output: Optional[str]) -> Optional[str]:
+    """The A/B/C/D letter an answer picked, or None when it can't be told reliably.
+
+    A letter leading the output wins, unless an explicit "answer is X"
+    contradicts it. Otherwise a single stated answer, then a single
+    mentioned option, decides. Anything else is ambiguous.
+    """
+    if not output:
+        return None
+    stated = set(_STATED_ANSWER.findall(output))
+    leading = _LEADING_LETTER.match(output)
+    if leading:
+        letter = leading.group(1)
+        return letter if stated <= {letter} else None
+    if stated:
+        return stated.pop() if len(stated) == 1 else None
+    mentioned = set(_MENTIONED_CHOICE.findall(output))
+    return mentioned.pop() if len(mentioned) == 1 else None
+
+
 class SameFirstLetterMetric(base_metric.BaseMetric):
-    def __init__(self, name: str):
+    """Checks the student picked the reference letter.
+
+    The letter is extracted deterministically; the LLM judge is only asked
+    when the output is ambiguous. ``judge_fallbacks`` counts how often that
+    happened.
+    """
+
+    def __init__(self, name: str, use_judge_fallback: bool = True):
         self.name = name
+        self.use_judge_fallback = use_judge_fallback
+        self.extracted_scores = 0
+        self.judge_fallbacks = 0
+        self._lock = Lock()
 
     def score(self, output: str, reference: str, **ignored_kwargs: Any):
+        letter = extract_answer_letter(output)
+        if letter is not None or not self.use_judge_fallback:
+            with self._lock:
+                self.extracted_scores += 1
+            expected = reference.strip().upper()
+            return score_result.ScoreResult(
+                value=1.0 if letter == expected else 0.0,
+                name=self.name,
+                reason=(
+                    f"Picked {letter}, expected {expected}"
+                    if letter
+                    else f"No answer letter found, expected {expected}"
+                ),
+                metadata={"scored_by": "letter_extraction"},
+            )
+
+        with self._lock:
+            self.judge_fallbacks += 1
+        return self.judge_score(output, reference)
+
+    def judge_score(self, output: str, reference: str):
         prompt = (
             "You are an impartial judge evaluating the answer to a multiple-choice question. The correct answer is provided in REFERENCE, and the student's answer is provided in OUTPUT. If the student picked the right multi-choice letter give a score of 1.0, if they picked the wrong one give a score of 0.0; provide your reason for the choice.\n\n"
             + "REFERENCE: "
             + reference
             + "\n\n"
             + "OUTPUT: "
-            + output
+            + str(output)
             + "\n\n"
             + "SCORE: "
         )
 
-        response = completion(
-            model=settings.opik_eval_model,
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a judge of a multiple-choice question answering. ",
-                },
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0,
-            max_tokens=256,
-            response_format=LLMJudgeSchema,
-        )
+        with tagged("judge"):
+            response_content = completion_content(
+                completion,
+                model=settings.opik_eval_model,
+                messages=[
+                    {
+                        "role": "system",
+                        "content": "You are a judge of a multiple-choice question answering. ",
+                    },
+                    {"role": "user", "content": prompt},
+                ],
+                temperature=0,
+                max_tokens=256,
+                response_format=LLMJudgeSchema,
+            )
 
-        response_json = json.loads(response.choices[0].message.content)
+        response_json = json.loads(response_content)
 
         return score_result.ScoreResult(
-            value=response_json["score"], name=self.name, reason=response_json["reason"]
+            value=response_json["score"],
+            name=self.name,
+            reason=response_json["reason"],
+            metadata={"scored_by": "llm_judge"},
+        )
+
+    @property
+    def judge_fallback_rate(self) -> float:
+        scored = self.extracted_scores + self.judge_fallbacks
+        return self.judge_fallbacks / scored if scored else 0.0
+
+    def report(self):
+        scored = self.extracted_scores + self.judge_fallbacks
+        if not scored:
+            return
+        print(
+            colored(
+                f"{self.name}: scored {scored} answers, the LLM judge was needed for "
+                f"{self.judge_fallbacks} ({self.judge_fallback_rate:.1%})",
+                "green",
+            )
         )
@@ -0,0 +1,189 @@
+import json
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Iterator, Optional, Tuple, Union
+
+from termcolor import colored
+
+from .config import settings
+
+# Stage and subtopic of the LLM calls made in the current context
+_call_tags: ContextVar[Dict[str, Optional[str]]] = ContextVar("call_tags", default={})
+
+
+@contextmanager
+def tagged(stage: Optional[str] = None, subtopic: Optional[str] = None):
+    """Tag the LLM calls made inside the block, e.g. ``tagged("train", subtopic)``."""
+    tags = dict(_call_tags.get())
+    if stage is not None:
+        tags["stage"] = stage
+    if subtopic is not None:
+        tags["subtopic"] = subtopic
+    token = _call_tags.set(tags)
+    try:
+        yield
+    finally:
+        _call_tags.reset(token)
+
+
+@dataclass
+class CallRecord:
+    """What one LLM call cost, in time, tokens and money."""
+
+    model: str
+    stage: Optional[str] = None
+    subtopic: Optional[str] = None
+    run_id: Optional[str] = None
+    started_at: float = field(default_factory=time.time)
+    wall_seconds: float = 0.0
+    queue_seconds: float = 0.0
+    backoff_seconds: float = 0.0
+    retries: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost: float = 0.0
+    cached: bool = False
+    error: Optional[str] = None
+
+    def record_usage(self, response):
+        usage = response.get("usage") if hasattr(response, "get") else None
+        if not usage:
+            return
+        self.prompt_tokens = usage.get("prompt_tokens") or 0
+        self.completion_tokens = usage.get("completion_tokens") or 0
+        self.cost = estimate_cost(
+            self.model, self.prompt_tokens, self.completion_tokens
+        )
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """USD cost from litellm's price map, 0 for models it has no price for."""
+    try:
+        from litellm import cost_per_token
+
+        prompt_cost, completion_cost = cost_per_token(
+            model=model,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+        )
+        return prompt_cost + completion_cost
+    except Exception:
+        return 0.0
+
+
+@dataclass
+class _Totals:
+    calls: int = 0
+    cached: int = 0
+    errors: int = 0
+    wall_seconds: float = 0.0
+    queue_seconds: float = 0.0
+    backoff_seconds: float = 0.0
+    retries: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost: float = 0.0
+
+    def add(self, record: CallRecord):
+        self.calls += 1
+        self.cached += record.cached
+        self.errors += record.error is not None
+        self.wall_seconds += record.wall_seconds
+        self.queue_seconds += record.queue_seconds
+        self.backoff_seconds += record.backoff_seconds
+        self.retries += record.retries
+        self.prompt_tokens += record.prompt_tokens
+        self.completion_tokens += record.completion_tokens
+        self.cost += record.cost
+
+
+class CallRecorder:
+    """Writes a JSONL record per LLM call and keeps totals per (stage, model)."""
+
+    def __init__(self, path: Union[str, Path, None] = None, enabled: bool = True):
+        self.path = Path(path) if path else None
+        self.enabled = enabled
+        self.run_id = uuid.uuid4().hex[:12]
+        self.totals: Dict[Tuple[str, str], _Totals] = {}
+        self._lock = Lock()
+
+    @contextmanager
+    def track(self, model: str) -> Iterator[CallRecord]:
+        tags = _call_tags.get()
+        record = CallRecord(
+            model=model,
+            stage=tags.get("stage"),
+            subtopic=tags.get("subtopic"),
+            run_id=self.run_id,
+        )
+        started = time.perf_counter()
+        try:
+            yield record
+        except Exception as e:
+            record.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            record.wall_seconds = time.perf_counter() - started
+            self.add(record)
+
+    def add(self, record: CallRecord):
+        if not self.enabled:
+            return
+        with self._lock:
+            key = (record.stage or "-", record.model)
+            self.totals.setdefault(key, _Totals()).add(record)
+            if self.path is not None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with self.path.open("a", encoding="utf-8") as file:
+                    file.write(json.dumps(asdict(record)) + "\n")
+
+    def summary_table(self) -> str:
+        header = (
+            f"{'stage':<11}{'model':<40}{'calls':>6}{'cached':>7}{'errors':>7}"
+            f"{'wall s':>9}{'queue s':>9}{'backoff s':>10}{'retries':>8}"
+            f"{'prompt tok':>11}{'compl tok':>10}{'cost $':>10}"
+        )
+        lines = [header, "-" * len(header)]
+        with self._lock:
+            rows = sorted(self.totals.items(), key=lambda item: -item[1].wall_seconds)
+        for (stage, model), totals in rows:
+            lines.append(
+                f"{stage:<11}{model[:39]:<40}{totals.calls:>6}{totals.cached:>7}"
+                f"{totals.errors:>7}{totals.wall_seconds:>9.1f}"
+                f"{totals.queue_seconds:>9.1f}{totals.backoff_seconds:>10.1f}"
+                f"{totals.retries:>8}{totals.prompt_tokens:>11}"
+                f"{totals.completion_tokens:>10}{totals.cost:>10.4f}"
+            )
+        return "\n".join(lines)
+
+    def report(self):
+        if not self.enabled or not self.totals:
+            return
+        print(colored("LLM calls by stage and model, slowest first:", "green"))
+        print(self.summary_table())
+        if self.path is not None:
+            print(
+                colored(f"Per-call records (run {self.run_id}) in {self.path}", "green")
+            )
+
+
+_recorder: Optional[CallRecorder] = None
+_recorder_lock = Lock()
+
+
+def get_recorder() -> CallRecorder:
+    global _recorder
+    if _recorder is None:
+        with _recorder_lock:
+            if _recorder is None:
+                instrumentation_settings = settings.instrumentation
+                _recorder = CallRecorder(
+                    path=instrumentation_settings.path,
+                    enabled=instrumentation_settings.enabled,
+                )
+    return _recorder
@@ -0,0 +1,190 @@
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from termcolor import colored
+
+from .config import settings
+from .prompt_budget import normalize_question
+from .question_store import load_json_records, write_json_records
+from .similarity import embed_texts, top_matches
+
+
+def word_ngrams(text: str, n: int) -> Set[Tuple[str, ...]]:
+    """Word n-grams of the normalized text, the whole text if it is shorter."""
+    words = normalize_question(text).split()
+    if len(words) < n:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i : i + n]) for i in range(len(words) - n + 1)}
+
+
+class NgramIndex:
+    """Inverted index from word n-grams to the texts containing them.
+
+    ``best_overlap`` scores a query by the share of its n-grams found in a
+    single indexed text. N-grams in more than ``max_postings`` texts ("what
+    is the") say nothing about leakage and are not looked up.
+    """
+
+    def __init__(self, texts: Iterable[str], n: int = 3, max_postings: int = 1000):
+        self.n = n
+        self.max_postings = max_postings
+        self.postings: Dict[Tuple[str, ...], List[int]] = {}
+        for index, text in enumerate(texts):
+            for ngram in word_ngrams(text, n):
+                self.postings.setdefault(ngram, []).append(index)
+
+    def best_overlap(self, text: str) -> Tuple[Optional[int], float]:
+        ngrams = word_ngrams(text, self.n)
+        shared = Counter()
+        for ngram in ngrams:
+            postings = self.postings.get(ngram, ())
+            if len(postings) <= self.max_postings:
+                shared.update(postings)
+        if not shared:
+            return None, 0.0
+        index, count = shared.most_common(1)[0]
+        return index, count / len(ngrams)
+
+
+@dataclass
+class LeakageMatch:
+    """The training items closest to a test item, by embedding and by wording."""
+
+    test_item: dict
+    training_item: Optional[dict]
+    similarity: float
+    ngram_training_item: Optional[dict]
+    ngram_overlap: float
+    leaked: bool
+
+
+@dataclass
+class LeakageResult:
+    matches: List[LeakageMatch] = field(default_factory=list)
+
+    @property
+    def leaked(self) -> List[LeakageMatch]:
+        return [match for match in self.matches if match.leaked]
+
+    def clean_test_items(self) -> List[dict]:
+        return [match.test_item for match in self.matches if not match.leaked]
+
+    def by_subtopic(self) -> Dict[Tuple[str, str], Tuple[int, int]]:
+        """(test items, leaked items) per (topic, subtopic) of the test items."""
+        counts: Dict[Tuple[str, str], List[int]] = {}
+        for match in self.matches:
+            key = (match.test_item.get("topic"), match.test_item.get("subtopic"))
+            totals = counts.setdefault(key, [0, 0])
+            totals[0] += 1
+            totals[1] += match.leaked
+        return {key: tuple(totals) for key, totals in counts.items()}
+
+    def report(self, examples: int = 20):
+        leaked = self.leaked
+        print(
+            colored(
+                f"{len(leaked)} of {len(self.matches)} test questions are too close to a training question",
+                "red" if leaked else "green",
+            )
+        )
+        for (topic, subtopic), (total, leaked_count) in self.by_subtopic().items():
+            if leaked_count:
+                print(f"  {topic} / {subtopic}: {leaked_count} of {total}")
+        for match in leaked[:examples]:
+            if match.ngram_overlap > match.similarity:
+                closest, reason = (
+                    match.ngram_training_item,
+                    f"{match.ngram_overlap:.0%} shared wording",
+                )
+            else:
+                closest, reason = match.training_item, f"{match.similarity:.3f} cosine"
+            print(
+                f"  {match.test_item['question']!r} ~ {closest['question']!r} ({reason})"
+            )
+        if len(leaked) > examples:
+            print(f"  ... and {len(leaked) - examples} more")
+
+
+def find_leakage(
+    training_items: List[dict],
+    test_items: List[dict],
+    embedding_function=None,
+    threshold: Optional[float] = None,
+    ngram_threshold: Optional[float] = None,
+    ngram_size: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    chunk_size: Optional[int] = None,
+) -> LeakageResult:
+    """Match every test question with the closest training questions of any subtopic.
+
+    A test question leaks when its embedding is at least ``threshold``
+    similar to a training question's, or when at least ``ngram_threshold``
+    of its word n-grams appear in one training question.
+    """
+    leakage_settings = settings.leakage
+    threshold = threshold if threshold is not None else leakage_settings.threshold
+    ngram_threshold = (
+        ngram_threshold
+        if ngram_threshold is not None
+        else leakage_settings.ngram_threshold
+    )
+    ngram_size = ngram_size or leakage_settings.ngram_size
+    batch_size = batch_size or leakage_settings.batch_size
+
+    result = LeakageResult()
+    if not training_items:
+        result.matches = [
+            LeakageMatch(item, None, 0.0, None, 0.0, False) for item in test_items
+        ]
+        return result
+
+    training_questions = [item["question"] for item in training_items]
+    test_questions = [item["question"] for item in test_items]
+    best, scores = top_matches(
+        embed_texts(test_questions, embedding_function, batch_size),
+        embed_texts(training_questions, embedding_function, batch_size),
+        chunk_size=chunk_size or leakage_settings.chunk_size,
+    )
+    ngram_index = NgramIndex(training_questions, n=ngram_size)
+
+    for test_item, match, score in zip(test_items, best, scores):
+        ngram_match, overlap = ngram_index.best_overlap(test_item["question"])
+        result.matches.append(
+            LeakageMatch(
+                test_item=test_item,
+                training_item=training_items[match],
+                similarity=float(score),
+                ngram_training_item=(
+                    training_items[ngram_match] if ngram_match is not None else None
+                ),
+                ngram_overlap=overlap,
+                leaked=bool(score >= threshold or overlap >= ngram_threshold),
+            )
+        )
+    return result
+
+
+def check_leakage(
+    training_questions_file: Union[str, Path] = Path("training_questions.json"),
+    test_questions_file: Union[str, Path] = Path("test_questions.json"),
+    output_file: Union[str, Path, None] = None,
+    embedding_function=None,
+    **options,
+) -> LeakageResult:
+    """Report test questions too close to a training question.
+
+    With ``output_file``, the test questions that don't leak are written
+    there.
+    """
+    result = find_leakage(
+        load_json_records(training_questions_file),
+        load_json_records(test_questions_file),
+        embedding_function,
+        **options,
+    )
+    result.report()
+    if output_file is not None:
+        write_json_records(output_file, result.clean_test_items())
+    return result
@@ -0,0 +1,230 @@
+import hashlib
+import json
+import sqlite3
+import time
+from pathlib import Path
+from threading import Lock
+from typing import Any, Callable, Optional, Union
+
+from termcolor import colored
+
+from .config import settings
+from .instrumentation import get_recorder
+from .rate_limiter import call_with_retries
+
+
+class CompletionCache:
+    """Persistent, content-addressed cache of LLM completion contents.
+
+    Entries are keyed by a hash of everything that shapes the response (model,
+    messages, temperature, max_tokens and the response_format schema) and are
+    evicted by age and by count, least recently used first.
+    """
+
+    _EVICT_EVERY = 100
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        max_entries: int = 100_000,
+        max_age_days: float = 30,
+        enabled: bool = True,
+    ):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+        self._lock = Lock()
+        self._connection = None
+
+    @staticmethod
+    def key_for(
+        model: str,
+        messages: list,
+        temperature: float,
+        max_tokens: Optional[int],
+        response_format: Any = None,
+    ) -> str:
+        if hasattr(response_format, "model_json_schema"):
+            response_format = response_format.model_json_schema()
+        request = {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "response_format": response_format,
+        }
+        serialized = json.dumps(request, sort_keys=True, default=str)
+        return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.execute("""CREATE TABLE IF NOT EXISTS completions (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )""")
+            self._connection.commit()
+            self._evict()
+        return self._connection
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute(
+                "SELECT content, created_at FROM completions WHERE key = ?", (key,)
+            ).fetchone()
+            now = time.time()
+            if row is None or now - row[1] > self.max_age_days * 86400:
+                self.misses += 1
+                return None
+            connection.execute(
+                "UPDATE completions SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            connection.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, model: str, content: str):
+        if not self.enabled:
+            return
+        with self._lock:
+            connection = self._connect()
+            now = time.time()
+            connection.execute(
+                "INSERT OR REPLACE INTO completions VALUES (?, ?, ?, ?, ?)",
+                (key, model, content, now, now),
+            )
+            connection.commit()
+            self._puts += 1
+            if self._puts % self._EVICT_EVERY == 0:
+                self._evict()
+
+    def _evict(self):
+        connection = self._connection
+        oldest_allowed = time.time() - self.max_age_days * 86400
+        connection.execute(
+            "DELETE FROM completions WHERE created_at < ?", (oldest_allowed,)
+        )
+        connection.execute(
+            """DELETE FROM completions WHERE key IN (
+                SELECT key FROM completions ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+            )""",
+            (self.max_entries,),
+        )
+        connection.commit()
+
+    def clear(self):
+        with self._lock:
+            connection = self._connect()
+            connection.execute("DELETE FROM completions")
+            connection.commit()
+            connection.execute("VACUUM")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return (
+                self._connect()
+                .execute("SELECT COUNT(*) FROM completions")
+                .fetchone()[0]
+            )
+
+    def report(self):
+        lookups = self.hits + self.misses
+        if not self.enabled or not lookups:
+            return
+        print(
+            colored(
+                f"Completion cache: {self.hits} hits, {self.misses} misses "
+                f"({self.hits / lookups:.0%} hit rate)",
+                "green",
+            )
+        )
+
+
+_completion_cache: Optional[CompletionCache] = None
+_completion_cache_lock = Lock()
+
+
+def get_completion_cache() -> CompletionCache:
+    global _completion_cache
+    with _completion_cache_lock:
+        if _completion_cache is None:
+            cache_settings = settings.completion_cache
+            _completion_cache = CompletionCache(
+                path=cache_settings.path,
+                max_entries=cache_settings.max_entries,
+                max_age_days=cache_settings.max_age_days,
+                enabled=cache_settings.enabled,
+            )
+        return _completion_cache
+
+
+def is_cacheable(response, content: Optional[str], response_format: Any) -> bool:
+    """Whether a completion is complete and, with a ``response_format``, parses.
+
+    Truncated or malformed responses are not cached, so that the next run
+    asks the provider again instead of failing on the same response.
+    """
+    if not content:
+        return False
+    if response["choices"][0].get("finish_reason") == "length":
+        return False
+    try:
+        if hasattr(response_format, "model_validate_json"):
+            response_format.model_validate_json(content)
+        elif response_format is not None:
+            json.loads(content)
+    except ValueError:  # pydantic's ValidationError included
+        return False
+    return True
+
+
+def completion_content(
+    completion_function: Callable,
+    model: str,
+    messages: list,
+    temperature: float = 0,
+    max_tokens: Optional[int] = None,
+    response_format: Any = None,
+) -> str:
+    """Return the message content of a completion, served from the cache when possible.
+
+    Cache misses are sent through ``call_with_retries`` and so share the
+    provider's rate limits with every other caller. Only complete responses
+    that match ``response_format`` are cached. Every call, cached or not,
+    is recorded by the instrumentation.
+    """
+    cache = get_completion_cache()
+    key = cache.key_for(model, messages, temperature, max_tokens, response_format)
+    with get_recorder().track(model) as call_record:
+        content = cache.get(key)
+        if content is not None:
+            call_record.cached = True
+            return content
+
+        request = {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+        }
+        if response_format is not None:
+            request["response_format"] = response_format
+        response = call_with_retries(
+            completion_function, call_record=call_record, **request
+        )
+        call_record.record_usage(response)
+    content = response["choices"][0]["message"]["content"]
+    if is_cacheable(response, content, response_format):
+        cache.put(key, model, content)
+    return content
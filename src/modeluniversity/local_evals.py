@@ -0,0 +1,241 @@
+import json
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from threading import Lock
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from opik.evaluation.metrics.score_result import ScoreResult
+from termcolor import colored
+
+
+@dataclass
+class LocalEvaluationResult:
+    experiment_id: int
+    experiment_name: str
+    test_results: List[dict] = field(default_factory=list)
+    scores: Dict[str, float] = field(default_factory=dict)
+    failed: Dict[str, int] = field(default_factory=dict)
+
+
+class LocalResultsStore:
+    """SQLite store of offline evaluation runs.
+
+    Each ``evaluate`` call is an experiment. Its per-item scores go to
+    ``item_results`` and the mean of every metric to ``aggregates``. Failed
+    scores are stored with a NULL score and the error as their reason, and
+    are left out of the means.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self._lock = Lock()
+        self._connection = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.executescript("""
+                CREATE TABLE IF NOT EXISTS experiments (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT NOT NULL,
+                    config TEXT,
+                    started_at REAL NOT NULL,
+                    finished_at REAL NOT NULL,
+                    items INTEGER NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS item_results (
+                    experiment_id INTEGER NOT NULL REFERENCES experiments(id),
+                    item_index INTEGER NOT NULL,
+                    topic TEXT,
+                    subtopic TEXT,
+                    question TEXT,
+                    output TEXT,
+                    reference TEXT,
+                    metric TEXT NOT NULL,
+                    score REAL,
+                    reason TEXT,
+                    metadata TEXT
+                );
+                CREATE TABLE IF NOT EXISTS aggregates (
+                    experiment_id INTEGER NOT NULL REFERENCES experiments(id),
+                    metric TEXT NOT NULL,
+                    mean REAL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (experiment_id, metric)
+                );
+                """)
+        return self._connection
+
+    def save(
+        self,
+        experiment_name: str,
+        experiment_config: Optional[dict],
+        started_at: float,
+        test_results: List[dict],
+    ) -> LocalEvaluationResult:
+        scores_by_metric: Dict[str, List[float]] = {}
+        failed: Dict[str, int] = {}
+        rows = []
+        for index, test_result in enumerate(test_results):
+            item = test_result["dataset_item"]
+            output = test_result["task_output"]
+            # A failed task has no output, only its error
+            output_text = (
+                str(output["output"]) if "output" in output else output.get("error")
+            )
+            reference = str(output["reference"]) if "reference" in output else None
+            for score in test_result["scores"]:
+                values = scores_by_metric.setdefault(score.name, [])
+                failed.setdefault(score.name, 0)
+                if score.scoring_failed:
+                    failed[score.name] += 1
+                else:
+                    values.append(score.value)
+                rows.append(
+                    (
+                        item.get("topic"),
+                        item.get("subtopic"),
+                        item.get("question"),
+                        output_text,
+                        reference,
+                        score.name,
+                        None if score.scoring_failed else score.value,
+                        score.reason,
+                        json.dumps(score.metadata) if score.metadata else None,
+                        index,
+                    )
+                )
+        means = {
+            metric: sum(values) / len(values)
+            for metric, values in scores_by_metric.items()
+            if values
+        }
+
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                experiment_id = connection.execute(
+                    "INSERT INTO experiments (name, config, started_at, finished_at, items) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (
+                        experiment_name,
+                        json.dumps(experiment_config) if experiment_config else None,
+                        started_at,
+                        time.time(),
+                        len(test_results),
+                    ),
+                ).lastrowid
+                connection.executemany(
+                    "INSERT INTO item_results (topic, subtopic, question, output, reference, "
+                    "metric, score, reason, metadata, item_index, experiment_id) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [row + (experiment_id,) for row in rows],
+                )
+                connection.executemany(
+                    "INSERT INTO aggregates VALUES (?, ?, ?, ?)",
+                    [
+                        (experiment_id, metric, means.get(metric), len(values))
+                        for metric, values in scores_by_metric.items()
+                    ],
+                )
+        return LocalEvaluationResult(
+            experiment_id=experiment_id,
+            experiment_name=experiment_name,
+            test_results=test_results,
+            scores=means,
+            failed={metric: count for metric, count in failed.items() if count},
+        )
+
+    def aggregates(self, experiment_id: int) -> Dict[str, float]:
+        with self._lock:
+            rows = (
+                self._connect()
+                .execute(
+                    "SELECT metric, mean FROM aggregates WHERE experiment_id = ?",
+                    (experiment_id,),
+                )
+                .fetchall()
+            )
+        return dict(rows)
+
+
+def failed_score(metric, error: Exception) -> ScoreResult:
+    """A score that could not be computed, recorded the way Opik records it."""
+    return ScoreResult(
+        name=metric.name,
+        value=0.0,
+        reason=f"{type(error).__name__}: {error}",
+        scoring_failed=True,
+    )
+
+
+def score_item(dataset_item: dict, task_output: dict, scoring_metrics: list) -> list:
+    # Metrics get the dataset item and the task output as keyword arguments,
+    # like Opik passes them
+    arguments = {**dataset_item, **task_output}
+    scores = []
+    for metric in scoring_metrics:
+        try:
+            result = metric.score(**arguments)
+        except Exception as e:
+            result = failed_score(metric, e)
+        scores.extend(result if isinstance(result, list) else [result])
+    return scores
+
+
+def evaluate(
+    experiment_name: str,
+    dataset: List[dict],
+    task: Callable[[dict], dict],
+    scoring_metrics: list,
+    task_threads: int = 4,
+    experiment_config: Optional[Dict[str, Any]] = None,
+    store: Optional[LocalResultsStore] = None,
+) -> LocalEvaluationResult:
+    """Offline stand-in for ``opik.evaluation.evaluate``.
+
+    Runs ``task`` over the dataset items in a local worker pool, scores the
+    outputs and saves everything to ``store``. Nothing goes over the network
+    apart from the task's own LLM calls. An item whose task or metric fails
+    gets failed scores, with the error as their reason, and the other items
+    are still scored and saved.
+    """
+    started_at = time.time()
+
+    def run_item(dataset_item: dict) -> dict:
+        try:
+            task_output = task(dataset_item)
+        except Exception as e:
+            return {
+                "dataset_item": dataset_item,
+                "task_output": {"error": f"{type(e).__name__}: {e}"},
+                "scores": [failed_score(metric, e) for metric in scoring_metrics],
+            }
+        return {
+            "dataset_item": dataset_item,
+            "task_output": task_output,
+            "scores": score_item(dataset_item, task_output, scoring_metrics),
+        }
+
+    with ThreadPoolExecutor(max_workers=task_threads) as executor:
+        test_results = list(executor.map(run_item, dataset))
+
+    if store is None:
+        store = LocalResultsStore(":memory:")
+    result = store.save(experiment_name, experiment_config, started_at, test_results)
+    summary = ", ".join(
+        f"{metric} {mean:.2f}" for metric, mean in result.scores.items()
+    )
+    print(
+        colored(
+            f"{experiment_name}: {summary or 'no scores'} over {len(test_results)} items",
+            "green",
+        )
+    )
+    for metric, count in result.failed.items():
+        print(colored(f"{experiment_name}: {metric} failed on {count} items", "red"))
+    return result
@@ -0,0 +1,221 @@
+import json
+import os
+from pathlib import Path
+from threading import Lock
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+
+from .similarity import normalize_rows
+
+
+def metadata_matches(metadata: dict, where: Optional[dict]) -> bool:
+    """Whether ``metadata`` passes a Chroma ``where`` filter of equalities, possibly under ``$and``."""
+    if not where:
+        return True
+    if "$and" in where:
+        return all(metadata_matches(metadata, clause) for clause in where["$and"])
+    return all(metadata.get(key) == value for key, value in where.items())
+
+
+def where_key(where: Optional[dict]) -> Optional[str]:
+    return json.dumps(where, sort_keys=True) if where else None
+
+
+class NumpyVectorIndex:
+    """Exact nearest-neighbour search over a memory-mapped float32 matrix.
+
+    Implements the part of Chroma's collection API the textbook uses
+    (``count``, ``get``, ``upsert``, ``delete`` and ``query``). Unit-length
+    embeddings are kept in ``<name>.embeddings.npy`` and ids, documents and
+    metadata in ``<name>.index.json``; a query is one matrix product. A
+    ``where`` filter searches only the rows of its partition, whose
+    positions are kept per filter. Every change rewrites both files
+    atomically, which is cheap for a textbook of a few thousand chunks.
+    """
+
+    def __init__(self, path: Union[str, Path], name: str, embedding_function=None):
+        self.name = name
+        self.embedding_function = embedding_function
+        self.embeddings_file = Path(path) / f"{name}.embeddings.npy"
+        self.index_file = Path(path) / f"{name}.index.json"
+        self._lock = Lock()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.index_file, "r") as file:
+                index = json.load(file)
+            embeddings = np.load(self.embeddings_file, mmap_mode="r")
+        except (FileNotFoundError, json.JSONDecodeError, ValueError):
+            index, embeddings = {"ids": [], "documents": [], "metadatas": []}, None
+        if embeddings is None or len(embeddings) != len(index["ids"]):
+            index, embeddings = {"ids": [], "documents": [], "metadatas": []}, None
+        self._ids: List[str] = index["ids"]
+        self._documents: List[str] = index["documents"]
+        self._metadatas: List[dict] = index["metadatas"]
+        self._embeddings = (
+            embeddings if embeddings is not None else np.zeros((0, 0), np.float32)
+        )
+        self._positions = {chunk_id: i for i, chunk_id in enumerate(self._ids)}
+        self._partitions: Dict[str, np.ndarray] = {}
+
+    def _partition(self, where: dict) -> np.ndarray:
+        key = where_key(where)
+        positions = self._partitions.get(key)
+        if positions is None:
+            positions = np.array(
+                [
+                    position
+                    for position, metadata in enumerate(self._metadatas)
+                    if metadata_matches(metadata, where)
+                ],
+                dtype=np.int64,
+            )
+            self._partitions[key] = positions
+        return positions
+
+    def _save(self):
+        self.index_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_embeddings = self.embeddings_file.with_name(
+            self.embeddings_file.name + ".tmp"
+        )
+        embeddings = np.ascontiguousarray(self._embeddings, dtype=np.float32)
+        with open(tmp_embeddings, "wb") as file:
+            np.save(file, embeddings)
+        tmp_index = self.index_file.with_name(self.index_file.name + ".tmp")
+        with open(tmp_index, "w") as file:
+            json.dump(
+                {
+                    "ids": self._ids,
+                    "documents": self._documents,
+                    "metadatas": self._metadatas,
+                },
+                file,
+            )
+        # Unmap the old file before replacing it; Windows refuses to replace a
+        # mapped file, and a reader still holding the old map would see stale rows
+        del embeddings
+        self._embeddings = None
+        self._partitions = {}
+        os.replace(tmp_embeddings, self.embeddings_file)
+        os.replace(tmp_index, self.index_file)
+        self._embeddings = np.load(self.embeddings_file, mmap_mode="r")
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        if self.embedding_function is None:
+            from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
+
+            self.embedding_function = DefaultEmbeddingFunction()
+        return normalize_rows(self.embedding_function(texts))
+
+    def count(self) -> int:
+        return len(self._ids)
+
+    def get(self, ids: Optional[List[str]] = None, include=("documents", "metadatas")):
+        with self._lock:
+            positions = (
+                range(len(self._ids))
+                if ids is None
+                else [self._positions[i] for i in ids if i in self._positions]
+            )
+            result = {"ids": [self._ids[p] for p in positions]}
+            if "documents" in include:
+                result["documents"] = [self._documents[p] for p in positions]
+            if "metadatas" in include:
+                result["metadatas"] = [self._metadatas[p] for p in positions]
+        return result
+
+    def upsert(self, ids: List[str], documents: List[str], metadatas: List[dict]):
+        vectors = self._embed(list(documents))
+        with self._lock:
+            embeddings = np.array(self._embeddings, dtype=np.float32)
+            if not len(embeddings):
+                embeddings = np.zeros((0, vectors.shape[1]), np.float32)
+            new_rows = []
+            for chunk_id, document, metadata, vector in zip(
+                ids, documents, metadatas, vectors
+            ):
+                position = self._positions.get(chunk_id)
+                if position is None:
+                    self._positions[chunk_id] = len(self._ids)
+                    new_rows.append(vector)
+                    self._ids.append(chunk_id)
+                    self._documents.append(document)
+                    self._metadatas.append(metadata)
+                else:
+                    embeddings[position] = vector
+                    self._documents[position] = document
+                    self._metadatas[position] = metadata
+            if new_rows:
+                embeddings = np.concatenate([embeddings, np.stack(new_rows)])
+            self._embeddings = embeddings
+            self._save()
+
+    def delete(self, ids: List[str]):
+        with self._lock:
+            doomed = {self._positions[i] for i in ids if i in self._positions}
+            if not doomed:
+                return
+            keep = [p for p in range(len(self._ids)) if p not in doomed]
+            self._embeddings = np.asarray(self._embeddings)[keep]
+            self._ids = [self._ids[p] for p in keep]
+            self._documents = [self._documents[p] for p in keep]
+            self._metadatas = [self._metadatas[p] for p in keep]
+            self._positions = {chunk_id: i for i, chunk_id in enumerate(self._ids)}
+            self._save()
+
+    def query(
+        self,
+        query_texts: List[str],
+        n_results: int = 10,
+        where: Optional[dict] = None,
+    ) -> Dict[str, list]:
+        """The ``n_results`` closest documents of every query, by cosine similarity."""
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        if not query_texts:
+            return result
+        queries = self._embed(list(query_texts))
+        with self._lock:
+            embeddings = self._embeddings
+            ids, documents, metadatas = self._ids, self._documents, self._metadatas
+            positions = self._partition(where) if where else np.arange(len(embeddings))
+        n_results = min(n_results, len(positions))
+        if n_results == 0:
+            for key in result:
+                result[key] = [[] for _ in query_texts]
+            return result
+
+        vectors = np.asarray(embeddings)
+        if len(positions) < len(vectors):
+            vectors = vectors[positions]
+        similarities = queries @ vectors.T
+        if n_results < len(positions):
+            top = np.argpartition(-similarities, n_results - 1, axis=1)[:, :n_results]
+        else:
+            top = np.tile(np.arange(len(positions)), (len(queries), 1))
+        for row, candidates in enumerate(top):
+            order = candidates[np.argsort(-similarities[row, candidates])]
+            ranked = positions[order]
+            result["ids"].append([ids[p] for p in ranked])
+            result["documents"].append([documents[p] for p in ranked])
+            result["metadatas"].append([metadatas[p] for p in ranked])
+            result["distances"].append([float(1 - similarities[row, p]) for p in order])
+        return result
+
+
+class NumpyIndexClient:
+    """Stand-in for ``chromadb.PersistentClient`` storing ``NumpyVectorIndex`` files under ``path``."""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+
+    def get_or_create_collection(self, name: str, embedding_function=None):
+        return NumpyVectorIndex(self.path, name, embedding_function=embedding_function)
+
+    def delete_collection(self, name: str):
+        for suffix in (".embeddings.npy", ".index.json"):
+            (self.path / f"{name}{suffix}").unlink(missing_ok=True)
+
+    def get_max_batch_size(self) -> int:
+        return 1 << 31
@@ -1,36 +1,45 @@
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 
-from typing import List
+from typing import List, Optional
+
+from .embedding_cache import EmbeddingCache
 
 
 class OllamaBatchEmbeddingWrapper:
-    def __init__(self, embedding_function):
+    def __init__(self, embedding_function, cache: Optional[EmbeddingCache] = None):
         self.embedding_function = embedding_function
-        self.cache = {}  # To cache already computed embeddings
+        # To cache already computed embeddings
+        self.cache = cache if cache is not None else EmbeddingCache()
 
     def __call__(self, input):
         # ChromaDB calls this for single or batch embeddings
         if isinstance(input, str):  # Single string case
-            if input in self.cache:
-                return self.cache[input]
-            embedding = self.embedding_function(input)  # Call single embedding
-            self.cache[input] = embedding
-            return embedding
+            return self([input])[0]
         elif isinstance(input, list):  # Batch case
-            embeddings = []
-            uncached_inputs = []
-            for text in input:
-                if text in self.cache:
-                    embeddings.append(self.cache[text])
-                else:
-                    uncached_inputs.append(text)
-
-            # Get embeddings for uncached inputs
+            model = self.embedding_function.model
+            embeddings = self.cache.get_many(model, input)
+
+            # Get embeddings for uncached inputs, each distinct text once
+            uncached_inputs = list(
+                dict.fromkeys(
+                    text
+                    for text, embedding in zip(input, embeddings)
+                    if embedding is None
+                )
+            )
             if uncached_inputs:
                 new_embeddings = self.embedding_function.batch_embed(uncached_inputs)
-                for text, embedding in zip(uncached_inputs, new_embeddings):
-                    self.cache[text] = embedding
-                    embeddings.append(embedding)
+                new_embeddings = self.cache.put_many(
+                    model, uncached_inputs, new_embeddings
+                )
+                computed = dict(zip(uncached_inputs, new_embeddings))
+                # Keep the output aligned with the input order
+                embeddings = [
+                    embedding if embedding is not None else computed[text]
+                    for text, embedding in zip(input, embeddings)
+                ]
             return embeddings
         else:
             raise ValueError(
@@ -39,24 +48,86 @@ class OllamaBatchEmbeddingWrapper:
 
 
 class OllamaEmbeddingFunction:
+    """Embeddings from an Ollama server over a pooled keep-alive session.
+
+    Batches go to the multi-input ``/api/embed`` endpoint. Servers that
+    predate it get concurrent single-prompt ``/api/embeddings`` calls from a
+    bounded worker pool instead.
+    """
+
     def __init__(
         self,
         endpoint: str = "http://localhost:11434/api/embeddings",
         model: str = "jina/jina-embeddings-v2-small-en",
+        batch_endpoint: Optional[str] = None,
+        timeout: float = 60.0,
+        batch_size: int = 64,
+        max_workers: int = 4,
     ):
         self.endpoint = endpoint
+        self.batch_endpoint = batch_endpoint or self._batch_endpoint_for(endpoint)
         self.model = model
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self._batch_supported = None  # Unknown until the first batch request
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    @staticmethod
+    def _batch_endpoint_for(endpoint: str) -> str:
+        if endpoint.endswith("/api/embeddings"):
+            return endpoint[: -len("/api/embeddings")] + "/api/embed"
+        return endpoint
 
     def __call__(self, input: str) -> list[float]:
         """Single input embedding"""
+        return self.batch_embed([input])[0]
+
+    def _embed_one(self, text: str) -> list[float]:
         payload = {
             "model": self.model,
-            "prompt": input,
+            "prompt": text,
         }
-        response = requests.post(self.endpoint, json=payload)
+        response = self.session.post(self.endpoint, json=payload, timeout=self.timeout)
         response.raise_for_status()
         return response.json().get("embedding", [])
 
+    def _embed_batch(self, texts: List[str]) -> List[list[float]]:
+        payload = {
+            "model": self.model,
+            "input": texts,
+        }
+        response = self.session.post(
+            self.batch_endpoint, json=payload, timeout=self.timeout
+        )
+        response.raise_for_status()
+        embeddings = response.json().get("embeddings", [])
+        if len(embeddings) != len(texts):
+            raise ValueError(
+                f"Ollama returned {len(embeddings)} embeddings for {len(texts)} inputs"
+            )
+        return embeddings
+
     def batch_embed(self, inputs: list[str]) -> list[list[float]]:
         """Batch embedding for multiple inputs"""
-        return [self.__call__(text) for text in inputs]
+        if self._batch_supported is not False:
+            try:
+                embeddings = []
+                for start in range(0, len(inputs), self.batch_size):
+                    embeddings.extend(
+                        self._embed_batch(inputs[start : start + self.batch_size])
+                    )
+                self._batch_supported = True
+                return embeddings
+            except requests.HTTPError as e:
+                # Ollama before 0.3.4 has no /api/embed
+                if self._batch_supported or e.response.status_code != 404:
+                    raise
+                self._batch_supported = False
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(self._embed_one, inputs))
@@ -1,31 +1,52 @@
+import hashlib
 import json
 import logging
+import time
 from pathlib import Path
-from typing import Union
+from typing import Iterable, List, Optional, Tuple, Union
 
-import chromadb
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from termcolor import colored
+from src.modeluniversity.embedding_cache import EmbeddingCache
+from src.modeluniversity.numpy_index import (
+    NumpyIndexClient,
+    metadata_matches,
+    where_key,
+)
 from src.modeluniversity.ollama_embeddings import (
     OllamaBatchEmbeddingWrapper,
     OllamaEmbeddingFunction,
 )
 import os
 from .config import settings
+from .question_store import load_json_records
 
 
 class OpenTextBook:
+    """Training questions indexed in a persistent vector index.
+
+    The index is a Chroma collection, or with ``backend="numpy"`` a
+    ``NumpyVectorIndex``, under ``db_path``. Every chunk id starts with the
+    hash of the content it came from, and a manifest of the source file is
+    kept next to the database. A warm start with an unchanged file skips
+    indexing altogether, and a changed file only embeds the entries that
+    are new or edited.
+    """
+
     _collection = None
     _client = None
-    _idCounter = 0
 
     def __init__(
         self,
         embedding_function=None,
         file_with_questions: Path = Path("training_questions.json"),
         collections_name="textbook",
+        db_path: Optional[Path] = None,
+        backend: Optional[str] = None,
     ):
-        self._client = chromadb.PersistentClient(path="./db")
+        self.db_path = Path(db_path or settings.textbook.path)
+        self.backend = backend or settings.textbook.backend
+        self._client = create_index_client(self.backend, self.db_path)
         self.file_with_questions = file_with_questions
         if not self.file_with_questions.exists():
             raise FileNotFoundError(
@@ -33,6 +54,32 @@ class OpenTextBook:
             )
         logging.info(f"file_with_questions for textbook : {self.file_with_questions}")
         self.collections_name = collections_name
+        self.embedding_function = embedding_function
+        self.manifest_file = self.db_path / f"{self.collections_name}.manifest.json"
+        self._prefetched = {}
+        self._partition_sizes = {}
+        self._chunk_metadatas = None
+        self._textsplitter = RecursiveCharacterTextSplitter(
+            chunk_size=2048,
+            chunk_overlap=200,
+            length_function=len,
+            is_separator_regex=False,
+        )
+
+        source_manifest = self._source_manifest()
+        stored_manifest = self._load_manifest()
+        if (
+            stored_manifest
+            and stored_manifest["embedding"] != source_manifest["embedding"]
+        ):
+            # Vectors from another embedding model can't be mixed with new ones
+            print(
+                colored(
+                    f"Embeddings changed, rebuilding {self.collections_name}", "green"
+                )
+            )
+            self._delete_collection()
+            stored_manifest = None
 
         try:
             if embedding_function is None:
@@ -45,71 +92,303 @@ class OpenTextBook:
                     embedding_function=embedding_function,
                 )
             print(colored(f"Constructing {self.collections_name} DB", "green"))
-        except chromadb.errors.InvalidCollectionException as e:
+        except Exception as e:
             print(
                 colored(f"Failed to initialize {self.collections_name} DB: {e}", "red")
             )
             raise
 
-        try:
-            with open(self.file_with_questions, "r") as file:
-                training_questions = json.load(file)
-                logging.info(f"Loaded {len(training_questions)} training questions")
-
-                for entry in training_questions:
-                    if isinstance(entry, str):
-                        entry = json.loads(entry)
-                    content = (
-                        f"In the topic of {entry['topic']} and subtopic of {entry['subtopic']}, "
-                        f"The answer to the following question '{entry['question']}' is {entry['answer']}."
-                        f"{entry['explanation']}"
-                    )
-                    logging.debug(f"upserting content: {content}")
-                    self.add_content(
-                        content,
-                        {"topic": entry["topic"], "subtopic": entry["subtopic"]},
-                    )
-        except Exception as e:
-            print(colored(f"Error loading training questions: {e}", "red"))
-            raise
+        if self._is_up_to_date(stored_manifest, source_manifest):
+            print(colored(f"{self.collections_name} DB is up to date", "green"))
+        else:
+            try:
+                source_manifest["chunks"] = self._sync()
+            except Exception as e:
+                print(colored(f"Error loading training questions: {e}", "red"))
+                raise
+            self._save_manifest(source_manifest)
 
-        self._idCounter = 0
         print(colored("Textbook initialized", "green"))
 
+    def _source_manifest(self) -> dict:
+        with open(self.file_with_questions, "rb") as file:
+            source_hash = hashlib.sha256(file.read()).hexdigest()
+        return {
+            "source": str(self.file_with_questions.resolve()),
+            "sha256": source_hash,
+            "embedding": embedding_identity(self.embedding_function),
+        }
+
+    def _is_up_to_date(self, stored_manifest, source_manifest) -> bool:
+        if not stored_manifest:
+            return False
+        same_source = all(
+            stored_manifest.get(key) == source_manifest[key]
+            for key in ("source", "sha256", "embedding")
+        )
+        return same_source and self._collection.count() == stored_manifest["chunks"]
+
+    def _load_manifest(self) -> Union[dict, None]:
+        try:
+            with open(self.manifest_file, "r") as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _save_manifest(self, manifest: dict):
+        self.manifest_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.manifest_file, "w") as file:
+            json.dump(manifest, file, indent=4)
+
+    def _delete_collection(self):
+        if isinstance(self._client, NumpyIndexClient):
+            self._client.delete_collection(self.collections_name)
+            return
+        import chromadb
+
+        try:
+            self._client.delete_collection(self.collections_name)
+        except (ValueError, chromadb.errors.InvalidCollectionException):
+            pass
+
+    def _sync(self) -> int:
+        """Make the collection mirror the questions file; return the number of chunks."""
+        training_questions = load_json_records(self.file_with_questions)
+        logging.info(f"Loaded {len(training_questions)} training questions")
+
+        entries = {}
+        for entry in training_questions:
+            content = textbook_content(entry)
+            entries[content_hash(content)] = (
+                content,
+                {"topic": entry["topic"], "subtopic": entry["subtopic"]},
+            )
+
+        existing_ids = self._collection.get(include=[])["ids"]
+        existing_hashes = {chunk_id.split("-")[0] for chunk_id in existing_ids}
+        stale_ids = [
+            chunk_id
+            for chunk_id in existing_ids
+            if chunk_id.split("-")[0] not in entries
+        ]
+        if stale_ids:
+            self._collection.delete(ids=stale_ids)
+            self._forget_partitions()
+
+        new_entries = [
+            (content, metadata)
+            for entry_hash, (content, metadata) in entries.items()
+            if entry_hash not in existing_hashes
+        ]
+        self.add_contents(new_entries)
+
+        print(
+            colored(
+                f"Textbook sync: {len(new_entries)} new or changed, "
+                f"{len(stale_ids)} stale chunks removed, "
+                f"{len(entries) - len(new_entries)} unchanged entries",
+                "green",
+            )
+        )
+        return self._collection.count()
+
     def add_content(self, content, metadatadict):
-        textsplitter = RecursiveCharacterTextSplitter(
-            chunk_size=2048,
-            chunk_overlap=200,
-            length_function=len,
-            is_separator_regex=False,
+        self.add_contents([(content, metadatadict)], show_progress=False)
+
+    def add_contents(
+        self,
+        contents: Iterable[Tuple[str, dict]],
+        batch_size: Optional[int] = None,
+        show_progress: bool = True,
+    ) -> int:
+        """Chunk and upsert (content, metadata) pairs in batches; return the number of chunks added.
+
+        Every batch is embedded with a single call of the embedding function
+        and written in a single upsert.
+        """
+        batch_size = min(
+            batch_size or settings.textbook.batch_size,
+            self._client.get_max_batch_size(),
         )
-        chunks = textsplitter.create_documents([content])
         documents, metadata, ids = [], [], []
+        added = 0
+        started = time.perf_counter()
 
-        for chunk in chunks:
-            documents.append(chunk.page_content)
-            metadata.append(metadatadict)
-            ids.append(f"entry_{self._idCounter}")
-            self._idCounter += 1
+        def flush():
+            nonlocal added
+            try:
+                self._collection.upsert(
+                    documents=documents, metadatas=metadata, ids=ids
+                )
+            except Exception as e:
+                print(colored(f"Error during upsert: {e}", "red"))
+                raise
+            added += len(documents)
+            self._forget_partitions()
+            documents.clear()
+            metadata.clear()
+            ids.clear()
+            if show_progress:
+                elapsed = time.perf_counter() - started
+                print(
+                    colored(
+                        f"Indexed {added} chunks ({added / elapsed:.1f} documents/sec)",
+                        "green",
+                    )
+                )
 
-        try:
-            self._collection.upsert(documents=documents, metadatas=metadata, ids=ids)
-        except Exception as e:
-            print(colored(f"Error during upsert: {e}", "red"))
-            raise
+        for content, metadatadict in contents:
+            entry_hash = content_hash(content)
+            for i, chunk in enumerate(self._textsplitter.split_text(content)):
+                documents.append(chunk)
+                metadata.append({**metadatadict, "content_hash": entry_hash})
+                ids.append(f"{entry_hash}-{i}")
+            if len(documents) >= batch_size:
+                flush()
+        if documents:
+            flush()
+        return added
 
-    def query(self, query_texts, n_results):
-        try:
-            result = self._collection.query(
-                query_texts=query_texts, n_results=n_results
+    def _forget_partitions(self):
+        self._partition_sizes = {}
+        self._chunk_metadatas = None
+
+    def partition_size(self, where: Optional[dict]) -> int:
+        """Number of chunks passing the ``where`` filter."""
+        if not where:
+            return self._collection.count()
+        key = where_key(where)
+        if key not in self._partition_sizes:
+            if self._chunk_metadatas is None:
+                self._chunk_metadatas = self._collection.get(include=["metadatas"])[
+                    "metadatas"
+                ]
+            self._partition_sizes[key] = sum(
+                metadata_matches(metadata, where) for metadata in self._chunk_metadatas
             )
+        return self._partition_sizes[key]
+
+    def scoped(self, where: Optional[dict], n_results: int) -> Optional[dict]:
+        """``where``, or None for a global search when its partition has fewer than ``n_results`` chunks."""
+        if where and self.partition_size(where) >= n_results:
+            return where
+        return None
+
+    def query(self, query_texts, n_results, where: Optional[dict] = None):
+        """The documents closest to each query, among the chunks passing ``where``.
+
+        A filter whose partition is too small for ``n_results`` falls back
+        to searching the whole textbook.
+        """
+        where = self.scoped(where, n_results)
+        try:
+            if where:
+                result = self._collection.query(
+                    query_texts=query_texts, n_results=n_results, where=where
+                )
+            else:
+                result = self._collection.query(
+                    query_texts=query_texts, n_results=n_results
+                )
             return result.get("documents", [])
         except Exception as e:
             print(colored(f"Query failed: {e}", "red"))
             return []
 
+    def prefetch(
+        self,
+        query_texts: List[str],
+        n_results: int,
+        batch_size: Optional[int] = None,
+        wheres: Optional[List[Optional[dict]]] = None,
+    ):
+        """Run the retrieval of many queries up front, in large multi-query batches.
 
-def create_textbook_instance(**kwargs):
+        Later ``retrieve`` calls for these queries are answered from memory
+        instead of paying an embedding call and a query each. ``wheres``
+        gives the filter of each query; queries sharing a filter are
+        batched together.
+        """
+        batch_size = batch_size or settings.textbook.query_batch_size
+        wheres = wheres or [None] * len(query_texts)
+        by_scope = {}
+        for text, where in zip(query_texts, wheres):
+            key = (text, n_results, where_key(where))
+            if key not in self._prefetched:
+                by_scope.setdefault(where_key(where), (where, {}))[1][text] = key
+        started = time.perf_counter()
+        prefetched = 0
+        for where, keys in by_scope.values():
+            unique_texts = list(keys)
+            for start in range(0, len(unique_texts), batch_size):
+                batch = unique_texts[start : start + batch_size]
+                for text, documents in zip(batch, self.query(batch, n_results, where)):
+                    self._prefetched[keys[text]] = documents
+            prefetched += len(unique_texts)
+        if prefetched:
+            elapsed = time.perf_counter() - started
+            print(
+                colored(
+                    f"Prefetched context for {prefetched} queries "
+                    f"({prefetched / elapsed:.1f} queries/sec)",
+                    "green",
+                )
+            )
+
+    def retrieve(
+        self, query_text: str, n_results: int, where: Optional[dict] = None
+    ) -> List[str]:
+        """The documents of a single query, prefetched if possible."""
+        documents = self._prefetched.get((query_text, n_results, where_key(where)))
+        if documents is None:
+            results = self.query([query_text], n_results, where)
+            documents = results[0] if results else []
+        return documents
+
+
+def scope_filter(item: dict, scope: Optional[str]) -> Optional[dict]:
+    """The ``where`` filter restricting retrieval to the topic or subtopic of ``item``."""
+    if scope == "topic":
+        return {"topic": item["topic"]}
+    if scope == "subtopic":
+        return {"$and": [{"topic": item["topic"]}, {"subtopic": item["subtopic"]}]}
+    return None
+
+
+def create_index_client(backend: str, path: Path):
+    """A Chroma persistent client, or its NumPy stand-in, storing under ``path``."""
+    if backend == "numpy":
+        return NumpyIndexClient(path)
+    if backend == "chroma":
+        import chromadb
+
+        return chromadb.PersistentClient(path=str(path))
+    raise ValueError(f"Unknown textbook backend {backend!r}, expected chroma or numpy")
+
+
+def textbook_content(entry: dict) -> str:
+    return (
+        f"In the topic of {entry['topic']} and subtopic of {entry['subtopic']}, "
+        f"The answer to the following question '{entry['question']}' is {entry['answer']}."
+        f"{entry['explanation']}"
+    )
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()[:32]
+
+
+def embedding_identity(embedding_function) -> str:
+    """Name the embedding model, so that vectors of different models aren't mixed."""
+    if embedding_function is None:
+        return "chroma-default"
+    inner = getattr(embedding_function, "embedding_function", embedding_function)
+    model = getattr(inner, "model", None) or getattr(inner, "model_name", None)
+    return f"{type(inner).__name__}:{model}" if model else type(inner).__name__
+
+
+def create_embedding_function():
+    """The Ollama embedding function with USE_CUSTOM_EMBEDDINGS=true, else None for Chroma's default."""
     use_custom_embeddings = (
         os.getenv("USE_CUSTOM_EMBEDDINGS", "false").lower() == "true"
     )
@@ -123,12 +402,29 @@ def create_textbook_instance(**kwargs):
         embedding_function = OllamaEmbeddingFunction(
             endpoint=f"{settings.ollama_base_url}/api/embeddings",
             model=settings.ollama_embedding_model,
+            timeout=settings.ollama_embeddings.timeout,
+            batch_size=settings.ollama_embeddings.batch_size,
+            max_workers=settings.ollama_embeddings.max_workers,
+        )
+        cache_settings = settings.embedding_cache
+        embedding_cache = EmbeddingCache(
+            path=cache_settings.path if cache_settings.enabled else None,
+            max_memory_bytes=int(cache_settings.max_memory_mb * 1024 * 1024),
         )
         # Wrap the embedding function with the batch-aware wrapper
-        embedding_function = OllamaBatchEmbeddingWrapper(embedding_function)
+        embedding_function = OllamaBatchEmbeddingWrapper(
+            embedding_function, cache=embedding_cache
+        )
 
     else:
         print("Using default embeddings instead of Ollama")
         embedding_function = None
+    return embedding_function
 
-    return OpenTextBook(embedding_function=embedding_function, **kwargs)
+
+def create_textbook_instance(**kwargs):
+    embedding_function = create_embedding_function()
+    textbook = OpenTextBook(embedding_function=embedding_function, **kwargs)
+    if embedding_function is not None:
+        embedding_function.cache.report()
+    return textbook
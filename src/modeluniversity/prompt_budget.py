@@ -0,0 +1,117 @@
+import re
+from dataclasses import dataclass
+from threading import Lock
+from typing import Iterable, List
+
+from litellm import token_counter
+from termcolor import colored
+
+
+def count_tokens(text: str, model: str) -> int:
+    """Tokens of ``text`` for ``model``, or a characters/4 estimate if litellm can't tell."""
+    if not text:
+        return 0
+    try:
+        return token_counter(model=model, text=text)
+    except Exception:
+        return max(1, len(text) // 4)
+
+
+def normalize_question(question: str) -> str:
+    """Key under which two questions count as the same question."""
+    return re.sub(r"[^\w]+", " ", question.lower()).strip()
+
+
+@dataclass
+class BudgetedText:
+    """Prompt text cut to a token budget, and what building it cost.
+
+    ``included`` entries made it in, ``duplicates`` were dropped as repeats
+    and ``omitted`` didn't fit. ``full_tokens`` counts the Python repr of
+    every entry, which is how prompts used to carry them.
+    """
+
+    text: str
+    included: int
+    duplicates: int
+    omitted: int
+    tokens: int
+    full_tokens: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.full_tokens - self.tokens)
+
+
+def build_avoid_list(
+    questions: Iterable[str], model: str, max_tokens: int
+) -> BudgetedText:
+    """One question per line, without duplicates, within ``max_tokens`` of ``model``.
+
+    Questions are kept in their original order until the budget runs out;
+    the ones that don't fit are left out and counted in ``omitted``.
+    """
+    questions = list(questions)
+    seen = set()
+    unique: List[str] = []
+    for question in questions:
+        key = normalize_question(question)
+        if key and key not in seen:
+            seen.add(key)
+            unique.append(" ".join(question.split()))
+
+    lines = []
+    tokens = 0
+    for question in unique:
+        line = f"- {question}"
+        line_tokens = count_tokens(line + "\n", model)
+        if tokens + line_tokens > max_tokens:
+            break
+        lines.append(line)
+        tokens += line_tokens
+
+    return BudgetedText(
+        text="\n".join(lines),
+        included=len(lines),
+        duplicates=len(questions) - len(unique),
+        omitted=len(unique) - len(lines),
+        tokens=tokens,
+        full_tokens=count_tokens(str(questions), model),
+    )
+
+
+class PromptBudgetReport:
+    """Totals of the ``BudgetedText`` prompt parts sent during a run."""
+
+    def __init__(self, label: str = "Prior questions in test prompts"):
+        self.label = label
+        self.prompts = 0
+        self.tokens = 0
+        self.full_tokens = 0
+        self.duplicates = 0
+        self.omitted = 0
+        self._lock = Lock()
+
+    def add(self, budgeted):
+        with self._lock:
+            self.prompts += 1
+            self.tokens += budgeted.tokens
+            self.full_tokens += budgeted.full_tokens
+            self.duplicates += budgeted.duplicates
+            self.omitted += budgeted.omitted
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.full_tokens - self.tokens)
+
+    def report(self):
+        if not self.prompts:
+            return
+        print(
+            colored(
+                f"{self.label}: {self.tokens} tokens over {self.prompts} prompts "
+                f"instead of {self.full_tokens}, {self.tokens_saved} saved "
+                f"({self.duplicates} duplicates dropped, {self.omitted} over budget)",
+                "green",
+            )
+        )
@@ -0,0 +1,246 @@
+import json
+import os
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+
+class JsonlQuestionStore:
+    """Append-only JSONL record store for generated questions.
+
+    Appending a batch costs the same no matter how many records were written
+    before it. ``export_json`` turns the store into the legacy JSON array
+    files (``training_questions.json``, ``test_questions.json``).
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+
+    def reset(self):
+        with self.path.open("w", encoding="utf-8"):
+            pass
+
+    def append(self, records: Iterable[dict]):
+        lines = "".join(json.dumps(record) + "\n" for record in records)
+        if not lines:
+            return
+        with self.path.open("a", encoding="utf-8") as file:
+            file.write(lines)
+            file.flush()
+            os.fsync(file.fileno())
+
+    def __iter__(self) -> Iterator[dict]:
+        if not self.path.exists():
+            return
+        with self.path.open("r", encoding="utf-8") as file:
+            for line in file:
+                record = _decode_line(line)
+                if record is not None:
+                    yield record
+
+    def retain(self, keep: Callable[[dict], bool]):
+        """Rewrite the store keeping only the records ``keep`` accepts."""
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with tmp_path.open("w", encoding="utf-8") as file:
+            for record in self:
+                if keep(record):
+                    file.write(json.dumps(record) + "\n")
+        os.replace(tmp_path, self.path)
+
+    def export_json(
+        self,
+        json_path: Union[str, Path],
+        order: Optional[List[Tuple[str, str]]] = None,
+    ):
+        """Stream the records into a JSON array file, formatted like ``json.dump(..., indent=4)``.
+
+        With ``order``, a list of (topic, subtopic) pairs, records are grouped
+        in that order instead of the order they were appended in.
+        """
+        json_path = Path(json_path)
+        tmp_path = json_path.with_name(json_path.name + ".tmp")
+        with tmp_path.open("w", encoding="utf-8") as file:
+            file.write("[")
+            separator = "\n"
+            for record in self._ordered(order):
+                dumped = json.dumps(record, indent=4).replace("\n", "\n    ")
+                file.write(f"{separator}    {dumped}")
+                separator = ",\n"
+            file.write("]" if separator == "\n" else "\n]")
+        os.replace(tmp_path, json_path)
+
+    def _ordered(self, order: Optional[List[Tuple[str, str]]]) -> Iterator[dict]:
+        if order is None or not self.path.exists():
+            yield from self
+            return
+        # Index line offsets per subtopic, then seek to them in the given order
+        offsets: Dict[Tuple[str, str], List[int]] = {}
+        with self.path.open("rb") as file:
+            offset = 0
+            for line in file:
+                record = _decode_line(line)
+                if record is not None:
+                    key = (record["topic"], record["subtopic"])
+                    offsets.setdefault(key, []).append(offset)
+                offset += len(line)
+            for key in dict.fromkeys(order):
+                for offset in offsets.get(key, []):
+                    file.seek(offset)
+                    yield json.loads(file.readline())
+
+
+class GenerationCheckpoint:
+    """Manifest of the (topic, subtopic, purpose) units a generation run completed.
+
+    Every entry records the hash of the prompt it was generated from, so a
+    unit is only considered done if it would be requested the same way again.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+
+    def reset(self):
+        with self.path.open("w", encoding="utf-8"):
+            pass
+
+    def load(self) -> Dict[Tuple[str, str, str], str]:
+        completed = {}
+        if not self.path.exists():
+            return completed
+        with self.path.open("r", encoding="utf-8") as file:
+            for line in file:
+                entry = _decode_line(line)
+                if entry is None:
+                    continue
+                key = (entry["topic"], entry["subtopic"], entry["purpose"])
+                completed[key] = entry["prompt_hash"]
+        return completed
+
+    def mark_done(self, topic: str, subtopic: str, purpose: str, prompt_hash: str):
+        entry = {
+            "topic": topic,
+            "subtopic": subtopic,
+            "purpose": purpose,
+            "prompt_hash": prompt_hash,
+        }
+        with self.path.open("a", encoding="utf-8") as file:
+            file.write(json.dumps(entry) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+
+    def rewrite(self, completed: Dict[Tuple[str, str, str], str]):
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with tmp_path.open("w", encoding="utf-8") as file:
+            for (topic, subtopic, purpose), prompt_hash in completed.items():
+                entry = {
+                    "topic": topic,
+                    "subtopic": subtopic,
+                    "purpose": purpose,
+                    "prompt_hash": prompt_hash,
+                }
+                file.write(json.dumps(entry) + "\n")
+        os.replace(tmp_path, self.path)
+
+
+def iter_json_records(
+    path: Union[str, Path], chunk_size: int = 1 << 16
+) -> Iterator[Any]:
+    """Yield the records of a JSON array or JSONL file one at a time.
+
+    Only ``chunk_size`` characters and the record being decoded are held in
+    memory, whatever the size of the file.
+    """
+    decoder = json.JSONDecoder()
+    with Path(path).open("r", encoding="utf-8") as file:
+        buffer = file.read(chunk_size)
+        while buffer and not buffer.strip():
+            chunk = file.read(chunk_size)
+            if not chunk:
+                break
+            buffer += chunk
+        position = len(buffer) - len(buffer.lstrip())
+        if not buffer.startswith("[", position):
+            # JSONL, one record per line
+            file.seek(0)
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+            return
+
+        position += 1
+        eof = False
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if position < len(buffer) and buffer[position] == "]":
+                return
+            try:
+                record, end = decoder.raw_decode(buffer, position)
+                # A number at the end of the buffer may go on in the next chunk
+                complete = end < len(buffer) or eof
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                complete = False
+            if complete:
+                yield record
+                position = end
+                continue
+            chunk = file.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+
+
+def load_json_records(path: Union[str, Path]) -> List[dict]:
+    """Every record of a JSON array or JSONL file, decoding records stored as strings."""
+    return [
+        record if isinstance(record, dict) else json.loads(record)
+        for record in iter_json_records(path)
+    ]
+
+
+def write_json_records(path: Union[str, Path], records: Iterable[dict]):
+    """Write ``records`` as JSONL for a ``.jsonl`` path, else as an indented JSON array.
+
+    The file is replaced atomically, so ``path`` may be the file the
+    records were read from.
+    """
+    path = Path(path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with tmp_path.open("w", encoding="utf-8") as file:
+        if path.suffix == ".jsonl":
+            for record in records:
+                file.write(json.dumps(record) + "\n")
+        else:
+            json.dump(list(records), file, indent=4)
+    os.replace(tmp_path, path)
+
+
+def _decode_line(line: Union[str, bytes]) -> Optional[dict]:
+    if not line.strip():
+        return None
+    try:
+        return json.loads(line)
+    except json.JSONDecodeError:
+        # A torn last line left by a crash mid-write
+        return None
+
+
+def jsonl_path_for(json_path: Union[str, Path]) -> Path:
+    """The JSONL store that backs a legacy JSON questions file."""
+    return Path(json_path).with_suffix(".jsonl")
+
+
+def checkpoint_path_for(json_path: Union[str, Path]) -> Path:
+    """The checkpoint manifest of a generation run writing ``json_path``."""
+    return Path(json_path).with_suffix(".checkpoint.jsonl")
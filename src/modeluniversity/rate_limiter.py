@@ -0,0 +1,236 @@
+import random
+import time
+from threading import Lock
+from typing import Callable, Dict, Optional
+
+from litellm import (
+    APIConnectionError,
+    InternalServerError,
+    RateLimitError,
+    ServiceUnavailableError,
+    Timeout,
+)
+from termcolor import colored
+
+from .config import settings
+
+RETRYABLE_ERRORS = (
+    RateLimitError,
+    Timeout,
+    APIConnectionError,
+    ServiceUnavailableError,
+    InternalServerError,
+)
+
+
+class LLMCallError(RuntimeError):
+    """Raised when an LLM request still fails after all retries."""
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at ``rate_per_minute``.
+
+    Callers reserve their amount up front and sleep until the bucket has
+    caught up, so concurrent callers are spaced out instead of all firing at
+    once and all backing off at once.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.max_rate_per_minute = rate_per_minute
+        self.rate_per_minute = rate_per_minute
+        self.capacity = capacity or rate_per_minute
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = Lock()
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated_at
+        self._tokens = min(
+            self.capacity, self._tokens + elapsed * self.rate_per_minute / 60
+        )
+        self._updated_at = now
+
+    def reserve(self, amount: float) -> float:
+        """Take ``amount`` from the bucket and return how long to wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= amount
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens * 60 / self.rate_per_minute
+
+    def adjust(self, amount: float):
+        """Charge (positive) or refund (negative) tokens after the fact."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= amount
+
+    def slow_down(self, factor: float = 0.5, floor: float = 1.0):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate_per_minute = max(floor, self.rate_per_minute * factor)
+
+    def speed_up(self, step: float = 0.1):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate_per_minute = min(
+                self.max_rate_per_minute,
+                self.rate_per_minute + self.max_rate_per_minute * step,
+            )
+
+
+class ProviderRateLimiter:
+    """Requests/min and tokens/min budgets of one provider.
+
+    Rate limit errors pause and slow down every caller of the provider, and
+    successful calls gradually restore the configured rates. The caller that
+    was rate limited backs off on its own; ``acquire`` holds the others
+    until the pause is over.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+    ):
+        self.requests = (
+            TokenBucket(requests_per_minute) if requests_per_minute else None
+        )
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self._paused_until = 0.0
+        self._lock = Lock()
+
+    def _buckets(self):
+        return [bucket for bucket in (self.requests, self.tokens) if bucket]
+
+    def acquire(self, estimated_tokens: int = 0) -> float:
+        """Block until a request of ``estimated_tokens`` fits the budgets; return the time waited."""
+        with self._lock:
+            wait = max(0.0, self._paused_until - time.monotonic())
+        if self.requests:
+            wait = max(wait, self.requests.reserve(1))
+        if self.tokens and estimated_tokens:
+            wait = max(wait, self.tokens.reserve(estimated_tokens))
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    def record_usage(self, extra_tokens: int):
+        if self.tokens and extra_tokens:
+            self.tokens.adjust(extra_tokens)
+
+    def on_success(self):
+        for bucket in self._buckets():
+            bucket.speed_up()
+
+    def on_rate_limited(self, backoff: float):
+        """Hold every caller for ``backoff`` seconds and lower the rates."""
+        with self._lock:
+            # Concurrent callers hitting the same limit slow the rate down once
+            now = time.monotonic()
+            slow_down = now >= self._paused_until
+            self._paused_until = max(self._paused_until, now + backoff)
+        if slow_down:
+            for bucket in self._buckets():
+                bucket.slow_down()
+
+
+_limiters: Dict[str, ProviderRateLimiter] = {}
+_limiters_lock = Lock()
+
+
+def provider_of(model: str) -> str:
+    return model.split("/", 1)[0] if "/" in model else "openai"
+
+
+def get_rate_limiter(model: str) -> ProviderRateLimiter:
+    provider = provider_of(model)
+    with _limiters_lock:
+        if provider not in _limiters:
+            limits = settings.rate_limits.get(provider) or settings.rate_limits.get(
+                "default"
+            )
+            _limiters[provider] = ProviderRateLimiter(
+                requests_per_minute=limits.requests_per_minute if limits else None,
+                tokens_per_minute=limits.tokens_per_minute if limits else None,
+            )
+        return _limiters[provider]
+
+
+def estimate_prompt_tokens(messages: list) -> int:
+    # Roughly four characters per token, good enough for budgeting
+    return sum(len(str(message.get("content", ""))) for message in messages) // 4 + 1
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    headers = getattr(error, "headers", None) or {}
+    response = getattr(error, "response", None)
+    if not headers and response is not None:
+        headers = getattr(response, "headers", None) or {}
+    for name in ("retry-after", "Retry-After"):
+        if name in headers:
+            try:
+                return float(headers[name])
+            except ValueError:
+                return None
+    return None
+
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float) -> float:
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, min(max_delay, base_delay * 2**attempt))
+
+
+def call_with_retries(completion_function: Callable, call_record=None, **request):
+    """Call ``completion_function`` within its provider's rate limits, retrying transient errors.
+
+    Rate limit and transient server errors are retried with jittered
+    exponential backoff, honouring ``Retry-After`` when the provider sends it.
+    Raises ``LLMCallError`` once ``retry.max_retries`` retries are used up.
+    Time spent waiting for the rate limiter and backing off, and the retries,
+    are added to ``call_record`` when one is given.
+    """
+    retry_settings = settings.retry
+    limiter = get_rate_limiter(request["model"])
+    estimated_tokens = estimate_prompt_tokens(request["messages"])
+
+    for attempt in range(retry_settings.max_retries + 1):
+        waited = limiter.acquire(estimated_tokens)
+        if call_record is not None:
+            call_record.queue_seconds += waited
+        try:
+            response = completion_function(**request)
+        except RETRYABLE_ERRORS as e:
+            if attempt == retry_settings.max_retries:
+                raise LLMCallError(
+                    f"Giving up on {request['model']} after {attempt + 1} attempts: {e}"
+                ) from e
+            delay = backoff_delay(
+                attempt, retry_settings.base_delay, retry_settings.max_delay
+            )
+            retry_after = retry_after_seconds(e)
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+            if isinstance(e, RateLimitError):
+                # Holds the other callers; this one sleeps below, by which time
+                # the pause is over and its next acquire doesn't wait again
+                limiter.on_rate_limited(delay)
+            print(
+                colored(
+                    f"{type(e).__name__} from {request['model']}. Retrying in {delay:.1f} seconds",
+                    "red",
+                )
+            )
+            if call_record is not None:
+                call_record.retries += 1
+                call_record.backoff_seconds += delay
+            time.sleep(delay)
+            continue
+
+        usage = response.get("usage") if hasattr(response, "get") else None
+        if usage:
+            actual_tokens = usage.get("total_tokens") or 0
+            limiter.record_usage(actual_tokens - estimated_tokens)
+        limiter.on_success()
+        return response
@@ -0,0 +1,127 @@
+from typing import Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def normalize_rows(vectors) -> np.ndarray:
+    """Float32 copy of ``vectors`` with unit-length rows, so dot products are cosines."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors.reshape(1, -1)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def embed_texts(
+    texts: Sequence[str], embedding_function=None, batch_size: int = 256
+) -> np.ndarray:
+    """Unit-length embeddings of ``texts``, one row each, computed in batches.
+
+    ``embedding_function`` is any Chroma-style callable taking a list of
+    texts, the Ollama wrapper included. Without one, Chroma's default model
+    is used, like the textbook does.
+    """
+    if embedding_function is None:
+        from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
+
+        embedding_function = DefaultEmbeddingFunction()
+    texts = list(texts)
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+    rows = []
+    for start in range(0, len(texts), batch_size):
+        rows.extend(embedding_function(texts[start : start + batch_size]))
+    return normalize_rows(rows)
+
+
+def greedy_duplicates(
+    vectors: np.ndarray,
+    threshold: float,
+    groups: Optional[Sequence[Hashable]] = None,
+    chunk_size: int = 1024,
+) -> List[Optional[Tuple[int, float]]]:
+    """For each row, the earlier kept row it duplicates and their cosine, or None.
+
+    Rows are visited in order and a row is kept unless it is at least
+    ``threshold`` similar to a row kept before it. With ``groups``, only
+    rows of the same group are compared. Rows are compared a chunk at a
+    time against the kept rows with one matrix product, so memory stays at
+    ``chunk_size`` times the number of kept rows.
+    """
+    if not len(vectors):
+        return []
+    vectors = normalize_rows(vectors)
+    if groups is None:
+        groups = [None] * len(vectors)
+    members = {}
+    for index, group in enumerate(groups):
+        members.setdefault(group, []).append(index)
+
+    duplicates: List[Optional[Tuple[int, float]]] = [None] * len(vectors)
+    for indices in members.values():
+        kept_indices: List[int] = []
+        kept = np.zeros((0, vectors.shape[1]), dtype=np.float32)
+        for start in range(0, len(indices), chunk_size):
+            chunk = indices[start : start + chunk_size]
+            chunk_vectors = vectors[chunk]
+            # Best match among the rows kept by earlier chunks
+            if len(kept_indices):
+                similarities = chunk_vectors @ kept.T
+                best = similarities.argmax(axis=1)
+                best_scores = similarities[np.arange(len(chunk)), best]
+            else:
+                best = np.zeros(len(chunk), dtype=int)
+                best_scores = np.full(len(chunk), -np.inf, dtype=np.float32)
+
+            # Within the chunk, order matters: compare to the rows kept so far
+            within = chunk_vectors @ chunk_vectors.T
+            kept_in_chunk: List[int] = []
+            for position, index in enumerate(chunk):
+                match, score = None, best_scores[position]
+                if score >= threshold:
+                    match = kept_indices[best[position]]
+                if kept_in_chunk:
+                    row = within[position, kept_in_chunk]
+                    local = int(row.argmax())
+                    if row[local] >= threshold and row[local] > score:
+                        match, score = chunk[kept_in_chunk[local]], row[local]
+                if match is None:
+                    kept_in_chunk.append(position)
+                else:
+                    duplicates[index] = (match, float(score))
+
+            kept_indices.extend(chunk[position] for position in kept_in_chunk)
+            kept = np.concatenate([kept, chunk_vectors[kept_in_chunk]])
+    return duplicates
+
+
+def top_matches(
+    queries: np.ndarray, corpus: np.ndarray, chunk_size: int = 1024
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Index and cosine of the closest corpus row of every query row.
+
+    The similarity matrix is computed a ``chunk_size`` by ``chunk_size``
+    block at a time, keeping a running best per query, so memory does not
+    grow with either side.
+    """
+    best = np.zeros(len(queries), dtype=np.int64)
+    best_scores = np.full(len(queries), -np.inf, dtype=np.float32)
+    if not len(queries) or not len(corpus):
+        return best, best_scores
+    queries = normalize_rows(queries)
+    corpus = normalize_rows(corpus)
+    for query_start in range(0, len(queries), chunk_size):
+        query_chunk = queries[query_start : query_start + chunk_size]
+        chunk_best = best[query_start : query_start + chunk_size]
+        chunk_scores = best_scores[query_start : query_start + chunk_size]
+        for corpus_start in range(0, len(corpus), chunk_size):
+            similarities = (
+                query_chunk @ corpus[corpus_start : corpus_start + chunk_size].T
+            )
+            block_best = similarities.argmax(axis=1)
+            block_scores = similarities[np.arange(len(query_chunk)), block_best]
+            better = block_scores > chunk_scores
+            chunk_best[better] = block_best[better] + corpus_start
+            chunk_scores[better] = block_scores[better]
+    return best, best_scores
@@ -0,0 +1,62 @@
+import json
+from pathlib import Path
+from typing import Iterator
+
+from .config import settings
+from .question_store import iter_json_records
+
+
+def create_conversation(sample):
+    return {
+        "messages": [
+            {"role": "system", "content": settings.student_role},
+            {
+                "role": "user",
+                "content": "Answer the following question and add an explanation in the format 'ANSWER. My explanation: EXPLANATION': "
+                + str(sample["question"]),
+            },
+            {
+                "role": "assistant",
+                "content": str(sample["answer"])
+                + ". My explanation: "
+                + str(sample["explanation"]),
+            },
+        ]
+    }
+
+
+def iter_conversations(training_questions_file: Path) -> Iterator[dict]:
+    """Yield the conversation of every training question, one record at a time."""
+    for item in iter_json_records(training_questions_file):
+        item_json = json.loads(item) if not isinstance(item, dict) else item
+        sample = {
+            "question": item_json["question"],
+            "answer": item_json["answer"],
+            "explanation": item_json["explanation"],
+        }
+        yield create_conversation(sample)
+
+
+def transform_to_trainable_json(
+    training_questions_file: Path = Path("training_questions.json"),
+    trainable_questions_file: Path = Path("trainable_data.json"),
+):
+    """Stream the training questions (JSON array or JSONL) into conversations.
+
+    A ``.jsonl`` output gets one compact conversation per line, anything
+    else a compact JSON array; ``load_dataset("json")`` reads both. Memory
+    use does not grow with the number of questions.
+    """
+    trainable_questions_file = Path(trainable_questions_file)
+    as_jsonl = trainable_questions_file.suffix == ".jsonl"
+    with trainable_questions_file.open("w", encoding="utf-8") as output_file:
+        if as_jsonl:
+            for conversation in iter_conversations(training_questions_file):
+                output_file.write(json.dumps(conversation) + "\n")
+            return
+
+        separator = "[\n"
+        for conversation in iter_conversations(training_questions_file):
+            output_file.write(separator + json.dumps(conversation))
+            separator = ",\n"
+        output_file.write("[]\n" if separator == "[\n" else "\n]\n")
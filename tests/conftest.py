@@ -1,9 +1,14 @@
+import os
 import pytest
 import shutil
 import json
 from pathlib import Path
 from datetime import datetime
 
+# Token counting for Llama models loads a Hugging Face tokenizer; keep the
+# tests from trying to download it
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+
 
 @pytest.fixture(scope="session")
 def test_data_dir() -> Path:
@@ -37,3 +42,26 @@ def test_outputs_dir(test_data_dir):
     if outputs_dir.exists():
         timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
         outputs_dir.rename(test_data_dir / f"outputs_{timestamp}")
+
+
+@pytest.fixture(autouse=True)
+def isolated_completion_cache(test_outputs_dir, monkeypatch):
+    """Keep tests from reading or filling the completion cache of the working directory."""
+    from src.modeluniversity import llm_cache
+
+    cache = llm_cache.CompletionCache(test_outputs_dir / "completions.sqlite")
+    cache.clear()
+    monkeypatch.setattr(llm_cache, "_completion_cache", cache)
+    return cache
+
+
+@pytest.fixture(autouse=True)
+def isolated_call_recorder(test_outputs_dir, monkeypatch, request):
+    """Record the LLM calls of each test in its own JSONL file under the outputs."""
+    from src.modeluniversity import instrumentation
+
+    recorder = instrumentation.CallRecorder(
+        test_outputs_dir / f"llm_calls_{request.node.name}.jsonl"
+    )
+    monkeypatch.setattr(instrumentation, "_recorder", recorder)
+    return recorder
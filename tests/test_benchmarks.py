@@ -0,0 +1,42 @@
+from benchmarks.run_benchmarks import run_benchmarks
+from src.modeluniversity.config import settings
+
+
+def test_benchmark_suite_runs_against_the_stub_server():
+    datagen_model = settings.datagen_model
+
+    report = run_benchmarks(
+        latency=0,
+        embedding_latency=0,
+        topics=1,
+        subtopics=2,
+        questions_per_subtopic=3,
+        concurrency=2,
+        models=2,
+    )
+
+    results = report["results"]
+    assert results["datagen_questions"]["count"] == 2 * 2 * 3
+    assert results["textbook_documents"]["count"] == 2 * 3
+    assert results["textbook_queries"]["count"] == 2 * 3
+    assert results["eval_items"]["count"] == 2 * 2 * 3
+    assert all(result["per_second"] > 0 for result in results.values())
+    assert report["stub_server"]["completions"] == 2 * 2 + 2 * 2 * 3
+    assert report["llm_calls"]["eval openai/stub-student-0"]["calls"] == 2 * 3
+    # The stub configuration doesn't leak into the rest of the session
+    assert settings.datagen_model == datagen_model
+
+
+def test_benchmark_of_the_numpy_textbook():
+    report = run_benchmarks(
+        latency=0,
+        embedding_latency=0,
+        topics=1,
+        subtopics=2,
+        questions_per_subtopic=3,
+        models=1,
+        textbook_backend="numpy",
+    )
+
+    assert report["results"]["textbook_documents"]["count"] == 2 * 3
+    assert report["results"]["textbook_queries"]["per_second"] > 0
@@ -21,7 +21,7 @@ def test_cli_help(cli_runner):
     assert "ModelUniversity CLI tool" in result.output
 
 
-@patch("modeluniversity.cli.generate_curriculum")
+@patch("src.modeluniversity.datagen.generate_curriculum")
 def test_create_curriculum(mock_gen_curr, cli_runner):
     mock_gen_curr.return_value = {"topics": []}
     result = cli_runner.invoke(cli, ["create-curriculum"])
@@ -30,8 +30,8 @@ def test_create_curriculum(mock_gen_curr, cli_runner):
     mock_gen_curr.assert_called_once_with(Path("curriculum.json"))
 
 
-@patch("modeluniversity.cli.generate_curriculum")
-@patch("modeluniversity.cli.generate_questions")
+@patch("src.modeluniversity.datagen.generate_curriculum")
+@patch("src.modeluniversity.datagen.generate_questions")
 def test_create_questions(mock_gen_q, mock_gen_curr, cli_runner):
     mock_gen_curr.return_value = {"topics": []}
     mock_gen_q.return_value = None
@@ -45,7 +45,7 @@ def test_create_questions(mock_gen_q, mock_gen_curr, cli_runner):
     mock_gen_q.assert_called_once()
 
 
-@patch("modeluniversity.cli.transform_to_trainable_json")
+@patch("src.modeluniversity.trainable_data.transform_to_trainable_json")
 def test_transform_data(mock_transform, cli_runner):
     result = cli_runner.invoke(cli, ["transform-data"])
     assert result.exit_code == 0
@@ -56,6 +56,48 @@ def test_transform_data(mock_transform, cli_runner):
     )
 
 
+@patch("src.modeluniversity.opentextbook.create_embedding_function")
+@patch("src.modeluniversity.dedup.dedup_questions_file")
+def test_dedup_questions(mock_dedup, mock_embedding_function, cli_runner):
+    mock_embedding_function.return_value = None
+    with cli_runner.isolated_filesystem():
+        Path("training_questions.json").write_text("[]")
+        result = cli_runner.invoke(cli, ["dedup-questions", "--threshold", "0.9"])
+
+    assert result.exit_code == 0
+    assert "Deduplicated questions saved to training_questions.json" in result.output
+    mock_dedup.assert_called_once_with(
+        questions_file=Path("training_questions.json"),
+        output_file=None,
+        embedding_function=None,
+        threshold=0.9,
+        scope=None,
+    )
+
+
+@patch("src.modeluniversity.opentextbook.create_embedding_function")
+@patch("src.modeluniversity.leakage.check_leakage")
+def test_check_leakage(mock_check, mock_embedding_function, cli_runner):
+    mock_embedding_function.return_value = None
+    with cli_runner.isolated_filesystem():
+        Path("training_questions.json").write_text("[]")
+        Path("test_questions.json").write_text("[]")
+        result = cli_runner.invoke(
+            cli, ["check-leakage", "--output-file", "clean_test_questions.json"]
+        )
+
+    assert result.exit_code == 0
+    assert "saved to clean_test_questions.json" in result.output
+    mock_check.assert_called_once_with(
+        training_questions_file=Path("training_questions.json"),
+        test_questions_file=Path("test_questions.json"),
+        output_file=Path("clean_test_questions.json"),
+        embedding_function=None,
+        threshold=None,
+        ngram_threshold=None,
+    )
+
+
 def test_invalid_command(cli_runner):
     result = cli_runner.invoke(cli, ["invalid-command"])
     assert result.exit_code != 0
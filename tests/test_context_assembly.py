@@ -0,0 +1,78 @@
+from src.modeluniversity.context_assembly import (
+    assemble_context,
+    strip_overlap,
+    unique_chunks,
+)
+from src.modeluniversity.prompt_budget import count_tokens
+
+MODEL = "gpt-4o-mini"
+
+FIRST = (
+    "A living will states the medical treatment a person wants when they can no "
+    "longer decide. It is signed while the person is competent."
+)
+# The next chunk of the same entry repeats the end of the first one
+SECOND = (
+    "It is signed while the person is competent. It usually names a health care "
+    "proxy as well."
+)
+
+
+def test_strip_overlap():
+    assert strip_overlap(SECOND, [FIRST]) == (
+        "It usually names a health care proxy as well."
+    )
+    # Too short an overlap to be the splitter's
+    assert strip_overlap("competent. More text.", [FIRST]) == "competent. More text."
+
+
+def test_unique_chunks_drops_repeats_and_overlaps():
+    chunks = unique_chunks(
+        [
+            FIRST,
+            SECOND,
+            "  " + FIRST.upper() + " ",
+            FIRST[:60],
+            "Probate is a court process.",
+        ]
+    )
+
+    assert chunks == [
+        FIRST,
+        "It usually names a health care proxy as well.",
+        "Probate is a court process.",
+    ]
+
+
+def test_assembled_context_is_numbered_and_smaller_than_the_repr():
+    documents = [FIRST, SECOND, FIRST]
+
+    context = assemble_context(documents, MODEL, max_tokens=1000)
+
+    assert context.text == (
+        f"[1] {FIRST}\n[2] It usually names a health care proxy as well."
+    )
+    assert context.included == 2
+    assert context.duplicates == 1
+    assert context.omitted == 0
+    assert context.tokens < context.full_tokens == count_tokens(str(documents), MODEL)
+
+
+def test_assembled_context_fits_the_budget():
+    documents = [f"Fact {i}: " + "estate planning detail " * 20 for i in range(5)]
+
+    context = assemble_context(documents, MODEL, max_tokens=100)
+
+    assert context.tokens <= 100
+    assert count_tokens(context.text, MODEL) <= 100
+    # The first chunk fits, the second is cut short, the rest are left out
+    assert context.included == 2
+    assert context.omitted == 3
+    assert context.text.split("\n")[1].startswith("[2] Fact 1:")
+
+
+def test_nothing_retrieved():
+    context = assemble_context([], MODEL, max_tokens=100)
+
+    assert context.text == ""
+    assert context.tokens == 0
@@ -1,13 +1,21 @@
 import json
+import time
+from collections import Counter
 from pathlib import Path
 import pickle
+import re
+from src.modeluniversity.config import settings
 from src.modeluniversity.datagen import (
     transform_to_trainable_json,
+    create_base_prompt,
     create_conversation,
     generate_curriculum,
     generate_questions,
 )
+from src.modeluniversity.question_store import GenerationCheckpoint, checkpoint_path_for
 from src.modeluniversity.datagen_models import (
+    BatchTestQuestionsSchema,
+    BatchTrainQuestionsSchema,
     CurriculumSchema,
     TrainQuestionsSchema,
     TestQuestionsSchema,
@@ -98,6 +106,24 @@ def test_transform_to_trainable_json(
         assert the_answer_in_previous_format in the_answer
 
 
+def test_transform_to_trainable_jsonl(test_outputs_dir, some_training_questions):
+    # JSONL in, JSONL out: one compact conversation per line
+    training_file = test_outputs_dir / "training_questions.jsonl"
+    trainable_file = test_outputs_dir / "trainable_data.jsonl"
+    with training_file.open("w") as f:
+        for question in some_training_questions:
+            f.write(json.dumps(question) + "\n")
+
+    transform_to_trainable_json(training_file, trainable_file)
+
+    lines = trainable_file.read_text().splitlines()
+    assert len(lines) == len(some_training_questions)
+    for line, question in zip(lines, some_training_questions):
+        conversation = json.loads(line)
+        assert conversation["messages"][-1]["role"] == "assistant"
+        assert question["answer"] in conversation["messages"][-1]["content"]
+
+
 def test_create_conversation():
     sample = {
         "question": "What is Python?",
@@ -226,3 +252,310 @@ def test_generate_questions(
     with testing_file_for_tests.open("r") as f:
         testing_data = json.load(f)
     assert len(testing_data) > 0
+
+
+def test_generate_questions_concurrently_keeps_curriculum_order(
+    the_curriculum_read_from_test_data_folder,
+    test_outputs_dir,
+    mock_training_questions,
+    mock_test_questions,
+    monkeypatch,
+):
+    # Later subtopics answer faster, so they finish before earlier ones
+    delays = {
+        "introduction to estate planning": 0.2,
+        "importance of estate planning": 0.1,
+    }
+
+    def mock_question_prompt_call(prompt, schema):
+        for subtopic, delay in delays.items():
+            if subtopic in prompt:
+                time.sleep(delay)
+        if schema == TrainQuestionsSchema:
+            return json.dumps(mock_training_questions)
+        return json.dumps(mock_test_questions)
+
+    monkeypatch.setattr(
+        "src.modeluniversity.datagen.question_prompt_call", mock_question_prompt_call
+    )
+
+    training_file_for_tests = test_outputs_dir / "concurrent_training_questions.json"
+    testing_file_for_tests = test_outputs_dir / "concurrent_test_questions.json"
+
+    generate_questions(
+        curriculum=the_curriculum_read_from_test_data_folder,
+        training_questions_file=training_file_for_tests,
+        testing_questions_file=testing_file_for_tests,
+        concurrency=4,
+    )
+
+    expected_order = [
+        subtopic
+        for topic in the_curriculum_read_from_test_data_folder["topics"]
+        for subtopic in topic["subtopics"]
+    ]
+    for questions_file in (training_file_for_tests, testing_file_for_tests):
+        with questions_file.open("r") as f:
+            data = json.load(f)
+        subtopics_in_file = list(dict.fromkeys(entry["subtopic"] for entry in data))
+        assert subtopics_in_file == expected_order
+
+
+def test_generate_questions_resumes_after_a_failed_subtopic(
+    the_curriculum_read_from_test_data_folder,
+    test_outputs_dir,
+    mock_training_questions,
+    mock_test_questions,
+    monkeypatch,
+):
+    failing_subtopic = "last will and testament"
+    calls = []
+
+    def mock_question_prompt_call(prompt, schema):
+        calls.append((schema, prompt))
+        if schema == TrainQuestionsSchema:
+            return json.dumps(mock_training_questions)
+        if f"Subtopic: {failing_subtopic}." in prompt:
+            raise ConnectionError("provider went away")
+        return json.dumps(mock_test_questions)
+
+    monkeypatch.setattr(
+        "src.modeluniversity.datagen.question_prompt_call", mock_question_prompt_call
+    )
+
+    training_file_for_tests = test_outputs_dir / "resumed_training_questions.json"
+    testing_file_for_tests = test_outputs_dir / "resumed_test_questions.json"
+
+    with pytest.raises(RuntimeError, match=failing_subtopic):
+        generate_questions(
+            curriculum=the_curriculum_read_from_test_data_folder,
+            training_questions_file=training_file_for_tests,
+            testing_questions_file=testing_file_for_tests,
+        )
+
+    # Everything but the failed test questions survived the failed run
+    with testing_file_for_tests.open("r") as f:
+        assert failing_subtopic not in {entry["subtopic"] for entry in json.load(f)}
+
+    failing_subtopic = "no longer failing"
+    calls.clear()
+    generate_questions(
+        curriculum=the_curriculum_read_from_test_data_folder,
+        training_questions_file=training_file_for_tests,
+        testing_questions_file=testing_file_for_tests,
+    )
+
+    # Only the test questions of the failed subtopic were requested again
+    assert len(calls) == 1
+    assert calls[0][0] == TestQuestionsSchema
+    assert "Subtopic: last will and testament." in calls[0][1]
+
+    expected_order = [
+        subtopic
+        for topic in the_curriculum_read_from_test_data_folder["topics"]
+        for subtopic in topic["subtopics"]
+    ]
+    number_of_training_questions = len(mock_training_questions["questions"])
+    with training_file_for_tests.open("r") as f:
+        training_data = json.load(f)
+    assert len(training_data) == number_of_training_questions * len(expected_order)
+    with testing_file_for_tests.open("r") as f:
+        testing_data = json.load(f)
+    assert list(dict.fromkeys(entry["subtopic"] for entry in testing_data)) == (
+        expected_order
+    )
+
+    # Starting fresh regenerates everything
+    calls.clear()
+    generate_questions(
+        curriculum=the_curriculum_read_from_test_data_folder,
+        training_questions_file=training_file_for_tests,
+        testing_questions_file=testing_file_for_tests,
+        resume=False,
+    )
+    assert len(calls) == 2 * len(expected_order)
+
+
+def batch_response(prompt, schema, mock_training_questions, mock_test_questions):
+    questions = (
+        mock_training_questions
+        if schema == BatchTrainQuestionsSchema
+        else mock_test_questions
+    )["questions"]
+    subtopics = re.findall(r"Subtopic: (.+?)\. ", prompt)
+    return json.dumps(
+        {"subtopics": [{"subtopic": s, "questions": questions} for s in subtopics]}
+    )
+
+
+@pytest.fixture
+def five_subtopics_curriculum():
+    return {
+        "topics": [
+            {
+                "topic": "Income Tax",
+                "subtopics": [f"income tax part {i}" for i in range(5)],
+            }
+        ]
+    }
+
+
+def test_batched_generation_needs_fewer_requests(
+    five_subtopics_curriculum,
+    test_outputs_dir,
+    mock_training_questions,
+    mock_test_questions,
+    monkeypatch,
+):
+    calls = []
+
+    def mock_question_prompt_call(prompt, schema):
+        calls.append(schema)
+        return batch_response(
+            prompt, schema, mock_training_questions, mock_test_questions
+        )
+
+    monkeypatch.setattr(
+        "src.modeluniversity.datagen.question_prompt_call", mock_question_prompt_call
+    )
+    training_file = test_outputs_dir / "batched_training_questions.json"
+    testing_file = test_outputs_dir / "batched_test_questions.json"
+
+    generate_questions(
+        curriculum=five_subtopics_curriculum,
+        training_questions_file=training_file,
+        testing_questions_file=testing_file,
+        batch_size=3,
+    )
+
+    # Two batches (3 + 2 subtopics) for training and for testing; the last
+    # batch of each still uses the batch schema. Batches run concurrently,
+    # in no particular order.
+    assert Counter(calls) == {BatchTrainQuestionsSchema: 2, BatchTestQuestionsSchema: 2}
+    subtopics = five_subtopics_curriculum["topics"][0]["subtopics"]
+    for questions_file, mock_questions in (
+        (training_file, mock_training_questions),
+        (testing_file, mock_test_questions),
+    ):
+        data = json.loads(questions_file.read_text())
+        assert list(dict.fromkeys(entry["subtopic"] for entry in data)) == subtopics
+        assert len(data) == len(subtopics) * len(mock_questions["questions"])
+
+
+def test_failed_batch_reports_only_unfinished_subtopics(
+    five_subtopics_curriculum,
+    test_outputs_dir,
+    mock_training_questions,
+    mock_test_questions,
+    monkeypatch,
+):
+    broken = "income tax part 0"
+
+    def mock_question_prompt_call(prompt, schema):
+        subtopics = re.findall(r"Subtopic: (.+?)\. ", prompt)
+        if schema in (TrainQuestionsSchema, TestQuestionsSchema):
+            if subtopics == [broken] and schema is TrainQuestionsSchema:
+                raise RuntimeError("provider down")
+            return json.dumps(
+                mock_training_questions
+                if schema == TrainQuestionsSchema
+                else mock_test_questions
+            )
+        response = batch_response(
+            prompt, schema, mock_training_questions, mock_test_questions
+        )
+        # Batches with the broken subtopic come back cut off and are split
+        return response[: len(response) // 2] if broken in subtopics else response
+
+    monkeypatch.setattr(
+        "src.modeluniversity.datagen.question_prompt_call", mock_question_prompt_call
+    )
+    training_file = test_outputs_dir / "partial_training_questions.json"
+
+    with pytest.raises(RuntimeError, match="1 of 5 subtopics failed") as raised:
+        generate_questions(
+            curriculum=five_subtopics_curriculum,
+            training_questions_file=training_file,
+            testing_questions_file=test_outputs_dir / "partial_test_questions.json",
+            batch_size=5,
+        )
+
+    assert str(raised.value).endswith(f"re-run to retry them: {broken}")
+    completed = GenerationCheckpoint(checkpoint_path_for(training_file)).load()
+    finished = {subtopic for _, subtopic, purpose in completed if purpose == "test"}
+    assert finished == set(five_subtopics_curriculum["topics"][0]["subtopics"]) - {
+        broken
+    }
+
+
+def test_failed_batches_are_split(
+    five_subtopics_curriculum,
+    test_outputs_dir,
+    mock_training_questions,
+    mock_test_questions,
+    monkeypatch,
+):
+    calls = []
+
+    def mock_question_prompt_call(prompt, schema):
+        calls.append(schema)
+        if schema in (TrainQuestionsSchema, TestQuestionsSchema):
+            return json.dumps(
+                mock_training_questions
+                if schema == TrainQuestionsSchema
+                else mock_test_questions
+            )
+        response = batch_response(
+            prompt, schema, mock_training_questions, mock_test_questions
+        )
+        if len(re.findall(r"Subtopic: (.+?)\. ", prompt)) > 2:
+            # Cut off at max_tokens
+            return response[: len(response) // 2]
+        return response
+
+    monkeypatch.setattr(
+        "src.modeluniversity.datagen.question_prompt_call", mock_question_prompt_call
+    )
+    training_file = test_outputs_dir / "split_training_questions.json"
+    testing_file = test_outputs_dir / "split_test_questions.json"
+
+    generate_questions(
+        curriculum=five_subtopics_curriculum,
+        training_questions_file=training_file,
+        testing_questions_file=testing_file,
+        batch_size=5,
+    )
+
+    # 5 fails, split into 2 + 3; 3 fails, split into a single subtopic + 2
+    expected = [
+        BatchTrainQuestionsSchema,
+        BatchTrainQuestionsSchema,
+        BatchTrainQuestionsSchema,
+        TrainQuestionsSchema,
+        BatchTrainQuestionsSchema,
+    ]
+    expected += [
+        (
+            BatchTestQuestionsSchema
+            if schema is BatchTrainQuestionsSchema
+            else TestQuestionsSchema
+        )
+        for schema in expected
+    ]
+    assert calls == expected
+    subtopics = five_subtopics_curriculum["topics"][0]["subtopics"]
+    for questions_file in (training_file, testing_file):
+        data = json.loads(questions_file.read_text())
+        assert list(dict.fromkeys(entry["subtopic"] for entry in data)) == subtopics
+
+
+def test_test_prompt_lists_prior_questions_within_budget(monkeypatch):
+    monkeypatch.setattr(settings.prompt_budget, "avoid_list_max_tokens", 200)
+    questions = [f"What is the filing deadline for form {i}?" for i in range(500)]
+
+    prompt = create_base_prompt("Income Tax", "Deadlines", questions)
+
+    assert "- What is the filing deadline for form 0?" in prompt
+    assert "form 499" not in prompt
+    assert "['" not in prompt
+    assert len(prompt) < len(str(questions)) // 10
@@ -0,0 +1,113 @@
+import hashlib
+import json
+
+import numpy as np
+import pytest
+
+from src.modeluniversity.dedup import dedup_questions_file, deduplicate_questions
+from src.modeluniversity.question_store import (
+    JsonlQuestionStore,
+    jsonl_path_for,
+    load_json_records,
+    write_json_records,
+)
+
+
+class BagOfWordsEmbeddings:
+    """Texts sharing most of their words get close vectors."""
+
+    def __init__(self, dimensions=256):
+        self.dimensions = dimensions
+        self.calls = []
+
+    def __call__(self, input):
+        self.calls.append(len(input))
+        vectors = np.zeros((len(input), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(input):
+            for word in text.lower().replace("?", "").split():
+                bucket = int(hashlib.md5(word.encode()).hexdigest(), 16)
+                vectors[row, bucket % self.dimensions] += 1
+        return vectors.tolist()
+
+
+def question(subtopic, text):
+    return {
+        "topic": "Income",
+        "subtopic": subtopic,
+        "question": text,
+        "answer": "An answer.",
+        "explanation": "An explanation.",
+    }
+
+
+@pytest.fixture
+def records():
+    return [
+        question("W-2 income", "What is a W-2 form?"),
+        question("W-2 income", "Who receives a W-2 form?"),
+        question("W-2 income", "What is a W-2 form"),
+        question("Wages", "What is the W-2 form?"),
+        question("Wages", "How are tips taxed?"),
+    ]
+
+
+def test_deduplicate_across_subtopics(records):
+    embeddings = BagOfWordsEmbeddings()
+
+    result = deduplicate_questions(
+        records, embeddings, threshold=0.75, scope="all", batch_size=2
+    )
+
+    assert [r["question"] for r in result.kept] == [
+        "What is a W-2 form?",
+        "Who receives a W-2 form?",
+        "How are tips taxed?",
+    ]
+    assert [d.duplicate_of["question"] for d in result.removed] == [
+        "What is a W-2 form?"
+    ] * 2
+    assert all(d.similarity >= 0.75 for d in result.removed)
+    assert result.tokens_removed > 0
+    # Embedded in batches of 2
+    assert embeddings.calls == [2, 2, 1]
+
+
+def test_deduplicate_within_subtopics(records):
+    result = deduplicate_questions(
+        records, BagOfWordsEmbeddings(), threshold=0.75, scope="subtopic"
+    )
+
+    assert [d.record["question"] for d in result.removed] == ["What is a W-2 form"]
+    assert len(result.kept) == 4
+
+
+def test_dedup_questions_file(records, test_outputs_dir, capsys):
+    questions_file = test_outputs_dir / "dedup_questions.jsonl"
+    questions_file.write_text("".join(json.dumps(r) + "\n" for r in records))
+    output_file = test_outputs_dir / "dedup_questions_out.json"
+
+    result = dedup_questions_file(
+        questions_file, output_file, BagOfWordsEmbeddings(), threshold=0.75
+    )
+
+    assert json.loads(output_file.read_text()) == result.kept
+    assert len(result.kept) == 3
+    assert "Removed 2 of 5 questions" in capsys.readouterr().out
+
+
+def test_in_place_dedup_also_cleans_the_store(records, test_outputs_dir):
+    questions_file = test_outputs_dir / "store_dedup" / "training_questions.json"
+    questions_file.parent.mkdir()
+    write_json_records(questions_file, records)
+    store = JsonlQuestionStore(jsonl_path_for(questions_file))
+    store.append(records)
+
+    result = dedup_questions_file(
+        questions_file, embedding_function=BagOfWordsEmbeddings(), threshold=0.75
+    )
+
+    assert load_json_records(questions_file) == result.kept
+    assert list(store) == result.kept
+    # A resumed create-questions run exports the store again
+    store.export_json(questions_file)
+    assert load_json_records(questions_file) == result.kept
@@ -53,3 +53,167 @@ def test_run_the_eval_with_textbook(
 
     # TODO: What else will we be checking?!
     # assert ...
+
+
+def test_models_are_evaluated_concurrently_within_their_limits(monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+    from threading import Lock
+    import time
+
+    from src.modeluniversity import evals
+
+    items = [
+        {
+            "question": f"Question {i}?",
+            "answer": "right",
+            "wrong_answer1": "wrong 1",
+            "wrong_answer2": "wrong 2",
+            "wrong_answer3": "wrong 3",
+        }
+        for i in range(6)
+    ]
+    latency = {"groq/fast": 0.01, "ollama/slow": 0.05}
+    in_flight = {"all": 0, "groq/fast": 0, "ollama/slow": 0}
+    peak = dict(in_flight)
+    lock = Lock()
+
+    def mock_question_prompt_call(prompt, a_model):
+        with lock:
+            for key in ("all", a_model):
+                in_flight[key] += 1
+                peak[key] = max(peak[key], in_flight[key])
+        time.sleep(latency[a_model])
+        with lock:
+            for key in ("all", a_model):
+                in_flight[key] -= 1
+        return "A. because"
+
+    def mock_evaluate(dataset, task, task_threads, **kwargs):
+        with ThreadPoolExecutor(max_workers=task_threads) as executor:
+            return list(executor.map(task, dataset))
+
+    monkeypatch.setattr(evals, "setup", lambda **kwargs: items)
+    monkeypatch.setattr(evals, "evaluate", mock_evaluate)
+    monkeypatch.setattr(evals, "question_prompt_call", mock_question_prompt_call)
+    monkeypatch.setattr(
+        settings.eval_concurrency, "task_threads", {"default": 3, "ollama": 1}
+    )
+    monkeypatch.setattr(settings.eval_concurrency, "max_parallel_tasks", 3)
+
+    started_at = time.monotonic()
+    results = run_the_evaluation(
+        an_opik_client=None,
+        metrics=[],
+        llm_evals_list=["ollama/slow", "groq/fast"],
+        use_textbook=False,
+    )
+    elapsed = time.monotonic() - started_at
+
+    assert list(results) == ["ollama/slow", "groq/fast"]
+    assert all(len(model_results) == len(items) for model_results in results.values())
+    assert peak["ollama/slow"] == 1
+    assert peak["groq/fast"] <= 3
+    assert peak["all"] <= 3
+    # The fast model ran alongside the slow one instead of after it
+    assert elapsed < len(items) * (latency["ollama/slow"] + latency["groq/fast"])
+
+
+class FakeDataset:
+    def __init__(self):
+        self.items = {}
+        self.insert_calls = []
+
+    def get_items(self):
+        return [{"id": item_id, **item} for item_id, item in self.items.items()]
+
+    def insert(self, items):
+        self.insert_calls.append(len(items))
+        for item in items:
+            self.items[f"item-{len(self.items)}-{len(self.insert_calls)}"] = item
+
+    def delete(self, items_ids):
+        for item_id in items_ids:
+            del self.items[item_id]
+
+
+class FakeOpikClient:
+    def __init__(self):
+        self.dataset = FakeDataset()
+
+    def get_or_create_dataset(self, name):
+        return self.dataset
+
+
+def test_setup_uploads_only_new_or_edited_questions(mock_data_dir, tmp_path):
+    import json
+
+    from src.modeluniversity.evals import load_test_questions, setup
+
+    questions = load_test_questions(
+        mock_data_dir / "mock_test_questions_produced_by_datagen.json"
+    )
+    questions_file = tmp_path / "test_questions.json"
+    questions_file.write_text(json.dumps(questions))
+    client = FakeOpikClient()
+
+    setup(client, "questions", questions_file, chunk_size=4)
+    assert len(client.dataset.items) == len(questions)
+    assert client.dataset.insert_calls == [
+        min(4, len(questions) - start) for start in range(0, len(questions), 4)
+    ]
+
+    client.dataset.insert_calls.clear()
+    setup(client, "questions", questions_file, chunk_size=4)
+    assert client.dataset.insert_calls == []
+
+    questions[0]["answer"] = "An edited answer"
+    questions_file.write_text(json.dumps(questions))
+    setup(client, "questions", questions_file, chunk_size=4)
+    assert client.dataset.insert_calls == [1]
+    assert len(client.dataset.items) == len(questions)
+    assert "An edited answer" in [
+        item["answer"] for item in client.dataset.items.values()
+    ]
+
+
+def test_open_textbook_prompt_gets_the_assembled_context(monkeypatch):
+    from src.modeluniversity import evals
+    from src.modeluniversity.prompt_budget import PromptBudgetReport
+
+    chunk = "Probate is the court process that validates a will."
+
+    class FakeTextbook:
+        def retrieve(self, query_text, n_results, where=None):
+            return [chunk, chunk, "Executors carry out the will."]
+
+    prompts = []
+
+    def mock_question_prompt_call(prompt, a_model):
+        prompts.append(prompt)
+        return "A. Because"
+
+    monkeypatch.setattr(evals, "question_prompt_call", mock_question_prompt_call)
+    report = PromptBudgetReport("Textbook context")
+
+    result = evals.evaluation_task_open(
+        {
+            "topic": "Probate",
+            "subtopic": "wills",
+            "question": "What is probate?",
+            "answer": "A court process",
+            "wrong_answer1": "A tax",
+            "wrong_answer2": "A trust",
+            "wrong_answer3": "A deed",
+        },
+        a_model="ollama/some-small-model",
+        textbook=FakeTextbook(),
+        context_report=report,
+    )
+
+    context = f"[1] {chunk}\n[2] Executors carry out the will."
+    assert context in prompts[0]
+    assert "['" not in prompts[0]
+    assert result["context"][1] == context
+    assert report.prompts == 1
+    assert report.duplicates == 1
+    assert report.tokens_saved > 0
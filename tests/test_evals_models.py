@@ -0,0 +1,76 @@
+import json
+
+import pytest
+
+from src.modeluniversity import evals_models
+from src.modeluniversity.evals_models import (
+    SameFirstLetterMetric,
+    extract_answer_letter,
+)
+
+
+@pytest.mark.parametrize(
+    "output, letter",
+    [
+        ("B. Because the W-2 reports wages.", "B"),
+        ("**B**", "B"),
+        ("**C.** The estate tax applies here.", "C"),
+        ("(D) A revocable trust can be changed.", "D"),
+        ("A) It is filed by the employer.", "A"),
+        ("B", "B"),
+        ("B\nMy explanation: wages are reported on a W-2.", "B"),
+        ("C - because the trust is irrevocable", "C"),
+        ("Answer: B", "B"),
+        ("The correct answer is B.", "B"),
+        ("The correct answer is **D**, as the executor handles probate.", "D"),
+        ("After weighing the options, I choose option (C).", "C"),
+        ("B. Option A is wrong because it ignores withholding.", "B"),
+        ("Answer: A", "A"),
+        ("The answer is A, since wages are reported.", "A"),
+        ("The answer is **A** because wages are reported.", "A"),
+    ],
+)
+def test_extracts_the_picked_letter(output, letter):
+    assert extract_answer_letter(output) == letter
+
+
+@pytest.mark.parametrize(
+    "output",
+    [
+        "",
+        None,
+        "A W-2 form reports wages and withheld taxes.",
+        "It is either A or B, hard to say.",
+        "The answer is A. Actually, the answer is C.",
+        "B. Wait, the correct answer is D.",
+        "I think it depends on the state.",
+        "Answer: A good approach is D",
+        "The answer is a trust, so pick A good one.",
+    ],
+)
+def test_ambiguous_outputs_are_not_guessed(output):
+    assert extract_answer_letter(output) is None
+
+
+def test_judge_only_runs_for_ambiguous_answers(monkeypatch):
+    judge_prompts = []
+
+    def mock_completion_content(completion_function, **request):
+        judge_prompts.append(request["messages"][-1]["content"])
+        return json.dumps({"score": 1.0, "reason": "picked the reference"})
+
+    monkeypatch.setattr(evals_models, "completion_content", mock_completion_content)
+    metric = SameFirstLetterMetric("Multiple-choice match")
+
+    assert metric.score(output="B. Wages.", reference="B").value == 1.0
+    assert metric.score(output="Answer: C", reference="B").value == 0.0
+    assert judge_prompts == []
+
+    result = metric.score(output="Either A or B", reference="B")
+    assert result.value == 1.0
+    assert result.metadata == {"scored_by": "llm_judge"}
+    assert len(judge_prompts) == 1
+
+    assert metric.extracted_scores == 2
+    assert metric.judge_fallbacks == 1
+    assert metric.judge_fallback_rate == pytest.approx(1 / 3)
@@ -0,0 +1,80 @@
+import json
+
+import pytest
+
+from src.modeluniversity import rate_limiter
+from src.modeluniversity.instrumentation import tagged
+from src.modeluniversity.llm_cache import completion_content
+from tests.test_rate_limiter import rate_limit_error
+
+
+@pytest.fixture
+def no_sleeping(monkeypatch):
+    monkeypatch.setattr(rate_limiter.time, "sleep", lambda seconds: None)
+    monkeypatch.setattr(rate_limiter, "_limiters", {})
+
+
+def test_calls_are_recorded_with_their_tags_retries_and_tokens(
+    isolated_call_recorder, no_sleeping
+):
+    attempts = []
+
+    def flaky_completion(**request):
+        attempts.append(request)
+        if len(attempts) == 1:
+            raise rate_limit_error(retry_after=3)
+        return {
+            "choices": [{"message": {"content": "B. because"}}],
+            "usage": {"prompt_tokens": 120, "completion_tokens": 8},
+        }
+
+    request = dict(
+        model="groq/some-model",
+        messages=[{"role": "user", "content": "What is a W-2 form?"}],
+    )
+    with tagged("train", "Wages"):
+        completion_content(flaky_completion, **request)
+        with tagged("judge"):
+            # Served from the cache, still recorded
+            completion_content(flaky_completion, **request)
+
+    first, second = [
+        json.loads(line)
+        for line in isolated_call_recorder.path.read_text().splitlines()
+    ]
+    assert first["stage"] == "train"
+    assert first["subtopic"] == "Wages"
+    assert first["model"] == "groq/some-model"
+    assert first["retries"] == 1
+    assert first["backoff_seconds"] >= 3
+    assert first["prompt_tokens"] == 120
+    assert first["completion_tokens"] == 8
+    assert first["cached"] is False
+    assert first["run_id"] == second["run_id"]
+    assert second["stage"] == "judge"
+    assert second["subtopic"] == "Wages"
+    assert second["cached"] is True
+
+    table = isolated_call_recorder.summary_table()
+    assert "train" in table and "judge" in table
+    totals = isolated_call_recorder.totals[("train", "groq/some-model")]
+    assert (totals.calls, totals.retries, totals.prompt_tokens) == (1, 1, 120)
+
+
+def test_failed_calls_are_recorded(isolated_call_recorder, no_sleeping, monkeypatch):
+    monkeypatch.setattr(rate_limiter.settings.retry, "max_retries", 0)
+
+    def always_limited(**request):
+        raise rate_limit_error()
+
+    with tagged("eval"), pytest.raises(rate_limiter.LLMCallError):
+        completion_content(
+            always_limited, model="groq/some-model", messages=[{"content": "hi"}]
+        )
+
+    (record,) = [
+        json.loads(line)
+        for line in isolated_call_recorder.path.read_text().splitlines()
+    ]
+    assert record["stage"] == "eval"
+    assert record["error"].startswith("LLMCallError")
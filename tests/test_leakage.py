@@ -0,0 +1,107 @@
+import json
+import time
+
+from src.modeluniversity.leakage import (
+    NgramIndex,
+    check_leakage,
+    find_leakage,
+    word_ngrams,
+)
+from tests.test_dedup import BagOfWordsEmbeddings, question
+
+TRAINING = [
+    question("W-2 income", "What is a W-2 form?"),
+    question("W-2 income", "Which box of the W-2 shows federal income tax withheld?"),
+    question("Tips", "How are tips reported to an employer?"),
+]
+
+
+def test_word_ngrams():
+    assert word_ngrams("What is a W-2 form?", 3) == {
+        ("what", "is", "a"),
+        ("is", "a", "w"),
+        ("a", "w", "2"),
+        ("w", "2", "form"),
+    }
+    assert word_ngrams("Tips?", 3) == {("tips",)}
+
+
+def test_ngram_index_ignores_common_ngrams():
+    index = NgramIndex(
+        ["what is the rate", "what is the limit", "how are tips taxed"],
+        n=3,
+        max_postings=1,
+    )
+
+    assert index.best_overlap("what is the limit") == (1, 0.5)
+    assert index.best_overlap("something else entirely") == (None, 0.0)
+
+
+def test_find_leakage_by_embedding_and_wording():
+    test_items = [
+        # Same question, reworded a little
+        question("W-2 income", "What is the W-2 form?"),
+        # Different words, same long phrase
+        question(
+            "Withholding",
+            "In which box of the W-2 shows federal income tax withheld for 2024?",
+        ),
+        question("Tips", "Are tips under $20 a month taxable?"),
+    ]
+
+    result = find_leakage(
+        TRAINING,
+        test_items,
+        BagOfWordsEmbeddings(),
+        threshold=0.75,
+        ngram_threshold=0.6,
+        ngram_size=3,
+    )
+
+    assert [match.leaked for match in result.matches] == [True, True, False]
+    assert result.matches[0].training_item is TRAINING[0]
+    assert result.matches[1].ngram_training_item is TRAINING[1]
+    assert result.by_subtopic() == {
+        ("Income", "W-2 income"): (1, 1),
+        ("Income", "Withholding"): (1, 1),
+        ("Income", "Tips"): (1, 0),
+    }
+    assert result.clean_test_items() == [test_items[2]]
+
+
+def test_check_leakage_writes_clean_test_questions(test_outputs_dir, capsys):
+    training_file = test_outputs_dir / "leakage_training.json"
+    training_file.write_text(json.dumps(TRAINING))
+    test_file = test_outputs_dir / "leakage_test.jsonl"
+    test_items = [
+        question("W-2 income", "What is a W-2 form?"),
+        question("Tips", "Are tips under $20 a month taxable?"),
+    ]
+    test_file.write_text("".join(json.dumps(item) + "\n" for item in test_items))
+    output_file = test_outputs_dir / "leakage_clean.json"
+
+    check_leakage(training_file, test_file, output_file, BagOfWordsEmbeddings())
+
+    assert json.loads(output_file.read_text()) == [test_items[1]]
+    output = capsys.readouterr().out
+    assert "1 of 2 test questions are too close" in output
+    assert "Income / W-2 income: 1 of 1" in output
+
+
+def test_find_leakage_of_a_thousand_by_a_thousand_questions():
+    training = [
+        question(f"Subtopic {i % 50}", f"What is rule {i} of section {i % 97}?")
+        for i in range(1000)
+    ]
+    test_items = [
+        question(f"Subtopic {i % 50}", f"How does clause {i} apply to case {i % 89}?")
+        for i in range(1000)
+    ]
+
+    started = time.perf_counter()
+    result = find_leakage(
+        training, test_items, BagOfWordsEmbeddings(), threshold=0.99, chunk_size=256
+    )
+
+    assert len(result.matches) == 1000
+    assert time.perf_counter() - started < 10
@@ -0,0 +1,125 @@
+import json
+
+from src.modeluniversity.datagen_models import TestQuestionsSchema, TrainQuestionsSchema
+from src.modeluniversity.llm_cache import CompletionCache, completion_content
+
+VALID_QUESTIONS = json.dumps(
+    {
+        "questions": [
+            {
+                "question": "What is a W-2 form?",
+                "question_difficulty": "easy",
+                "correct_answer": "A wage statement",
+                "explanation": "Employers file it for every employee.",
+            }
+        ]
+    }
+)
+
+
+def make_completion(*contents, finish_reason="stop"):
+    """A completion returning ``contents`` in turn, then the last one forever."""
+    contents = contents or ("a cached answer",)
+    calls = []
+
+    def mock_completion(**request):
+        calls.append(request)
+        content = contents[min(len(calls), len(contents)) - 1]
+        return {
+            "choices": [
+                {"message": {"content": content}, "finish_reason": finish_reason}
+            ]
+        }
+
+    return mock_completion, calls
+
+
+def test_repeated_request_is_served_from_cache(isolated_completion_cache):
+    mock_completion, calls = make_completion(VALID_QUESTIONS)
+    request = dict(
+        model="groq/some-model",
+        messages=[{"role": "user", "content": "What is a W-2 form?"}],
+        temperature=0,
+        max_tokens=256,
+        response_format=TrainQuestionsSchema,
+    )
+
+    first = completion_content(mock_completion, **request)
+    second = completion_content(mock_completion, **request)
+
+    assert first == second == VALID_QUESTIONS
+    assert len(calls) == 1
+    assert isolated_completion_cache.hits == 1
+    assert isolated_completion_cache.misses == 1
+
+
+def test_malformed_response_is_asked_again(isolated_completion_cache):
+    truncated = VALID_QUESTIONS[:40]
+    mock_completion, calls = make_completion(truncated, VALID_QUESTIONS)
+    request = dict(
+        model="groq/some-model",
+        messages=[{"role": "user", "content": "What is a W-2 form?"}],
+        response_format=TrainQuestionsSchema,
+    )
+
+    assert completion_content(mock_completion, **request) == truncated
+    assert completion_content(mock_completion, **request) == VALID_QUESTIONS
+    assert completion_content(mock_completion, **request) == VALID_QUESTIONS
+    assert len(calls) == 2
+
+
+def test_response_cut_off_by_max_tokens_is_not_cached(isolated_completion_cache):
+    mock_completion, calls = make_completion(finish_reason="length")
+    for _ in range(2):
+        completion_content(
+            mock_completion, model="m", messages=[{"role": "user", "content": "q"}]
+        )
+    assert len(calls) == 2
+    assert len(isolated_completion_cache) == 0
+
+
+def test_cache_key_covers_every_request_parameter():
+    base = dict(
+        model="groq/some-model",
+        messages=[{"role": "user", "content": "What is a W-2 form?"}],
+        temperature=0,
+        max_tokens=256,
+        response_format=TrainQuestionsSchema,
+    )
+    variations = [
+        dict(model="groq/another-model"),
+        dict(messages=[{"role": "user", "content": "What is a 1099 form?"}]),
+        dict(temperature=0.7),
+        dict(max_tokens=4096),
+        dict(response_format=TestQuestionsSchema),
+        dict(response_format=None),
+    ]
+    base_key = CompletionCache.key_for(**base)
+    keys = {CompletionCache.key_for(**{**base, **change}) for change in variations}
+    assert base_key not in keys
+    assert len(keys) == len(variations)
+
+
+def test_disabled_cache_is_bypassed(isolated_completion_cache):
+    mock_completion, calls = make_completion()
+    isolated_completion_cache.enabled = False
+    for _ in range(2):
+        completion_content(
+            mock_completion, model="m", messages=[{"role": "user", "content": "q"}]
+        )
+    assert len(calls) == 2
+
+
+def test_eviction_keeps_most_recently_used_entries(test_outputs_dir):
+    cache = CompletionCache(test_outputs_dir / "small_cache.sqlite", max_entries=2)
+    cache.clear()
+    cache.put("first", "m", "1")
+    cache.put("second", "m", "2")
+    cache.get("first")
+    cache.put("third", "m", "3")
+    cache._evict()
+
+    assert len(cache) == 2
+    assert cache.get("second") is None
+    assert cache.get("first") == "1"
+    assert cache.get("third") == "3"
@@ -0,0 +1,99 @@
+import sqlite3
+
+from src.modeluniversity import evals, local_evals
+from src.modeluniversity.evals import load_test_questions, run_the_evaluation
+from src.modeluniversity.evals_models import SameFirstLetterMetric
+from src.modeluniversity.question_store import write_json_records
+
+
+def test_local_backend_needs_no_opik(monkeypatch, mock_data_dir, tmp_path):
+    questions_file = mock_data_dir / "mock_test_questions_produced_by_datagen.json"
+    results_path = tmp_path / "eval_results.sqlite"
+    models = ["groq/some-model", "ollama/another-model"]
+
+    def fail_setup(**kwargs):
+        raise AssertionError("The local backend must not touch Opik")
+
+    monkeypatch.setattr(evals, "setup", fail_setup)
+    monkeypatch.setattr(
+        evals, "question_prompt_call", lambda prompt, a_model: "A. because"
+    )
+
+    results = run_the_evaluation(
+        an_opik_client=None,
+        metrics=[SameFirstLetterMetric("Multiple-choice match", False)],
+        llm_evals_list=models,
+        use_textbook=False,
+        test_questions_location=questions_file,
+        backend="local",
+        results_path=results_path,
+    )
+
+    number_of_questions = len(load_test_questions(questions_file))
+    assert list(results) == models
+    for result in results.values():
+        assert len(result.test_results) == number_of_questions
+        expected = sum(
+            test_result["task_output"]["reference"] == "A"
+            for test_result in result.test_results
+        )
+        assert result.scores["Multiple-choice match"] == expected / number_of_questions
+
+    with sqlite3.connect(results_path) as connection:
+        assert connection.execute("SELECT COUNT(*) FROM experiments").fetchone() == (2,)
+        assert connection.execute("SELECT COUNT(*) FROM item_results").fetchone() == (
+            2 * number_of_questions,
+        )
+        aggregates = dict(
+            connection.execute(
+                "SELECT experiments.name, mean FROM aggregates "
+                "JOIN experiments ON experiments.id = aggregates.experiment_id"
+            ).fetchall()
+        )
+    assert aggregates == {
+        f"my_evaluation-closed: {model}": results[model].scores["Multiple-choice match"]
+        for model in models
+    }
+
+
+def test_failed_items_are_recorded_and_the_rest_saved(tmp_path):
+    dataset = [{"question": f"question {i}", "answer": "A"} for i in range(4)]
+
+    def task(item):
+        if item["question"] == "question 1":
+            raise RuntimeError("the model timed out")
+        return {"output": "A. because", "reference": "A"}
+
+    class FlakyMetric(SameFirstLetterMetric):
+        def score(self, output, reference, **ignored_kwargs):
+            if ignored_kwargs["question"] == "question 2":
+                raise ValueError("no letter to compare")
+            return super().score(output, reference)
+
+    store = local_evals.LocalResultsStore(tmp_path / "eval_results.sqlite")
+    result = local_evals.evaluate(
+        "flaky",
+        dataset,
+        task,
+        [FlakyMetric("Multiple-choice match", False)],
+        store=store,
+    )
+
+    assert len(result.test_results) == 4
+    assert result.scores == {"Multiple-choice match": 1.0}
+    assert result.failed == {"Multiple-choice match": 2}
+    with sqlite3.connect(store.path) as connection:
+        rows = connection.execute(
+            "SELECT item_index, output, score, reason FROM item_results ORDER BY item_index"
+        ).fetchall()
+    assert [row[2] for row in rows] == [1.0, None, None, 1.0]
+    assert rows[1][1] == rows[1][3] == "RuntimeError: the model timed out"
+    assert rows[2][3] == "ValueError: no letter to compare"
+
+
+def test_test_questions_load_from_the_jsonl_store(mock_data_dir, tmp_path):
+    json_file = mock_data_dir / "mock_test_questions_produced_by_datagen.json"
+    jsonl_file = tmp_path / "test_questions.jsonl"
+    write_json_records(jsonl_file, load_test_questions(json_file))
+
+    assert load_test_questions(jsonl_file) == load_test_questions(json_file)
@@ -0,0 +1,80 @@
+import numpy as np
+
+from src.modeluniversity.numpy_index import NumpyIndexClient
+
+
+def one_hot_embeddings(input):
+    """Documents named "d<i>" point along axis i."""
+    vectors = np.zeros((len(input), 8))
+    for row, text in enumerate(input):
+        for axis in text.split():
+            vectors[row, int(axis[1:])] += 1
+    return vectors.tolist()
+
+
+def test_upsert_query_and_delete(test_outputs_dir):
+    client = NumpyIndexClient(test_outputs_dir / "numpy_index")
+    index = client.get_or_create_collection("unit", one_hot_embeddings)
+
+    index.upsert(
+        ids=["a", "b", "c"],
+        documents=["d0", "d1", "d1 d2"],
+        metadatas=[{"n": 0}, {"n": 1}, {"n": 2}],
+    )
+    result = index.query(["d1", "d0 d0"], n_results=2)
+
+    assert result["ids"] == [["b", "c"], ["a", "b"]]
+    assert result["metadatas"][0] == [{"n": 1}, {"n": 2}]
+    np.testing.assert_allclose(result["distances"][0], [0.0, 1 - 2**-0.5], atol=1e-6)
+
+    # Replacing a document keeps its id, deleting drops it
+    index.upsert(ids=["a"], documents=["d1"], metadatas=[{"n": 3}])
+    index.delete(ids=["b"])
+    assert index.count() == 2
+    assert index.get(include=[]) == {"ids": ["a", "c"]}
+    assert index.query(["d1"], n_results=5)["ids"] == [["a", "c"]]
+
+    reopened = client.get_or_create_collection("unit", one_hot_embeddings)
+    assert reopened.get(ids=["a"]) == {
+        "ids": ["a"],
+        "documents": ["d1"],
+        "metadatas": [{"n": 3}],
+    }
+
+    client.delete_collection("unit")
+    assert client.get_or_create_collection("unit").count() == 0
+
+
+def test_query_of_an_empty_index(test_outputs_dir):
+    index = NumpyIndexClient(test_outputs_dir / "empty_index").get_or_create_collection(
+        "empty", one_hot_embeddings
+    )
+
+    assert index.query(["d1", "d2"], n_results=3)["documents"] == [[], []]
+
+
+def test_query_within_a_partition(test_outputs_dir):
+    index = NumpyIndexClient(
+        test_outputs_dir / "partitioned_index"
+    ).get_or_create_collection("partitioned", one_hot_embeddings)
+    index.upsert(
+        ids=["a", "b", "c"],
+        documents=["d1", "d1 d2", "d2"],
+        metadatas=[
+            {"topic": "t", "subtopic": "x"},
+            {"topic": "t", "subtopic": "y"},
+            {"topic": "u", "subtopic": "y"},
+        ],
+    )
+
+    where = {"$and": [{"topic": "t"}, {"subtopic": "y"}]}
+    assert index.query(["d1"], n_results=3, where=where)["ids"] == [["b"]]
+    assert index.query(["d1"], n_results=3, where={"subtopic": "y"})["ids"] == [
+        ["b", "c"]
+    ]
+
+    # Partitions follow changes to the index
+    index.upsert(
+        ids=["d"], documents=["d1"], metadatas=[{"topic": "t", "subtopic": "y"}]
+    )
+    assert index.query(["d1"], n_results=1, where=where)["ids"] == [["d"]]
@@ -0,0 +1,153 @@
+import json
+import threading
+from array import array
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.modeluniversity.embedding_cache import EmbeddingCache
+from src.modeluniversity.ollama_embeddings import (
+    OllamaBatchEmbeddingWrapper,
+    OllamaEmbeddingFunction,
+)
+
+
+def fake_embedding(text):
+    return [float(len(text)), float(sum(map(ord, text)) % 97)]
+
+
+class StubOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like Ollama
+
+    def do_POST(self):
+        server = self.server
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with server.lock:
+            server.requests.append((self.path, payload))
+            server.client_ports.add(self.client_address[1])
+
+        if self.path == "/api/embed" and server.supports_batch:
+            body = {"embeddings": [fake_embedding(text) for text in payload["input"]]}
+        elif self.path == "/api/embeddings":
+            body = {"embedding": fake_embedding(payload["prompt"])}
+        else:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        encoded = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub_ollama(supports_batch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubOllamaHandler)
+    server.supports_batch = supports_batch
+    server.requests = []
+    server.client_ports = set()
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+@pytest.fixture
+def stub_ollama(request):
+    server = start_stub_ollama(supports_batch=request.param)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def embedding_function_for(server, **kwargs):
+    host, port = server.server_address
+    return OllamaEmbeddingFunction(
+        endpoint=f"http://{host}:{port}/api/embeddings", model="stub", **kwargs
+    )
+
+
+TEXTS = [f"question number {i}" for i in range(10)]
+
+
+@pytest.mark.parametrize("stub_ollama", [True], indirect=True)
+def test_batches_go_to_the_multi_input_endpoint(stub_ollama):
+    embedding_function = embedding_function_for(stub_ollama, batch_size=4)
+
+    embeddings = embedding_function.batch_embed(TEXTS)
+
+    assert embeddings == [fake_embedding(text) for text in TEXTS]
+    assert [path for path, _ in stub_ollama.requests] == ["/api/embed"] * 3
+    # All requests reused one pooled connection
+    assert len(stub_ollama.client_ports) == 1
+
+
+@pytest.mark.parametrize("stub_ollama", [False], indirect=True)
+def test_falls_back_to_concurrent_single_calls(stub_ollama):
+    embedding_function = embedding_function_for(stub_ollama, max_workers=3)
+
+    embeddings = embedding_function.batch_embed(TEXTS)
+
+    assert embeddings == [fake_embedding(text) for text in TEXTS]
+    single_calls = [p for p, _ in stub_ollama.requests if p == "/api/embeddings"]
+    assert len(single_calls) == len(TEXTS)
+    assert len(stub_ollama.client_ports) <= 3
+
+    # The missing endpoint is not probed again
+    stub_ollama.requests.clear()
+    embedding_function.batch_embed(TEXTS[:2])
+    assert [path for path, _ in stub_ollama.requests] == ["/api/embeddings"] * 2
+
+
+class RecordingEmbeddingFunction:
+    model = "recording"
+
+    def __init__(self):
+        self.batches = []
+
+    def batch_embed(self, inputs):
+        self.batches.append(list(inputs))
+        return [fake_embedding(text) for text in inputs]
+
+
+def as_float32(vector):
+    return list(array("f", vector))
+
+
+def test_wrapper_keeps_input_order_with_partial_cache_hits():
+    embedding_function = RecordingEmbeddingFunction()
+    wrapper = OllamaBatchEmbeddingWrapper(embedding_function)
+
+    wrapper(["b", "d"])
+    embeddings = wrapper(["a", "b", "c", "d", "a"])
+
+    assert embeddings == [as_float32(fake_embedding(t)) for t in "abcda"]
+    # Only the uncached texts were embedded, each once
+    assert embedding_function.batches == [["b", "d"], ["a", "c"]]
+    assert wrapper("c") == as_float32(fake_embedding("c"))
+    assert len(embedding_function.batches) == 2
+
+
+def test_cache_is_bounded_by_bytes_and_persisted(test_outputs_dir):
+    path = test_outputs_dir / "embeddings_cache.sqlite"
+    vector_bytes = 2 * 4  # two float32 values
+    cache = EmbeddingCache(path=path, max_memory_bytes=3 * vector_bytes)
+    texts = [f"text {i}" for i in range(5)]
+    cache.put_many("model", texts, [fake_embedding(t) for t in texts])
+
+    assert cache.memory_bytes == 3 * vector_bytes
+    assert cache.stats()["entries_in_memory"] == 3
+
+    reopened = EmbeddingCache(path=path)
+    assert reopened.get_many("model", texts) == [
+        as_float32(fake_embedding(t)) for t in texts
+    ]
+    assert reopened.get_many("another-model", texts[:1]) == [None]
+    stats = reopened.stats()
+    assert stats["disk_hits"] == 5
+    assert stats["misses"] == 1
@@ -0,0 +1,240 @@
+import json
+import shutil
+
+import pytest
+
+from src.modeluniversity.opentextbook import OpenTextBook, scope_filter
+from src.modeluniversity.question_store import load_json_records, write_json_records
+
+
+class CountingEmbeddingFunction:
+    """Cheap deterministic embeddings that count how many texts were embedded."""
+
+    model = "counting-test-embeddings"
+
+    def __init__(self):
+        self.embedded = 0
+        self.batch_sizes = []
+
+    def __call__(self, input):
+        self.embedded += len(input)
+        self.batch_sizes.append(len(input))
+        vectors = []
+        for text in input:
+            vector = [0.0] * 16
+            for word in text.lower().split():
+                vector[sum(map(ord, word)) % 16] += 1.0
+            vectors.append(vector)
+        return vectors
+
+
+@pytest.fixture(params=["chroma", "numpy"])
+def backend(request):
+    return request.param
+
+
+@pytest.fixture
+def textbook_workspace(test_outputs_dir, mock_data_dir, request):
+    workspace = test_outputs_dir / f"textbook_{request.node.name}"
+    workspace.mkdir()
+    questions_file = workspace / "training_questions.json"
+    shutil.copy(
+        mock_data_dir / "mock_training_questions_produced_by_datagen.json",
+        questions_file,
+    )
+    return workspace, questions_file
+
+
+def test_warm_start_does_not_embed_again(textbook_workspace, backend):
+    workspace, questions_file = textbook_workspace
+    with questions_file.open() as f:
+        number_of_questions = len(json.load(f))
+
+    embeddings = CountingEmbeddingFunction()
+    textbook = OpenTextBook(
+        embedding_function=embeddings,
+        file_with_questions=questions_file,
+        db_path=workspace / "db",
+        backend=backend,
+    )
+    assert embeddings.embedded == number_of_questions
+    assert textbook._collection.count() == number_of_questions
+
+    embeddings = CountingEmbeddingFunction()
+    OpenTextBook(
+        embedding_function=embeddings,
+        file_with_questions=questions_file,
+        db_path=workspace / "db",
+        backend=backend,
+    )
+    assert embeddings.embedded == 0
+
+
+def test_textbook_from_the_jsonl_store(textbook_workspace, backend):
+    workspace, questions_file = textbook_workspace
+    questions = load_json_records(questions_file)
+    jsonl_file = workspace / "training_questions.jsonl"
+    write_json_records(jsonl_file, questions)
+
+    textbook = OpenTextBook(
+        embedding_function=CountingEmbeddingFunction(),
+        file_with_questions=jsonl_file,
+        db_path=workspace / "db",
+        backend=backend,
+    )
+    assert textbook._collection.count() == len(questions)
+
+
+def test_edited_question_costs_one_embedding(textbook_workspace, backend):
+    workspace, questions_file = textbook_workspace
+    OpenTextBook(
+        embedding_function=CountingEmbeddingFunction(),
+        file_with_questions=questions_file,
+        db_path=workspace / "db",
+        backend=backend,
+    )
+
+    with questions_file.open() as f:
+        questions = json.load(f)
+    questions[0]["answer"] = "An edited answer"
+    removed_question = questions.pop()
+    with questions_file.open("w") as f:
+        json.dump(questions, f)
+
+    embeddings = CountingEmbeddingFunction()
+    textbook = OpenTextBook(
+        embedding_function=embeddings,
+        file_with_questions=questions_file,
+        db_path=workspace / "db",
+        backend=backend,
+    )
+    assert embeddings.embedded == 1
+    documents = textbook._collection.get(include=["documents"])["documents"]
+    assert len(documents) == len(questions)
+    assert any("An edited answer" in document for document in documents)
+    assert not any(removed_question["question"] in document for document in documents)
+
+
+def test_add_contents_embeds_in_batches(textbook_workspace, backend):
+    workspace, questions_file = textbook_workspace
+    embeddings = CountingEmbeddingFunction()
+    textbook = OpenTextBook(
+        embedding_function=embeddings,
+        file_with_questions=questions_file,
+        db_path=workspace / "db",
+        backend=backend,
+    )
+    embeddings.batch_sizes.clear()
+
+    contents = [
+        (f"Fact number {i} about estate planning.", {"topic": "t", "subtopic": "s"})
+        for i in range(10)
+    ]
+    added = textbook.add_contents(contents, batch_size=4)
+
+    assert added == 10
+    assert embeddings.batch_sizes == [4, 4, 2]
+
+
+def test_prefetched_queries_need_no_further_embedding(textbook_workspace, backend):
+    workspace, questions_file = textbook_workspace
+    embeddings = CountingEmbeddingFunction()
+    textbook = OpenTextBook(
+        embedding_function=embeddings,
+        file_with_questions=questions_file,
+        db_path=workspace / "db",
+        backend=backend,
+    )
+    queries = ["What is a living will?", "What is probate?", "What is a living will?"]
+    embeddings.batch_sizes.clear()
+
+    textbook.prefetch(queries, n_results=1, batch_size=10)
+    assert embeddings.batch_sizes == [2]
+
+    for query in queries:
+        assert textbook.retrieve(query, 1) == textbook.query([query], 1)[0]
+    # Only the explicit comparison queries above were embedded again
+    assert embeddings.batch_sizes == [2, 1, 1, 1]
+
+
+def test_numpy_backend_persists_and_ranks_by_cosine(textbook_workspace):
+    workspace, questions_file = textbook_workspace
+    textbook = OpenTextBook(
+        embedding_function=CountingEmbeddingFunction(),
+        file_with_questions=questions_file,
+        db_path=workspace / "db",
+        backend="numpy",
+    )
+    assert (workspace / "db" / "textbook.embeddings.npy").exists()
+    result = textbook._collection.query(["What is a living will?"], n_results=5)
+    distances = result["distances"][0]
+    assert len(result["documents"][0]) == textbook._collection.count() == 2
+    assert distances == sorted(distances)
+
+    embeddings = CountingEmbeddingFunction()
+    reopened = OpenTextBook(
+        embedding_function=embeddings,
+        file_with_questions=questions_file,
+        db_path=workspace / "db",
+        backend="numpy",
+    )
+    assert embeddings.embedded == 0
+    assert reopened.query(["What is a living will?"], 5) == result["documents"]
+
+
+def test_unknown_backend(textbook_workspace):
+    workspace, questions_file = textbook_workspace
+    with pytest.raises(ValueError, match="Unknown textbook backend"):
+        OpenTextBook(
+            file_with_questions=questions_file,
+            db_path=workspace / "db",
+            backend="faiss",
+        )
+
+
+def test_scoped_retrieval_falls_back_to_global(textbook_workspace, backend):
+    workspace, questions_file = textbook_workspace
+    embeddings = CountingEmbeddingFunction()
+    textbook = OpenTextBook(
+        embedding_function=embeddings,
+        file_with_questions=questions_file,
+        db_path=workspace / "db",
+        backend=backend,
+    )
+    textbook.add_contents(
+        [
+            (
+                f"Probate fact {i} about wills.",
+                {"topic": "Probate", "subtopic": "wills"},
+            )
+            for i in range(3)
+        ]
+        + [("Probate fact about courts.", {"topic": "Probate", "subtopic": "courts"})]
+    )
+    wills = scope_filter({"topic": "Probate", "subtopic": "wills"}, "subtopic")
+    courts = scope_filter({"topic": "Probate", "subtopic": "courts"}, "subtopic")
+
+    assert textbook.partition_size(wills) == 3
+    assert textbook.partition_size(scope_filter({"topic": "Probate"}, "topic")) == 4
+    assert scope_filter({"topic": "Probate"}, "all") is None
+
+    # Only the chunks of the subtopic are searched
+    documents = textbook.query(["What is a living will?"], 3, wills)[0]
+    assert sorted(documents) == [f"Probate fact {i} about wills." for i in range(3)]
+    # One chunk can't fill 3 results, the whole textbook is searched instead
+    assert textbook.scoped(courts, 3) is None
+    assert len(textbook.query(["What is a living will?"], 3, courts)[0]) == 3
+
+    embeddings.batch_sizes.clear()
+    textbook.prefetch(
+        ["What is a will?", "What is a court?", "What is a will?"],
+        n_results=2,
+        wheres=[wills, courts, None],
+    )
+    # One batch per scope; the same text in another scope is another query
+    assert sorted(embeddings.batch_sizes) == [1, 1, 1]
+    assert (
+        textbook.retrieve("What is a will?", 2, wills)
+        == textbook.query(["What is a will?"], 2, wills)[0]
+    )
+    assert embeddings.batch_sizes[3:] == [1]
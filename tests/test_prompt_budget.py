@@ -0,0 +1,64 @@
+from src.modeluniversity import prompt_budget
+from src.modeluniversity.prompt_budget import (
+    PromptBudgetReport,
+    build_avoid_list,
+    count_tokens,
+)
+
+MODEL = "gpt-4o-mini"
+
+
+def test_avoid_list_drops_duplicates_one_question_per_line():
+    questions = [
+        "What is the standard deduction?",
+        "what is the  standard deduction",
+        "Who can claim head of household status?",
+    ]
+
+    avoid_list = build_avoid_list(questions, MODEL, max_tokens=1000)
+
+    assert avoid_list.text == (
+        "- What is the standard deduction?\n"
+        "- Who can claim head of household status?"
+    )
+    assert avoid_list.included == 2
+    assert avoid_list.duplicates == 1
+    assert avoid_list.omitted == 0
+    assert avoid_list.tokens < avoid_list.full_tokens
+    assert avoid_list.tokens_saved == avoid_list.full_tokens - avoid_list.tokens
+
+
+def test_avoid_list_stays_within_budget():
+    questions = [f"How is deduction number {i} calculated?" for i in range(200)]
+
+    avoid_list = build_avoid_list(questions, MODEL, max_tokens=100)
+
+    assert 0 < avoid_list.included < 200
+    assert avoid_list.included + avoid_list.omitted == 200
+    assert avoid_list.tokens <= 100
+    assert count_tokens(avoid_list.text, MODEL) <= 100
+    # The earliest questions are the ones kept
+    assert avoid_list.text.startswith("- How is deduction number 0 calculated?")
+
+
+def test_count_tokens_falls_back_to_an_estimate(monkeypatch):
+    def failing_token_counter(**kwargs):
+        raise ValueError("unknown model")
+
+    monkeypatch.setattr(prompt_budget, "token_counter", failing_token_counter)
+
+    assert count_tokens("x" * 40, "some/unknown-model") == 10
+    assert count_tokens("", "some/unknown-model") == 0
+
+
+def test_report_totals(capsys):
+    report = PromptBudgetReport()
+    for questions in (["Q one?", "Q one?"], ["Q two?", "Q three?"]):
+        report.add(build_avoid_list(questions, MODEL, max_tokens=1000))
+
+    report.report()
+
+    assert report.prompts == 2
+    assert report.duplicates == 1
+    assert report.tokens_saved == report.full_tokens - report.tokens > 0
+    assert f"{report.tokens_saved} saved" in capsys.readouterr().out
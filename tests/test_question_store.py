@@ -0,0 +1,64 @@
+import json
+import pytest
+from src.modeluniversity.question_store import (
+    JsonlQuestionStore,
+    iter_json_records,
+    jsonl_path_for,
+)
+
+
+def test_append_only_store_exports_legacy_json(test_outputs_dir):
+    store = JsonlQuestionStore(test_outputs_dir / "store_questions.jsonl")
+    store.reset()
+
+    first_batch = [
+        {"topic": "Estate", "subtopic": "wills", "question": "What is a will?"}
+    ]
+    second_batch = [
+        {"topic": "Estate", "subtopic": "trusts", "question": "What is a trust?"},
+        {"topic": "Estate", "subtopic": "trusts", "question": "Who is a trustee?"},
+    ]
+    store.append(first_batch)
+    store.append([])
+    store.append(second_batch)
+
+    assert list(store) == first_batch + second_batch
+
+    exported = test_outputs_dir / "store_questions.json"
+    store.export_json(exported)
+
+    # Byte for byte what the previous read-modify-write produced
+    assert exported.read_text() == json.dumps(first_batch + second_batch, indent=4)
+
+
+def test_empty_store_exports_empty_array(test_outputs_dir):
+    store = JsonlQuestionStore(test_outputs_dir / "empty_questions.jsonl")
+    store.reset()
+    exported = test_outputs_dir / "empty_questions.json"
+    store.export_json(exported)
+    assert json.loads(exported.read_text()) == []
+
+
+def test_jsonl_path_for():
+    assert jsonl_path_for("out/training_questions.json").name == (
+        "training_questions.jsonl"
+    )
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1 << 16])
+def test_iter_json_records_streams_arrays_and_jsonl(test_outputs_dir, chunk_size):
+    records = [
+        {"question": "Q1", "answer": "A, [not] the end]"},
+        json.dumps({"question": "Q2"}),
+        {"question": "Q3", "score": 12345},
+    ]
+    array_file = test_outputs_dir / f"records_{chunk_size}.json"
+    array_file.write_text(json.dumps(records, indent=4))
+    jsonl_file = test_outputs_dir / f"records_{chunk_size}.jsonl"
+    jsonl_file.write_text("".join(json.dumps(record) + "\n" for record in records))
+    empty_file = test_outputs_dir / f"empty_{chunk_size}.json"
+    empty_file.write_text(" [ ] ")
+
+    assert list(iter_json_records(array_file, chunk_size)) == records
+    assert list(iter_json_records(jsonl_file, chunk_size)) == records
+    assert list(iter_json_records(empty_file, chunk_size)) == []
@@ -0,0 +1,116 @@
+import httpx
+import pytest
+from litellm import AuthenticationError, RateLimitError
+
+from src.modeluniversity import rate_limiter
+from src.modeluniversity.config.settings import RateLimitSettings
+from src.modeluniversity.rate_limiter import (
+    LLMCallError,
+    TokenBucket,
+    call_with_retries,
+    retry_after_seconds,
+)
+
+
+def rate_limit_error(retry_after=None):
+    headers = {"retry-after": str(retry_after)} if retry_after is not None else {}
+    response = httpx.Response(
+        429, headers=headers, request=httpx.Request("POST", "http://provider")
+    )
+    return RateLimitError("slow down", "groq", "some-model", response=response)
+
+
+@pytest.fixture
+def recorded_sleeps(monkeypatch):
+    """Sleeps on a virtual clock, with the free tier Groq limits and no jitter."""
+    sleeps = []
+    clock = [1000.0]
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        clock[0] += seconds
+
+    monkeypatch.setattr(rate_limiter.time, "sleep", sleep)
+    monkeypatch.setattr(rate_limiter.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(rate_limiter.random, "uniform", lambda low, high: high)
+    monkeypatch.setattr(rate_limiter, "_limiters", {})
+    monkeypatch.setattr(
+        rate_limiter.settings,
+        "rate_limits",
+        {"groq": RateLimitSettings(requests_per_minute=30, tokens_per_minute=12000)},
+    )
+    monkeypatch.setattr(rate_limiter.settings.retry, "base_delay", 2)
+    monkeypatch.setattr(rate_limiter.settings.retry, "max_delay", 60)
+    return sleeps
+
+
+def test_token_bucket_spaces_out_requests_beyond_capacity():
+    bucket = TokenBucket(rate_per_minute=60, capacity=2)
+    assert bucket.reserve(1) == 0
+    assert bucket.reserve(1) == 0
+    # One token per second once the burst is used up, queued in order
+    assert bucket.reserve(1) == pytest.approx(1, abs=0.05)
+    assert bucket.reserve(1) == pytest.approx(2, abs=0.05)
+
+
+def test_retry_after_header_is_honoured(recorded_sleeps):
+    attempts = []
+
+    def flaky_completion(**request):
+        attempts.append(request)
+        if len(attempts) < 3:
+            raise rate_limit_error(retry_after=7)
+        return {"choices": [{"message": {"content": "ok"}}]}
+
+    response = call_with_retries(
+        flaky_completion, model="groq/some-model", messages=[{"content": "hi"}]
+    )
+
+    assert response["choices"][0]["message"]["content"] == "ok"
+    assert len(attempts) == 3
+    # Backoff of 2 then 4 seconds, raised to the Retry-After, waited once each
+    assert recorded_sleeps == [7, 7]
+
+
+def test_rate_limited_caller_holds_the_other_callers(recorded_sleeps):
+    limiter = rate_limiter.get_rate_limiter("groq/some-model")
+    limiter.on_rate_limited(7)
+
+    assert limiter.acquire() == pytest.approx(7)
+    # The pause is over, and a single request fits the halved rate
+    assert limiter.acquire() == 0
+    assert recorded_sleeps == [pytest.approx(7)]
+
+
+def test_gives_up_with_a_clear_error(recorded_sleeps, monkeypatch):
+    monkeypatch.setattr(rate_limiter.settings.retry, "max_retries", 2)
+
+    def always_limited(**request):
+        raise rate_limit_error()
+
+    with pytest.raises(LLMCallError, match="after 3 attempts") as raised:
+        call_with_retries(
+            always_limited, model="groq/some-model", messages=[{"content": "hi"}]
+        )
+    assert isinstance(raised.value.__cause__, RateLimitError)
+    assert recorded_sleeps == [2, 4]
+
+
+def test_non_transient_errors_are_not_retried(recorded_sleeps):
+    attempts = []
+
+    def unauthorized(**request):
+        attempts.append(request)
+        raise AuthenticationError("bad key", "groq", "some-model")
+
+    with pytest.raises(AuthenticationError):
+        call_with_retries(
+            unauthorized, model="groq/some-model", messages=[{"content": "hi"}]
+        )
+    assert len(attempts) == 1
+    assert recorded_sleeps == []
+
+
+def test_retry_after_seconds():
+    assert retry_after_seconds(rate_limit_error(retry_after=12)) == 12
+    assert retry_after_seconds(rate_limit_error()) is None
@@ -0,0 +1,52 @@
+import numpy as np
+
+from src.modeluniversity.similarity import (
+    greedy_duplicates,
+    normalize_rows,
+    top_matches,
+)
+
+
+def test_normalize_rows_keeps_zero_rows():
+    vectors = normalize_rows([[3.0, 4.0], [0.0, 0.0]])
+
+    assert vectors.dtype == np.float32
+    np.testing.assert_allclose(vectors, [[0.6, 0.8], [0.0, 0.0]])
+
+
+def test_greedy_duplicates_across_chunks():
+    base = np.eye(4, dtype=np.float32)
+    # Rows 4 and 6 repeat rows 1 and 3, row 5 is close to row 0
+    vectors = np.vstack([base, base[1], base[0] + 0.1 * base[2], base[3]])
+
+    for chunk_size in (1, 3, 1024):
+        duplicates = greedy_duplicates(vectors, 0.95, chunk_size=chunk_size)
+
+        assert [d and d[0] for d in duplicates] == [None] * 4 + [1, 0, 3]
+        assert duplicates[4][1] == np.float32(1.0)
+
+
+def test_greedy_duplicates_only_compares_within_groups():
+    vectors = np.array([[1.0, 0.0], [1.0, 0.0], [1.0, 0.0]])
+
+    duplicates = greedy_duplicates(vectors, 0.9, groups=["a", "b", "a"])
+
+    assert [d and d[0] for d in duplicates] == [None, None, 0]
+
+
+def test_greedy_duplicates_of_nothing():
+    assert greedy_duplicates(np.zeros((0, 3)), 0.9) == []
+
+
+def test_top_matches_in_blocks():
+    rng = np.random.default_rng(0)
+    corpus = rng.normal(size=(50, 8))
+    queries = np.vstack([corpus[[7, 42, 0]] * 3, rng.normal(size=(20, 8))])
+
+    for chunk_size in (4, 1024):
+        best, scores = top_matches(queries, corpus, chunk_size=chunk_size)
+
+        expected = (normalize_rows(queries) @ normalize_rows(corpus).T).argmax(axis=1)
+        assert best.tolist() == expected.tolist()
+        assert best[:3].tolist() == [7, 42, 0]
+        np.testing.assert_allclose(scores[:3], 1.0, rtol=1e-5)
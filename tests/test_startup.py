@@ -0,0 +1,64 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+HEAVY_MODULES = ("litellm", "opik", "chromadb")
+# Seconds to import the CLI and run a light command, far above what it takes
+# without the heavy modules and far below what it takes with them
+IMPORT_TIME_BUDGET = 2.0
+
+STARTUP_SCRIPT = """
+import json, sys, time
+started_at = time.perf_counter()
+from src.modeluniversity.cli import cli
+try:
+    cli(sys.argv[1:])
+except SystemExit as e:
+    exit_code = e.code
+print(json.dumps({
+    "exit_code": exit_code,
+    "seconds": time.perf_counter() - started_at,
+    "heavy_modules": [m for m in %r if m in sys.modules],
+}))
+""" % (HEAVY_MODULES,)
+
+
+def run_cli(*args) -> dict:
+    completed = subprocess.run(
+        [sys.executable, "-c", STARTUP_SCRIPT, *args],
+        cwd=Path(__file__).parent.parent,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+@pytest.mark.parametrize("command", [["--help"], ["transform-data", "--help"]])
+def test_help_does_not_import_heavy_modules(command):
+    startup = run_cli(*command)
+    assert startup["exit_code"] == 0
+    assert startup["heavy_modules"] == []
+    assert startup["seconds"] < IMPORT_TIME_BUDGET
+
+
+def test_transform_data_does_not_import_heavy_modules(test_outputs_dir, mock_data_dir):
+    training_file = mock_data_dir / "mock_training_questions_produced_by_datagen.json"
+    output_file = test_outputs_dir / "startup_trainable_data.jsonl"
+
+    startup = run_cli(
+        "transform-data",
+        "--training-file",
+        str(training_file),
+        "--output-file",
+        str(output_file),
+    )
+    assert startup["exit_code"] == 0
+    assert startup["heavy_modules"] == []
+    assert startup["seconds"] < IMPORT_TIME_BUDGET
+    assert len(output_file.read_text().splitlines()) == len(
+        json.loads(training_file.read_text())
+    )